@@ -0,0 +1,395 @@
+"""
+Shared helpers of the benchmarks which run a local server in a
+separate process and connect to it with clients of the test suite.
+
+Benchmarks using this module need to be run from the repository root
+(e.g. `python -m benchmarks.handshake`).
+"""
+import asyncio
+import datetime
+import gc
+import json
+import math
+import multiprocessing
+import os
+import platform
+import signal
+import socket
+import ssl
+import sys
+import time
+import tracemalloc
+from typing import Any  # noqa
+from typing import Dict  # noqa
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
+
+import libnacl.public
+import websockets
+
+from saltyrtc.server import (
+    SubProtocol,
+    __version__,
+    serve,
+    util,
+)
+from tests.conftest import (
+    key_path,
+    pack_message,
+    pack_nonce,
+    random_cookie,
+    unpack_message,
+)
+
+__all__ = (
+    'LOOPS',
+    'HOST',
+    'CERT',
+    'PERMANENT_KEY',
+    'have_uvloop',
+    'new_event_loop',
+    'percentile',
+    'latency_summary',
+    'ServerProcess',
+    'authenticate',
+    'write_results',
+)
+
+LOOPS = ('asyncio', 'uvloop')
+
+HOST = 'localhost'
+SUBPROTOCOLS = [SubProtocol.saltyrtc_v1.value]
+TESTS_PATH = os.path.normpath(
+    os.path.join(os.path.abspath(__file__), os.pardir, os.pardir, 'tests'))
+CERT = os.path.join(TESTS_PATH, 'cert.pem')
+KEY = os.path.join(TESTS_PATH, 'key.pem')
+DH_PARAMS = os.path.join(TESTS_PATH, 'dh2048.pem')
+PERMANENT_KEY = os.path.join(TESTS_PATH, 'permanent.key')
+
+# Interval in seconds in which the server samples the task queue sizes
+_SAMPLE_INTERVAL = 0.01
+
+
+def have_uvloop() -> bool:
+    try:
+        import uvloop  # noqa
+    except ImportError:
+        return False
+    return True
+
+
+def new_event_loop(name: str) -> asyncio.AbstractEventLoop:
+    """
+    Return a new event loop of the requested type.
+    """
+    if name == 'uvloop':
+        import uvloop
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def unused_tcp_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Return the percentile (nearest rank) of sorted values.
+    """
+    index = max(0, math.ceil(percent / 100.0 * len(values)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def latency_summary(latencies: List[float]) -> Optional[Dict[str, float]]:
+    """
+    Return percentiles, mean and maximum of latencies (in seconds) in
+    milliseconds or `None` if there are no latencies.
+    """
+    if len(latencies) == 0:
+        return None
+    latencies = sorted(latencies)
+    return {
+        'p50': percentile(latencies, 50) * 1000.0,
+        'p90': percentile(latencies, 90) * 1000.0,
+        'p99': percentile(latencies, 99) * 1000.0,
+        'mean': sum(latencies) / len(latencies) * 1000.0,
+        'max': latencies[-1] * 1000.0,
+    }
+
+
+class _Measurement:
+    """
+    Measures the CPU time of the server process and samples the task
+    queue sizes of its clients while running.
+    """
+    def __init__(self, server: Any, loop: asyncio.AbstractEventLoop) -> None:
+        self._server = server
+        self._loop = loop
+        self._cpu_time = time.process_time()
+        self._max_task_queue_size = 0
+        self._task = loop.create_task(self._sample())
+
+    async def _sample(self) -> None:
+        while True:
+            for protocol in self._server.protocols:
+                client = protocol.client
+                if client is not None:
+                    self._max_task_queue_size = max(
+                        self._max_task_queue_size, client.task_queue_size)
+            await asyncio.sleep(_SAMPLE_INTERVAL, loop=self._loop)
+
+    def stop(self) -> Dict[str, Any]:
+        self._task.cancel()
+        return {
+            'cpu_time': time.process_time() - self._cpu_time,
+            'max_task_queue_size': self._max_task_queue_size,
+        }
+
+
+def _rss() -> int:
+    # Note: Falls back to the peak RSS on systems without procfs
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _MemoryMeasurement:
+    """
+    Measures the RSS and (optionally) the allocations traced by
+    :mod:`tracemalloc` of the server process.
+    """
+    def __init__(self, trace: bool, frames: int) -> None:
+        gc.collect()
+        self._rss = _rss()
+        self._snapshot = None  # type: Optional[tracemalloc.Snapshot]
+        if trace:
+            tracemalloc.start(frames)
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def stop(self, group_by: str, limit: int) -> Dict[str, Any]:
+        gc.collect()
+        result = {'rss': _rss() - self._rss}  # type: Dict[str, Any]
+        if self._snapshot is not None:
+            filters = [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap*'),
+            ]
+            snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+            tracemalloc.stop()
+            statistics = snapshot.compare_to(
+                self._snapshot.filter_traces(filters), group_by)
+            result['traced'] = sum(stat.size_diff for stat in statistics)
+            result['sites'] = [{
+                'site': str(stat.traceback),
+                'size': stat.size_diff,
+                'count': stat.count_diff,
+            } for stat in statistics[:limit]]
+        return result
+
+
+def _serve(
+        loop_name: str,
+        tls: bool,
+        signed: bool,
+        port: int,
+        connection: Any,
+) -> None:
+    loop = new_event_loop(loop_name)
+    asyncio.set_event_loop(loop)
+    ssl_context = None
+    if tls:
+        ssl_context = util.create_ssl_context(CERT, keyfile=KEY, dh_params_file=DH_PARAMS)
+    permanent_keys = [util.load_permanent_key(PERMANENT_KEY)] if signed else []
+    server = loop.run_until_complete(serve(
+        ssl_context, permanent_keys, host=HOST, port=port, loop=loop,
+        path_stats_interval=None))
+    measurement = None  # type: Optional[_Measurement]
+    memory_measurement = None  # type: Optional[_MemoryMeasurement]
+
+    # Handle commands of the parent process
+    def _on_command() -> None:
+        nonlocal measurement, memory_measurement
+        command, *arguments = connection.recv()
+        if command == 'start':
+            measurement = _Measurement(server, loop)
+        elif command == 'stop' and measurement is not None:
+            connection.send(measurement.stop())
+            measurement = None
+        elif command == 'start-memory':
+            memory_measurement = _MemoryMeasurement(*arguments)
+            connection.send(None)
+        elif command == 'stop-memory' and memory_measurement is not None:
+            connection.send(memory_measurement.stop(*arguments))
+            memory_measurement = None
+
+    loop.add_reader(connection.fileno(), _on_command)
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    connection.send('ready')
+    loop.run_forever()
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+    loop.close()
+
+
+class ServerProcess:
+    """
+    Runs a server in a separate process, so clients and the server do
+    not compete for the same event loop.
+
+    Arguments:
+        - `loop_name`: The event loop to be used by the server.
+        - `tls`: Whether the server should use TLS.
+        - `signed`: Whether the server should have a permanent key.
+    """
+    def __init__(self, loop_name: str, tls: bool, signed: bool) -> None:
+        self.port = unused_tcp_port()
+        self.url = '{}://{}:{}'.format('wss' if tls else 'ws', HOST, self.port)
+        context = multiprocessing.get_context('spawn')
+        self._connection, connection = context.Pipe()
+        self._process = context.Process(
+            target=_serve, args=(loop_name, tls, signed, self.port, connection),
+            daemon=True)
+
+    def __enter__(self) -> 'ServerProcess':
+        self._process.start()
+        if not self._connection.poll(timeout=30.0):
+            self._process.terminate()
+            raise RuntimeError('Server process did not start')
+        self._connection.recv()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self._process.terminate()
+        self._process.join()
+
+    def start_measurement(self) -> None:
+        """
+        Start measuring the CPU time and task queue sizes of the server.
+        """
+        self._connection.send(('start',))
+
+    def stop_measurement(self) -> Dict[str, Any]:
+        """
+        Stop measuring and return the CPU time in seconds
+        (`cpu_time`) and the maximum task queue size of a client
+        (`max_task_queue_size`).
+        """
+        self._connection.send(('stop',))
+        return self._connection.recv()
+
+    def start_memory_measurement(self, trace: bool = False, frames: int = 1) -> None:
+        """
+        Start measuring the memory of the server. Allocations will be
+        traced with `frames` frames per traceback if `trace` is set.
+        """
+        self._connection.send(('start-memory', trace, frames))
+        self._connection.recv()
+
+    def stop_memory_measurement(
+            self,
+            group_by: str = 'lineno',
+            limit: int = 20,
+    ) -> Dict[str, Any]:
+        """
+        Stop measuring the memory and return the RSS difference in bytes
+        (`rss`). If allocations have been traced, the sum of traced
+        allocations (`traced`) and the `limit` largest allocation sites
+        (`sites`, grouped by `group_by`) are returned as well.
+        """
+        self._connection.send(('stop-memory', group_by, limit))
+        return self._connection.recv()
+
+
+async def authenticate(
+        url: str,
+        key: libnacl.public.SecretKey,
+        initiator_key: libnacl.public.SecretKey,
+        ssl_context: Optional[ssl.SSLContext],
+        permanent_key: Optional[bytes],
+        loop: asyncio.AbstractEventLoop,
+        **kwargs: Any
+) -> Tuple[websockets.WebSocketClientProtocol, Dict[str, Any]]:
+    """
+    Connect to the path of the initiator key and do an initiator (if
+    `key` is the initiator key) or a responder handshake. Return the
+    client and the decrypted `server-auth` message (with the
+    additional fields `id`, `box` as well as `cookie` and `csn` which
+    are the client's cookie and next combined sequence number).
+
+    Raises :exc:`RuntimeError` in case the signed keys are invalid.
+    """
+    client = await websockets.connect(
+        '{}/{}'.format(url, key_path(initiator_key)), ssl=ssl_context,
+        compression=None, subprotocols=SUBPROTOCOLS, ping_interval=None, loop=loop,
+        **kwargs)
+    try:
+        # server-hello
+        message, _, sck, *_ = await unpack_message(client)
+        ssk = message['key']
+        cck, ccsn = random_cookie(), 2 ** 32 - 1
+
+        # client-hello
+        if key is not initiator_key:
+            await pack_message(client, pack_nonce(cck, 0x00, 0x00, ccsn), {
+                'type': 'client-hello',
+                'key': key.pk,
+            })
+            ccsn += 1
+
+        # client-auth
+        box = libnacl.public.Box(sk=key, pk=ssk)
+        payload = {
+            'type': 'client-auth',
+            'your_cookie': sck,
+            'subprotocols': SUBPROTOCOLS,
+        }
+        if permanent_key is not None:
+            payload['your_key'] = permanent_key
+        await pack_message(client, pack_nonce(cck, 0x00, 0x00, ccsn), payload, box=box)
+
+        # server-auth
+        message, nonce, _, _, destination, _ = await unpack_message(client, box=box)
+        if permanent_key is not None:
+            sign_box = libnacl.public.Box(sk=key, pk=permanent_key)
+            signed_keys = sign_box.decrypt(message['signed_keys'], nonce=nonce)
+            if signed_keys != ssk + key.pk:
+                raise RuntimeError('Invalid signed keys')
+    except Exception:
+        await client.close()
+        raise
+    message['id'] = destination
+    message['box'] = box
+    message['cookie'] = cck
+    message['csn'] = ccsn + 1
+    return client, message
+
+
+def write_results(
+        path: str,
+        benchmark: str,
+        parameters: Dict[str, Any],
+        results: List[Dict[str, Any]],
+) -> None:
+    """
+    Write benchmark results including information about the
+    environment as JSON to a file.
+    """
+    with open(path, 'w') as file:
+        json.dump({
+            'benchmark': benchmark,
+            'date': datetime.datetime.utcnow().isoformat() + 'Z',
+            'version': __version__,
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'parameters': parameters,
+            'results': results,
+        }, file, indent=2)
+        file.write('\n')
@@ -0,0 +1,194 @@
+"""
+Benchmark the throughput (handshakes per second) and latency (p50 and
+p99) of initiator and responder handshakes against a local server
+started via :func:`saltyrtc.server.serve` in a separate process.
+
+Covered configurations (all combinations unless restricted):
+
+- `keys`: `signed` (the server has a permanent key and signs the keys
+  in `server-auth`, which the client verifies) or `unsigned` (no
+  permanent key).
+- `transport`: `tls` (WSS) or `plain` (WS).
+- `loop`: `asyncio` or `uvloop` (if installed), used by the server
+  and the clients.
+
+The client side reuses the message packing helpers of
+`tests/conftest.py`, so this needs to be run from the repository root:
+
+    python -m benchmarks.handshake --output handshake.json
+
+Results are written as JSON to allow comparing them between commits.
+"""
+import argparse
+import asyncio
+import itertools
+import ssl
+import time
+from typing import Any  # noqa
+from typing import Dict  # noqa
+from typing import (
+    Iterator,
+    List,
+    Optional,
+)
+
+import libnacl.public
+
+from saltyrtc.server import util
+from tests.conftest import key_pair
+
+from .common import (
+    CERT,
+    LOOPS,
+    PERMANENT_KEY,
+    ServerProcess,
+    authenticate,
+    have_uvloop,
+    latency_summary,
+    new_event_loop,
+    write_results,
+)
+
+KEYS = ('signed', 'unsigned')
+TRANSPORTS = ('tls', 'plain')
+ROLES = ('initiator', 'responder')
+
+
+async def handshake(
+        url: str,
+        role: str,
+        ssl_context: Optional[ssl.SSLContext],
+        initiator_key: libnacl.public.SecretKey,
+        permanent_key: Optional[bytes],
+        loop: asyncio.AbstractEventLoop,
+) -> float:
+    """
+    Do an initiator or responder handshake and return the duration in
+    seconds from connecting until `server-auth` has been processed.
+    """
+    if role == 'initiator':
+        key = initiator_key = key_pair()
+    else:
+        key = key_pair()
+    start = time.perf_counter()
+    client, _ = await authenticate(
+        url, key, initiator_key, ssl_context, permanent_key, loop)
+    duration = time.perf_counter() - start
+    await client.close()
+    return duration
+
+
+async def _run_role(
+        url: str,
+        role: str,
+        ssl_context: Optional[ssl.SSLContext],
+        permanent_key: Optional[bytes],
+        handshakes: int,
+        concurrency: int,
+        loop: asyncio.AbstractEventLoop,
+) -> Dict[str, Any]:
+    # Responders share a path, initiators create a new path each time
+    initiator_key = key_pair()
+    latencies = []  # type: List[float]
+
+    async def _worker(remaining: Iterator[int]) -> None:
+        for _ in remaining:
+            latencies.append(await handshake(
+                url, role, ssl_context, initiator_key, permanent_key, loop))
+
+    remaining = iter(range(handshakes))
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[_worker(remaining) for _ in range(concurrency)], loop=loop)
+    elapsed = time.perf_counter() - start
+    return {
+        'handshakes_per_second': handshakes / elapsed,
+        'latency_ms': latency_summary(latencies),
+    }
+
+
+def run(
+        loop_name: str,
+        transport: str,
+        keys: str,
+        handshakes: int,
+        concurrency: int,
+        warmup: int,
+) -> List[Dict[str, Any]]:
+    """
+    Start a server for a configuration and return the results of each
+    role.
+    """
+    tls, signed = transport == 'tls', keys == 'signed'
+    ssl_context = None
+    if tls:
+        ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=CERT)
+    permanent_key = util.load_permanent_key(PERMANENT_KEY).pk if signed else None
+
+    results = []
+    loop = new_event_loop(loop_name)
+    try:
+        with ServerProcess(loop_name, tls, signed) as server:
+            for role in ROLES:
+                if warmup > 0:
+                    loop.run_until_complete(_run_role(
+                        server.url, role, ssl_context, permanent_key, warmup,
+                        min(warmup, concurrency), loop))
+                result = {
+                    'loop': loop_name,
+                    'transport': transport,
+                    'keys': keys,
+                    'role': role,
+                }
+                result.update(loop.run_until_complete(_run_role(
+                    server.url, role, ssl_context, permanent_key, handshakes,
+                    concurrency, loop)))
+                results.append(result)
+    finally:
+        loop.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--handshakes', type=int, default=1000,
+                        help='Amount of handshakes per role and configuration.')
+    parser.add_argument('-c', '--concurrency', type=int, default=16,
+                        help='Amount of concurrent handshakes.')
+    parser.add_argument('-w', '--warmup', type=int, default=50,
+                        help='Amount of handshakes per role before measuring.')
+    parser.add_argument('--keys', choices=KEYS, action='append')
+    parser.add_argument('--transport', choices=TRANSPORTS, action='append')
+    parser.add_argument('--loop', choices=LOOPS, action='append')
+    parser.add_argument('-o', '--output', help='Write the results to a JSON file.')
+    args = parser.parse_args()
+
+    # Select loops (skip uvloop if unavailable unless explicitly requested)
+    loops = args.loop
+    if loops is None:
+        loops = [name for name in LOOPS if name != 'uvloop' or have_uvloop()]
+    elif 'uvloop' in loops and not have_uvloop():
+        parser.error('uvloop is not installed')
+
+    results = []  # type: List[Dict[str, Any]]
+    for loop_name, transport, keys in itertools.product(
+            loops, args.transport or TRANSPORTS, args.keys or KEYS):
+        for result in run(loop_name, transport, keys, args.handshakes,
+                          args.concurrency, args.warmup):
+            results.append(result)
+            print('{loop:>7} {transport:>5} {keys:>8} {role:>9}: '
+                  '{handshakes_per_second:>8.1f} handshakes/s, '
+                  'p50 {p50:>7.2f} ms, p99 {p99:>7.2f} ms'.format(
+                      p50=result['latency_ms']['p50'],
+                      p99=result['latency_ms']['p99'], **result))
+
+    if args.output is not None:
+        write_results(args.output, 'handshake', {
+            'handshakes': args.handshakes,
+            'concurrency': args.concurrency,
+            'warmup': args.warmup,
+        }, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark the memory per idle authenticated connection of a local
+server started via :func:`saltyrtc.server.serve` in a separate process.
+
+`K` connections (one initiator and `M` responders per path) are being
+established and left idle. The server's memory is measured twice, each
+time in a fresh server process:
+
+- `rss`: The difference of the resident set size without tracing
+  allocations (tracing inflates the RSS).
+- `traced`: The difference of allocations traced by :mod:`tracemalloc`,
+  broken down by allocation site (a source line or, with
+  `--frames > 1`, a traceback).
+
+The numbers cover everything the server allocates for a connection,
+i.e. the `PathClient`, its task queue, futures, tasks and loggers, the
+WebSocket protocol and the TLS object (unless `--transport plain`).
+Note that memory allocated by OpenSSL is not visible to
+:mod:`tracemalloc` and only shows in the RSS.
+
+With `--budget` and/or `--rss-budget`, the benchmark exits with a
+non-zero status if the bytes per connection exceed the budget, so it
+can be used as a regression guard.
+
+This needs to be run from the repository root:
+
+    python -m benchmarks.memory --connections 1000 --budget 65536
+"""
+import argparse
+import asyncio
+import ssl
+import sys
+from typing import Any  # noqa
+from typing import Dict  # noqa
+from typing import (
+    List,
+    Optional,
+)
+
+import websockets
+
+from tests.conftest import key_pair
+
+from .common import (
+    CERT,
+    LOOPS,
+    ServerProcess,
+    authenticate,
+    have_uvloop,
+    new_event_loop,
+    write_results,
+)
+
+TRANSPORTS = ('tls', 'plain')
+
+# Seconds to wait for the server to settle after connecting
+_SETTLE_DELAY = 0.5
+
+
+async def _connect(
+        url: str,
+        connections: int,
+        responders: int,
+        concurrency: int,
+        ssl_context: Optional[ssl.SSLContext],
+        loop: asyncio.AbstractEventLoop,
+) -> List[websockets.WebSocketClientProtocol]:
+    clients = []  # type: List[websockets.WebSocketClientProtocol]
+    semaphore = asyncio.Semaphore(concurrency, loop=loop)
+
+    async def _authenticate(key: Any, initiator_key: Any) -> None:
+        async with semaphore:
+            client, _ = await authenticate(
+                url, key, initiator_key, ssl_context, None, loop)
+            clients.append(client)
+
+    # Initiators first, so each responder joins a path with an initiator
+    initiator_keys = [key_pair() for _ in range(0, connections, responders + 1)]
+    await asyncio.gather(*[
+        _authenticate(initiator_key, initiator_key) for initiator_key in initiator_keys
+    ], loop=loop)
+    await asyncio.gather(*[
+        _authenticate(key_pair(), initiator_keys[index // responders])
+        for index in range(connections - len(initiator_keys))
+    ], loop=loop)
+    return clients
+
+
+def _measure(
+        loop_name: str,
+        transport: str,
+        connections: int,
+        responders: int,
+        concurrency: int,
+        trace: bool,
+        frames: int,
+        group_by: str,
+        limit: int,
+) -> Dict[str, Any]:
+    tls = transport == 'tls'
+    ssl_context = None
+    if tls:
+        ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=CERT)
+    loop = new_event_loop(loop_name)
+    clients = []  # type: List[websockets.WebSocketClientProtocol]
+    try:
+        with ServerProcess(loop_name, tls, False) as server:
+            server.start_memory_measurement(trace=trace, frames=frames)
+            try:
+                clients = loop.run_until_complete(_connect(
+                    server.url, connections, responders, concurrency, ssl_context,
+                    loop))
+                loop.run_until_complete(asyncio.sleep(_SETTLE_DELAY, loop=loop))
+            finally:
+                result = server.stop_memory_measurement(group_by=group_by, limit=limit)
+            loop.run_until_complete(asyncio.gather(
+                *[client.close() for client in clients], loop=loop))
+    finally:
+        loop.close()
+    return result
+
+
+def run(
+        loop_name: str,
+        transport: str,
+        connections: int,
+        responders: int,
+        concurrency: int,
+        frames: int,
+        limit: int,
+) -> Dict[str, Any]:
+    """
+    Return the memory per connection (`rss` and `traced` in bytes) and
+    the largest allocation sites (`sites`, in bytes per connection).
+    """
+    rss = _measure(
+        loop_name, transport, connections, responders, concurrency, False, frames,
+        'lineno', limit)
+    traced = _measure(
+        loop_name, transport, connections, responders, concurrency, True, frames,
+        'traceback' if frames > 1 else 'lineno', limit)
+    return {
+        'loop': loop_name,
+        'transport': transport,
+        'connections': connections,
+        'rss': rss['rss'] / connections,
+        'traced': traced['traced'] / connections,
+        'sites': [{
+            'site': site['site'],
+            'size': site['size'] / connections,
+            'count': site['count'] / connections,
+        } for site in traced['sites']],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', '--connections', type=int, default=500)
+    parser.add_argument('-m', '--responders', type=int, default=1,
+                        help='Amount of responders per path.')
+    parser.add_argument('-c', '--concurrency', type=int, default=16,
+                        help='Amount of concurrent handshakes.')
+    parser.add_argument('-f', '--frames', type=int, default=1,
+                        help='Amount of frames per traced allocation site.')
+    parser.add_argument('-l', '--limit', type=int, default=20,
+                        help='Amount of allocation sites to be reported.')
+    parser.add_argument('--budget', type=int,
+                        help='Fail if the traced bytes per connection exceed this.')
+    parser.add_argument('--rss-budget', type=int,
+                        help='Fail if the RSS bytes per connection exceed this.')
+    parser.add_argument('--transport', choices=TRANSPORTS, action='append')
+    parser.add_argument('--loop', choices=LOOPS, action='append')
+    parser.add_argument('-o', '--output', help='Write the results to a JSON file.')
+    args = parser.parse_args()
+    if args.connections < 1 or args.responders < 0:
+        parser.error('At least one connection is required')
+
+    # Select loops (skip uvloop if unavailable unless explicitly requested)
+    loops = args.loop
+    if loops is None:
+        loops = [name for name in LOOPS if name != 'uvloop' or have_uvloop()]
+    elif 'uvloop' in loops and not have_uvloop():
+        parser.error('uvloop is not installed')
+
+    results = []  # type: List[Dict[str, Any]]
+    exceeded = []  # type: List[str]
+    for loop_name in loops:
+        for transport in args.transport or TRANSPORTS:
+            result = run(
+                loop_name, transport, args.connections, args.responders,
+                args.concurrency, args.frames, args.limit)
+            results.append(result)
+            print('{loop:>7} {transport:>5}: {traced:>9.0f} B traced, {rss:>9.0f} B RSS '
+                  'per connection'.format(**result))
+            for site in result['sites']:
+                print('{:>25.0f} B {:>6.1f} blocks  {}'.format(
+                    site['size'], site['count'], site['site']))
+
+            # Check budgets
+            name = '{} {}'.format(loop_name, transport)
+            if args.budget is not None and result['traced'] > args.budget:
+                exceeded.append('{}: {:.0f} traced bytes per connection exceed {}'.format(
+                    name, result['traced'], args.budget))
+            if args.rss_budget is not None and result['rss'] > args.rss_budget:
+                exceeded.append('{}: {:.0f} RSS bytes per connection exceed {}'.format(
+                    name, result['rss'], args.rss_budget))
+
+    if args.output is not None:
+        write_results(args.output, 'memory', {
+            'responders': args.responders,
+            'frames': args.frames,
+            'budget': args.budget,
+            'rss_budget': args.rss_budget,
+        }, results)
+
+    if len(exceeded) > 0:
+        print('Budget exceeded:\n' + '\n'.join(exceeded), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Micro-benchmarks of the per-message primitives of the server: packing
+each outgoing message type, unpacking incoming messages (relay,
+`client-hello`, `client-auth` and `drop-responder`), signing the keys
+of `server-auth` and validating and incrementing combined sequence
+numbers.
+
+Uses :mod:`pyperf` if installed (all of its options are supported,
+e.g. `--rigorous` or `-o results.json`), otherwise falls back to
+:mod:`timeit`. No network is required:
+
+    python benchmarks/micro.py
+"""
+import argparse
+import asyncio
+import os
+import struct
+import timeit
+from typing import Any  # noqa
+from typing import Dict  # noqa
+from typing import (
+    Callable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import libnacl.public
+import umsgpack
+
+from saltyrtc.server import (
+    INITIATOR_ADDRESS,
+    NONCE_FORMATTER,
+    SERVER_ADDRESS,
+    AddressType,
+    DisconnectedMessage,
+    IncomingMessage,
+    NewInitiatorMessage,
+    NewResponderMessage,
+    PathClient,
+    SendErrorMessage,
+    ServerAuthMessage,
+    ServerHelloMessage,
+    SubProtocol,
+    common,
+)
+
+try:
+    import pyperf
+except ImportError:
+    pyperf = None
+
+_Benchmark = Tuple[str, Callable[[], Any]]
+
+# Minimum time in seconds of a single measurement (`timeit` only)
+_MIN_TIME = 0.05
+
+
+class _Connection:
+    """
+    Minimal stand-in for a :class:`websockets.WebSocketServerProtocol`.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.connection_lost_waiter = asyncio.Future(
+            loop=loop)  # type: asyncio.Future[None]
+        self.close_code = None
+
+
+def _pack_nonce(cookie: bytes, source: int, destination: int, csn: int) -> bytes:
+    return struct.pack(
+        NONCE_FORMATTER, cookie, source, destination, struct.pack('!Q', csn)[2:])
+
+
+def _encrypt(
+        key: libnacl.public.SecretKey,
+        client: PathClient,
+        nonce: bytes,
+        payload: Dict[str, Any],
+) -> bytes:
+    box = libnacl.public.Box(key, client.server_key.pk)
+    _, data = box.encrypt(umsgpack.packb(payload), nonce=nonce, pack_nonce=False)
+    return nonce + data
+
+
+def _create_client(
+        loop: asyncio.AbstractEventLoop,
+        key: libnacl.public.SecretKey,
+        id_: Optional[int] = None,
+) -> PathClient:
+    # Authenticates the client if an id has been provided
+    client = PathClient(_Connection(loop), 1, key.pk, loop=loop)
+    client.server_permanent_key = libnacl.public.SecretKey()
+    if id_ is not None:
+        client.type = AddressType.initiator
+        client.authenticate(id_)
+    return client
+
+
+def _unpack(client: PathClient, packet: bytes) -> Callable[[], Any]:
+    def _run() -> Any:
+        # Reset the incoming sequence number, so the same packet can be
+        # unpacked repeatedly
+        client._csn_in = None
+        return IncomingMessage.unpack(client, packet)
+    return _run
+
+
+def create_benchmarks(loop: asyncio.AbstractEventLoop) -> List[_Benchmark]:
+    """
+    Return the names and functions of all benchmarks.
+    """
+    initiator_key, responder_key = libnacl.public.SecretKey(), libnacl.public.SecretKey()
+    cookie, csn = os.urandom(16), 2 ** 32 - 1
+    subprotocols = [SubProtocol.saltyrtc_v1.value]
+    initiator = _create_client(loop, initiator_key, id_=INITIATOR_ADDRESS)
+    unauthenticated = _create_client(loop, initiator_key)
+    benchmarks = []  # type: List[_Benchmark]
+
+    # Pack outgoing messages
+    messages = [
+        ('server-hello', ServerHelloMessage.create(initiator.server_key.pk)),
+        ('server-auth', ServerAuthMessage.create(
+            INITIATOR_ADDRESS, cookie, responder_ids=[0x02, 0x03])),
+        ('server-auth-signed', ServerAuthMessage.create(
+            INITIATOR_ADDRESS, cookie, sign_keys=True, responder_ids=[0x02, 0x03])),
+        ('new-initiator', NewInitiatorMessage.create(0x02)),
+        ('new-responder', NewResponderMessage.create(0x02)),
+        ('send-error', SendErrorMessage.create(INITIATOR_ADDRESS, os.urandom(8))),
+        ('disconnected', DisconnectedMessage.create(INITIATOR_ADDRESS, 0x02)),
+    ]
+    for name, message in messages:
+        benchmarks.append(('pack-{}'.format(name), lambda m=message: m.pack(initiator)))
+
+    # Unpack incoming messages
+    relay = _pack_nonce(cookie, INITIATOR_ADDRESS, 0x02, csn) + os.urandom(1024)
+    client_hello = _pack_nonce(cookie, SERVER_ADDRESS, SERVER_ADDRESS, csn) + \
+        umsgpack.packb({'type': 'client-hello', 'key': responder_key.pk})
+    client_auth = _encrypt(
+        initiator_key, unauthenticated,
+        _pack_nonce(cookie, SERVER_ADDRESS, SERVER_ADDRESS, csn), {
+            'type': 'client-auth',
+            'your_cookie': unauthenticated.cookie_out,
+            'subprotocols': subprotocols,
+        })
+    drop_responder = _encrypt(
+        initiator_key, initiator,
+        _pack_nonce(cookie, INITIATOR_ADDRESS, SERVER_ADDRESS, csn), {
+            'type': 'drop-responder',
+            'id': 0x02,
+        })
+    benchmarks += [
+        ('unpack-relay', _unpack(initiator, relay)),
+        ('unpack-client-hello', _unpack(
+            _create_client(loop, initiator_key), client_hello)),
+        ('unpack-client-auth', _unpack(unauthenticated, client_auth)),
+        ('unpack-drop-responder', _unpack(initiator, drop_responder)),
+    ]
+
+    # Sign keys
+    nonce = _pack_nonce(cookie, SERVER_ADDRESS, INITIATOR_ADDRESS, csn)
+    benchmarks.append(('sign-keys', lambda: common.sign_keys(initiator, nonce)))
+
+    # Combined sequence numbers
+    client = _create_client(loop, initiator_key, id_=INITIATOR_ADDRESS)
+    client.validate_csn_in(csn)
+    benchmarks += [
+        ('validate-csn-in', lambda: client.validate_csn_in(csn)),
+        ('increment-csn', lambda: PathClient._increment_csn(csn)),
+    ]
+    return benchmarks
+
+
+def _timeit(func: Callable[[], Any], repeat: int) -> float:
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < _MIN_TIME:
+        number *= 2
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main() -> None:
+    loop = asyncio.new_event_loop()
+    try:
+        benchmarks = create_benchmarks(loop)
+        description = __doc__.split('\n\n')[0]
+
+        # Run via pyperf (if available)
+        if pyperf is not None:
+            runner = pyperf.Runner(processes=2, values=3)
+            runner.argparser.description = description
+            for name, func in benchmarks:
+                runner.bench_func(name, func)
+            return
+
+        # Run via timeit
+        parser = argparse.ArgumentParser(description=description)
+        parser.add_argument('-r', '--repeat', type=int, default=3)
+        parser.add_argument('names', nargs='*', help='Run specific benchmarks only.')
+        args = parser.parse_args()
+        for name, func in benchmarks:
+            if len(args.names) == 0 or name in args.names:
+                print('{:>24}: {:>9.2f} us'.format(
+                    name, _timeit(func, args.repeat) * 1e6))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
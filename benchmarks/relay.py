@@ -0,0 +1,380 @@
+"""
+Benchmark relaying messages between clients over real sockets on
+localhost against a local server started via
+:func:`saltyrtc.server.serve` in a separate process.
+
+The topology consists of `N` paths, each with one initiator and `M`
+responders. Every initiator sends frames to its responders (in turn)
+and every responder sends frames to its initiator, each at a
+configurable rate (frames per second, `0` for unlimited). Each frame
+carries the time it has been sent, so the receiving client can record
+the end-to-end latency.
+
+The server applies backpressure via TCP rather than by queueing: It
+waits for a relayed message to be written to the destination before
+processing the next message of the source. Therefore, the task queue
+of a client on the server never holds more than one relayed message
+per source.
+
+Scenarios:
+
+- `normal`: All clients read as fast as possible.
+- `slow-reader`: The first responder of each path sleeps after each
+  received frame and uses small receive buffers. Once the server
+  cannot write to it any longer, the initiator is throttled to the
+  pace of the slow reader and its frames to the other responders are
+  blocked behind it (head-of-line blocking). This shows as a lower
+  rate of sent frames and increased latency. Note that the socket
+  buffers of the server can hold several megabytes, so this requires
+  large frames or a long duration.
+- `flooding`: Responders send frames as fast as possible to the
+  initiator. They are throttled to the rate at which the server can
+  write to the initiator and their frames back up in the socket
+  buffers. This shows as increased latency.
+
+Reported are frames per second sent and frames and bytes per second
+received by clients, the CPU time of the server per frame, the maximum
+task queue size of a client on the server and latency percentiles
+(separately for frames received by slow readers). Note that all
+clients run in a single process, so it may saturate before the server
+does.
+
+This needs to be run from the repository root:
+
+    python -m benchmarks.relay --paths 10 --responders 2 --output relay.json
+"""
+import argparse
+import asyncio
+import socket
+import struct
+import time
+from typing import Any  # noqa
+from typing import Dict  # noqa
+from typing import (
+    List,
+    Optional,
+)
+
+import umsgpack
+import websockets
+
+from saltyrtc.server import NONCE_LENGTH
+from tests.conftest import (
+    key_pair,
+    pack_nonce,
+)
+
+from .common import (
+    HOST,
+    LOOPS,
+    ServerProcess,
+    authenticate,
+    have_uvloop,
+    latency_summary,
+    new_event_loop,
+    write_results,
+)
+
+SCENARIOS = ('normal', 'slow-reader', 'flooding')
+
+# Format of the time a frame has been sent at (prepended to the payload)
+_TIMESTAMP = struct.Struct('!d')
+
+# Buffer sizes of slow readers (small, so the server cannot buffer frames for them)
+_SLOW_MAX_QUEUE = 1
+_SLOW_READ_LIMIT = 2 ** 12
+_SLOW_RECEIVE_BUFFER = 2 ** 12
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.measuring = False
+        self.sent = 0
+        self.frames = 0
+        self.bytes = 0
+        self.send_errors = 0
+        self.latencies = []  # type: List[float]
+        self.slow_latencies = []  # type: List[float]
+
+
+class _Client:
+    def __init__(
+            self,
+            ws_client: websockets.WebSocketClientProtocol,
+            server_auth: Dict[str, Any],
+    ) -> None:
+        self.ws_client = ws_client
+        self.id = server_auth['id']
+        self.box = server_auth['box']
+        self.cookie = server_auth['cookie']
+        self.csn = server_auth['csn']
+        self.peers = []  # type: List[int]
+        self.slow = False
+
+    async def send(self, destination: int, size: int) -> None:
+        nonce = pack_nonce(self.cookie, self.id, destination, self.csn)
+        self.csn += 1
+        payload = _TIMESTAMP.pack(time.perf_counter())
+        await self.ws_client.send(b''.join((nonce, payload, bytes(size - len(payload)))))
+
+
+async def _send_loop(
+        client: _Client,
+        stats: _Stats,
+        size: int,
+        rate: float,
+        loop: asyncio.AbstractEventLoop,
+) -> None:
+    start, sent = loop.time(), 0
+    while True:
+        await client.send(client.peers[sent % len(client.peers)], size)
+        sent += 1
+        if stats.measuring:
+            stats.sent += 1
+        if rate > 0:
+            await asyncio.sleep(
+                max(0.0, start + sent / rate - loop.time()), loop=loop)
+        else:
+            await asyncio.sleep(0, loop=loop)
+
+
+async def _receive_loop(
+        client: _Client,
+        stats: _Stats,
+        slow_delay: float,
+        loop: asyncio.AbstractEventLoop,
+) -> None:
+    while True:
+        data = await client.ws_client.recv()
+        received_at = time.perf_counter()
+        nonce, payload = data[:NONCE_LENGTH], data[NONCE_LENGTH:]
+        if not stats.measuring:
+            pass
+        elif nonce[16] == 0x00:
+            # Message from the server
+            message = umsgpack.unpackb(client.box.decrypt(payload, nonce=nonce))
+            if message['type'] == 'send-error':
+                stats.send_errors += 1
+        else:
+            sent_at, = _TIMESTAMP.unpack_from(payload)
+            stats.frames += 1
+            stats.bytes += len(data)
+            latencies = stats.slow_latencies if client.slow else stats.latencies
+            latencies.append(received_at - sent_at)
+        if client.slow:
+            await asyncio.sleep(slow_delay, loop=loop)
+
+
+async def _slow_socket(port: int, loop: asyncio.AbstractEventLoop) -> socket.socket:
+    """
+    Return a socket connected to the server with a small receive
+    buffer. It needs to be set before connecting since the advertised
+    window is not being shrunk afterwards.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _SLOW_RECEIVE_BUFFER)
+    try:
+        await loop.sock_connect(sock, (HOST, port))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+async def _connect(
+        url: str,
+        port: int,
+        paths: int,
+        responders: int,
+        slow_reader: bool,
+        loop: asyncio.AbstractEventLoop,
+) -> List[List[_Client]]:
+    topology = []
+    for _ in range(paths):
+        initiator_key = key_pair()
+        ws_client, server_auth = await authenticate(
+            url, initiator_key, initiator_key, None, None, loop, close_timeout=1)
+        initiator = _Client(ws_client, server_auth)
+        clients = [initiator]
+        for index in range(responders):
+            slow = slow_reader and index == 0
+            kwargs = {}  # type: Dict[str, Any]
+            if slow:
+                kwargs = {
+                    'sock': await _slow_socket(port, loop),
+                    'max_queue': _SLOW_MAX_QUEUE,
+                    'read_limit': _SLOW_READ_LIMIT,
+                }
+            ws_client, server_auth = await authenticate(
+                url, key_pair(), initiator_key, None, None, loop, close_timeout=1,
+                **kwargs)
+            responder = _Client(ws_client, server_auth)
+            responder.slow = slow
+            responder.peers.append(initiator.id)
+            initiator.peers.append(responder.id)
+            clients.append(responder)
+        topology.append(clients)
+    return topology
+
+
+async def _run(
+        server: ServerProcess,
+        scenario: str,
+        paths: int,
+        responders: int,
+        size: int,
+        rate: float,
+        slow_delay: float,
+        warmup: float,
+        duration: float,
+        loop: asyncio.AbstractEventLoop,
+) -> Dict[str, Any]:
+    slow_reader = scenario == 'slow-reader'
+    topology = await _connect(
+        server.url, server.port, paths, responders, slow_reader, loop)
+    stats = _Stats()
+    tasks = []  # type: List[asyncio.Task[None]]
+    for initiator, *responders_ in topology:
+        tasks.append(loop.create_task(_send_loop(initiator, stats, size, rate, loop)))
+        for responder in responders_:
+            responder_rate = 0.0 if scenario == 'flooding' else rate
+            tasks.append(loop.create_task(
+                _send_loop(responder, stats, size, responder_rate, loop)))
+        for client in [initiator] + responders_:
+            tasks.append(loop.create_task(_receive_loop(client, stats, slow_delay, loop)))
+
+    try:
+        # Warm up, then measure
+        await asyncio.sleep(warmup, loop=loop)
+        server.start_measurement()
+        stats.measuring = True
+        start = time.perf_counter()
+        await asyncio.sleep(duration, loop=loop)
+        stats.measuring = False
+        elapsed = time.perf_counter() - start
+        server_stats = server.stop_measurement()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, loop=loop, return_exceptions=True)
+        await asyncio.gather(*[
+            client.ws_client.close() for clients in topology for client in clients
+        ], loop=loop, return_exceptions=True)
+
+    frames = max(stats.frames, 1)
+    return {
+        'sent_frames_per_second': stats.sent / elapsed,
+        'frames_per_second': stats.frames / elapsed,
+        'bytes_per_second': stats.bytes / elapsed,
+        'server_cpu_us_per_frame': server_stats['cpu_time'] / frames * 1e6,
+        'server_cpu_utilisation': server_stats['cpu_time'] / elapsed,
+        'max_task_queue_size': server_stats['max_task_queue_size'],
+        'send_errors': stats.send_errors,
+        'latency_ms': latency_summary(stats.latencies),
+        'slow_reader_latency_ms': latency_summary(stats.slow_latencies),
+    }
+
+
+def run(
+        loop_name: str,
+        scenario: str,
+        paths: int,
+        responders: int,
+        size: int,
+        rate: float,
+        slow_delay: float,
+        warmup: float,
+        duration: float,
+) -> Dict[str, Any]:
+    """
+    Start a server and return the results of a scenario.
+    """
+    loop = new_event_loop(loop_name)
+    try:
+        with ServerProcess(loop_name, False, False) as server:
+            result = {
+                'loop': loop_name,
+                'scenario': scenario,
+                'paths': paths,
+                'responders': responders,
+                'size': size,
+                'rate': rate,
+            }  # type: Dict[str, Any]
+            result.update(loop.run_until_complete(_run(
+                server, scenario, paths, responders, size, rate, slow_delay,
+                warmup, duration, loop)))
+            return result
+    finally:
+        loop.close()
+
+
+def _format_latency(latency: Optional[Dict[str, float]]) -> str:
+    if latency is None:
+        return '-'
+    return 'p50 {p50:.2f} ms, p99 {p99:.2f} ms'.format(**latency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-p', '--paths', type=int, default=10)
+    parser.add_argument('-m', '--responders', type=int, default=2,
+                        help='Amount of responders per path.')
+    parser.add_argument('-s', '--size', type=int, action='append',
+                        help='Frame payload size in bytes (at least 8), may be '
+                             'repeated. Defaults to 1024.')
+    parser.add_argument('-r', '--rate', type=float, default=100.0,
+                        help='Frames per second sent by each client, 0 for '
+                             'unlimited.')
+    parser.add_argument('--slow-delay', type=float, default=0.1,
+                        help='Seconds a slow reader sleeps after each frame.')
+    parser.add_argument('-w', '--warmup', type=float, default=1.0,
+                        help='Seconds of traffic before measuring.')
+    parser.add_argument('-d', '--duration', type=float, default=10.0,
+                        help='Seconds of measured traffic.')
+    parser.add_argument('--scenario', choices=SCENARIOS, action='append')
+    parser.add_argument('--loop', choices=LOOPS, action='append')
+    parser.add_argument('-o', '--output', help='Write the results to a JSON file.')
+    args = parser.parse_args()
+    sizes = args.size or [1024]
+    if args.paths < 1 or args.responders < 1:
+        parser.error('At least one path with one responder is required')
+    if min(sizes) < _TIMESTAMP.size:
+        parser.error('Frame payload size must be at least {}'.format(_TIMESTAMP.size))
+
+    # Select loops (skip uvloop if unavailable unless explicitly requested)
+    loops = args.loop
+    if loops is None:
+        loops = [name for name in LOOPS if name != 'uvloop' or have_uvloop()]
+    elif 'uvloop' in loops and not have_uvloop():
+        parser.error('uvloop is not installed')
+
+    results = []  # type: List[Dict[str, Any]]
+    for loop_name in loops:
+        for scenario in args.scenario or SCENARIOS:
+            for size in sizes:
+                result = run(
+                    loop_name, scenario, args.paths, args.responders, size, args.rate,
+                    args.slow_delay, args.warmup, args.duration)
+                results.append(result)
+                print('{loop:>7} {scenario:>11} {size:>6} B: '
+                      '{sent_frames_per_second:>9.1f} sent/s, '
+                      '{frames_per_second:>9.1f} frames/s, {megabytes:>7.2f} MB/s, '
+                      '{server_cpu_us_per_frame:>6.1f} us CPU/frame, '
+                      'max queue {max_task_queue_size:>3}, {latency}, '
+                      'slow readers: {slow_latency}'.format(
+                          megabytes=result['bytes_per_second'] / 1e6,
+                          latency=_format_latency(result['latency_ms']),
+                          slow_latency=_format_latency(result['slow_reader_latency_ms']),
+                          **result))
+
+    if args.output is not None:
+        write_results(args.output, 'relay', {
+            'slow_delay': args.slow_delay,
+            'warmup': args.warmup,
+            'duration': args.duration,
+        }, results)
+
+
+if __name__ == '__main__':
+    main()
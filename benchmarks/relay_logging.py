@@ -0,0 +1,127 @@
+"""
+Benchmark the relay hot path of :class:`PathClient` (receiving a relay
+message from the initiator and sending it to the responder) with
+different logging configurations:
+
+- `guarded`: Logging disabled, debug and trace calls are skipped by
+  the cached level guards.
+- `unguarded`: Logging disabled but every debug and trace call reaches
+  the logger (the behaviour before the level guards were added).
+- `enabled`: Debug logging enabled with a handler that discards all
+  records (for reference).
+
+The connections are replaced by in-memory stubs, so the results only
+cover the server's per-frame processing.
+"""
+import argparse
+import asyncio
+import os
+import struct
+import time
+from typing import Dict  # noqa
+from typing import Tuple
+
+import logbook
+
+from saltyrtc.server import (
+    NONCE_FORMATTER,
+    AddressType,
+    Path,
+    PathClient,
+    util,
+)
+
+MODES = ('guarded', 'unguarded', 'enabled')
+
+
+class _Connection:
+    """
+    Minimal stand-in for a :class:`websockets.WebSocketServerProtocol`.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, packet: bytes) -> None:
+        self.connection_lost_waiter = asyncio.Future(
+            loop=loop)  # type: asyncio.Future[None]
+        self.close_code = None
+        self._packet = packet
+
+    async def send(self, _: bytes) -> None:
+        pass
+
+    async def recv(self) -> bytes:
+        return self._packet
+
+
+def _relay_packet(size: int) -> bytes:
+    # Relay message from the initiator (0x01) to the first responder (0x02)
+    csn = b'\x00\x00\x00\x00\x00\x01'
+    nonce = struct.pack(NONCE_FORMATTER, os.urandom(16), 0x01, 0x02, csn)
+    return nonce + os.urandom(size)
+
+
+def _create_clients(
+        loop: asyncio.AbstractEventLoop,
+        size: int,
+) -> Tuple[PathClient, PathClient]:
+    initiator_key = os.urandom(32)
+    packet = _relay_packet(size)
+    path = Path(initiator_key, 1)
+    initiator = PathClient(_Connection(loop, packet), 1, initiator_key, loop=loop)
+    initiator.type = AddressType.initiator
+    path.set_initiator(initiator)
+    responder = PathClient(_Connection(loop, packet), 1, initiator_key, loop=loop)
+    responder.type = AddressType.responder
+    path.add_responder(responder)
+    return initiator, responder
+
+
+async def _relay(initiator: PathClient, responder: PathClient, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        message = await initiator.receive()
+        await responder.send(message)
+    return time.perf_counter() - start
+
+
+def run(mode: str, iterations: int, size: int, repeat: int) -> float:
+    """
+    Return the best relay rate (messages per second) of a mode.
+    """
+    loop = asyncio.new_event_loop()
+    handler = logbook.NullHandler()
+    try:
+        if mode == 'enabled':
+            util.enable_logging(level=logbook.DEBUG)
+            handler.push_application()
+        else:
+            util.disable_logging()
+            if mode == 'unguarded':
+                util.log_guard.debug = util.log_guard.trace = True
+        initiator, responder = _create_clients(loop, size)
+        best = min(loop.run_until_complete(_relay(initiator, responder, iterations))
+                   for _ in range(repeat))
+    finally:
+        if mode == 'enabled':
+            handler.pop_application()
+        util.disable_logging()
+        loop.close()
+    return iterations / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--iterations', type=int, default=20000)
+    parser.add_argument('-s', '--size', type=int, default=1024,
+                        help='Payload size of the relayed messages in bytes.')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rates = {}  # type: Dict[str, float]
+    for mode in MODES:
+        rates[mode] = run(mode, args.iterations, args.size, args.repeat)
+        print('{:>10}: {:>10.0f} relays/s'.format(mode, rates[mode]))
+    print('Speedup of guarded vs. unguarded: {:.2f}x'.format(
+        rates['guarded'] / rates['unguarded']))
+
+
+if __name__ == '__main__':
+    main()
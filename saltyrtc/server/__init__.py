@@ -4,22 +4,40 @@ This is a SaltyRTC server implementation for Python 3.5.3+ using
 """
 import itertools
 
+from .admin import *  # noqa
+from .clock import *  # noqa
 from .common import *  # noqa
+from .eventlog import *  # noqa
 from .events import *  # noqa
 from .exception import *  # noqa
+from .health import *  # noqa
+from .loadtest import *  # noqa
 from .message import *  # noqa
+from .metrics import *  # noqa
+from .profiling import *  # noqa
 from .protocol import *  # noqa
 from .server import *  # noqa
+from .systemd import *  # noqa
+from .transport import *  # noqa
 from .util import *  # noqa
 
 __all__ = tuple(itertools.chain(
     ('bin', 'typing'),
+    admin.__all__,  # noqa
+    clock.__all__,  # noqa
     common.__all__,  # noqa
+    eventlog.__all__,  # noqa
     events.__all__,  # noqa
     exception.__all__,  # noqa
+    health.__all__,  # noqa
+    loadtest.__all__,  # noqa
     message.__all__,  # noqa
+    metrics.__all__,  # noqa
+    profiling.__all__,  # noqa
     protocol.__all__,  # noqa
     server.__all__,  # noqa
+    systemd.__all__,  # noqa
+    transport.__all__,  # noqa
     util.__all__,  # noqa
 ))
 
@@ -0,0 +1,420 @@
+"""
+This module provides an introspection and administration API for the
+SaltyRTC Signalling Server which can be served on a Unix domain socket.
+
+Each request and each response is a JSON object on a single line. A
+request contains the `command` and its arguments, for example::
+
+    {"command": "clients", "state": "restricted", "min_age": 40}
+
+Responses contain the field `ok` which is `false` in case the request
+failed. In that case, the field `error` describes the problem.
+"""
+import asyncio
+import binascii
+import json
+import os
+from typing import Dict  # noqa
+from typing import Iterable  # noqa
+from typing import List  # noqa
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Optional,
+    Tuple,
+)
+
+from . import util
+from .common import (
+    AddressType,
+    ClientState,
+    CloseCode,
+)
+from .protocol import (
+    Path,
+    PathClient,
+)
+from .typing import InitiatorPublicPermanentKey
+
+if TYPE_CHECKING:
+    from .server import (  # noqa
+        Server,
+        ServerProtocol,
+    )
+
+__all__ = (
+    'AdminAPI',
+    'serve_admin',
+)
+
+# Constants
+_DEFAULT_LIMIT = 100
+_MAX_LIMIT = 1000
+
+# Do not export!
+Snapshot = Dict[str, Any]
+Handler = Callable[..., Snapshot]
+
+
+class AdminAPI:
+    """
+    Provides JSON-compatible snapshots of the paths and clients of a
+    :class:`Server` instance and allows to drop clients and paths.
+
+    Arguments:
+        - `server`: The :class:`Server` instance.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+    """
+    CLIENT_SORT_KEYS = (
+        'age', 'idle', 'task_queue_size', 'keep_alive_pings', 'bytes_in', 'bytes_out',
+    )
+    PATH_SORT_KEYS = ('number', 'responders', 'task_queue_size')
+
+    def __init__(
+            self,
+            server: 'Server',
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        self._log = util.get_logger('admin')
+        self._loop = asyncio.get_event_loop() if loop is None else loop
+        self.server = server
+        self._commands = {
+            'paths': self.paths,
+            'clients': self.clients,
+            'drop_client': self.drop_client,
+            'drop_path': self.drop_path,
+        }  # type: Dict[str, Handler]
+
+    def handle_request(self, request: Any) -> Snapshot:
+        """
+        Dispatch a decoded request to the corresponding command and
+        return the response.
+        """
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': 'Request must be an object'}
+        arguments = dict(request)
+        command = arguments.pop('command', None)
+        try:
+            handler = self._commands[command]
+        except (KeyError, TypeError):
+            return {'ok': False, 'error': 'Unknown command: {}'.format(command)}
+        try:
+            response = handler(**arguments)
+        except (TypeError, ValueError) as exc:
+            return {'ok': False, 'error': str(exc)}
+        response['ok'] = True
+        return response
+
+    def paths(
+            self,
+            path: Optional[str] = None,
+            min_responders: int = 0,
+            sort: str = 'number',
+            offset: int = 0,
+            limit: int = _DEFAULT_LIMIT,
+    ) -> Snapshot:
+        """
+        Return a snapshot of the paths including their clients.
+
+        Arguments:
+            - `path`: Only include the path with this hex-encoded
+              initiator's public permanent key.
+            - `min_responders`: Only include paths with at least this
+              amount of responders.
+            - `sort`: Sort paths in descending order by one of
+              :attr:`PATH_SORT_KEYS`, except for `number` which sorts
+              in ascending order.
+            - `offset`, `limit`: Paging of the sorted paths.
+
+        Raises :exc:`ValueError` in case an argument is invalid.
+        """
+        if sort not in self.PATH_SORT_KEYS:
+            raise ValueError('Invalid sort key: {}'.format(sort))
+        if path is not None:
+            path_ = self.server.paths.paths.get(self._initiator_key(path))
+            paths = [] if path_ is None else [path_]  # type: Iterable[Path]
+        else:
+            paths = self.server.paths.paths.values()
+
+        # Snapshot, filter and sort
+        now = self._loop.time()
+        snapshots = [self._path_snapshot(path_, now) for path_ in paths]
+        snapshots = [snapshot for snapshot in snapshots
+                     if len(snapshot['responders']) >= min_responders]
+        if sort == 'number':
+            snapshots.sort(key=lambda snapshot: snapshot['number'])
+        elif sort == 'responders':
+            snapshots.sort(key=lambda snapshot: len(snapshot['responders']), reverse=True)
+        else:
+            snapshots.sort(key=lambda snapshot: snapshot[sort], reverse=True)
+        total, snapshots = self._page(snapshots, offset, limit)
+        return {'total': total, 'paths': snapshots}
+
+    def clients(
+            self,
+            path: Optional[str] = None,
+            state: Optional[str] = None,
+            type: Optional[str] = None,
+            min_age: float = 0.0,
+            min_idle: float = 0.0,
+            sort: str = 'age',
+            offset: int = 0,
+            limit: int = _DEFAULT_LIMIT,
+    ) -> Snapshot:
+        """
+        Return a snapshot of all connected clients, including those
+        that have not completed the handshake, yet.
+
+        Arguments:
+            - `path`: Only include clients of the path with this
+              hex-encoded initiator's public permanent key.
+            - `state`: Only include clients in this
+              :class:`ClientState` (by name).
+            - `type`: Only include clients of this :class:`AddressType`
+              (by name). Use `undetermined` for clients whose type has
+              not been determined, yet.
+            - `min_age`: Only include clients that have been connected
+              for at least this amount of seconds.
+            - `min_idle`: Only include clients that have neither sent
+              nor received a message for at least this amount of
+              seconds.
+            - `sort`: Sort clients in descending order by one of
+              :attr:`CLIENT_SORT_KEYS`.
+            - `offset`, `limit`: Paging of the sorted clients.
+
+        Raises :exc:`ValueError` in case an argument is invalid.
+        """
+        if sort not in self.CLIENT_SORT_KEYS:
+            raise ValueError('Invalid sort key: {}'.format(sort))
+        initiator_key = None if path is None else self._initiator_key(path)
+        state_ = None if state is None else self._enum(ClientState, state)
+        type_ = None
+        if type is not None and type != 'undetermined':
+            type_ = self._enum(AddressType, type)
+
+        # Snapshot, filter and sort
+        now = self._loop.time()
+        snapshots = []  # type: List[Snapshot]
+        for protocol in self.server.protocols:
+            client, path_ = protocol.client, protocol.path
+            if client is None or path_ is None:
+                continue
+            if initiator_key is not None and path_.initiator_key != initiator_key:
+                continue
+            if state_ is not None and client.state != state_:
+                continue
+            if type is not None and client.type != type_:
+                continue
+            snapshot = self._client_snapshot(client, now)
+            if snapshot['age'] < min_age or snapshot['idle'] < min_idle:
+                continue
+            snapshot['path'] = self._hex_path(path_)
+            snapshots.append(snapshot)
+        snapshots.sort(key=lambda snapshot: snapshot[sort], reverse=True)
+        total, snapshots = self._page(snapshots, offset, limit)
+        return {'total': total, 'clients': snapshots}
+
+    def drop_client(
+            self,
+            handle: str,
+            code: int = CloseCode.going_away.value,
+    ) -> Snapshot:
+        """
+        Drop a client.
+
+        Arguments:
+            - `handle`: The handle of the client as provided by the
+              snapshots.
+            - `code`: The close code. Defaults to `going_away` which
+              distinguishes administrative drops from drops by the
+              initiator.
+
+        Raises :exc:`ValueError` in case an argument is invalid.
+        """
+        code_ = self._close_code(code)
+        for protocol in self.server.protocols:
+            client = protocol.client
+            if client is not None and self._handle(client) == handle:
+                return {'dropped': self._drop(protocol, client, code_)}
+        raise ValueError('Unknown client: {}'.format(handle))
+
+    def drop_path(
+            self,
+            path: str,
+            code: int = CloseCode.going_away.value,
+    ) -> Snapshot:
+        """
+        Drop all clients of a path.
+
+        Arguments:
+            - `path`: The hex-encoded initiator's public permanent key.
+            - `code`: The close code. Defaults to `going_away` which
+              distinguishes administrative drops from drops by the
+              initiator.
+
+        Raises :exc:`ValueError` in case an argument is invalid.
+        """
+        code_ = self._close_code(code)
+        initiator_key = self._initiator_key(path)
+        dropped = 0
+        for protocol in list(self.server.protocols):
+            client, path_ = protocol.client, protocol.path
+            if client is None or path_ is None or path_.initiator_key != initiator_key:
+                continue
+            if self._drop(protocol, client, code_):
+                dropped += 1
+        return {'dropped': dropped}
+
+    def _drop(
+            self,
+            protocol: 'ServerProtocol',
+            client: PathClient,
+            code: CloseCode,
+    ) -> bool:
+        """
+        Drop an authenticated client or close the connection of a
+        client that has not completed the handshake, yet.
+
+        Return whether the client has been dropped (or closed).
+        """
+        if client.state == ClientState.dropped or client.connection_closed_future.done():
+            return False
+        self._log.notice('Dropping client {} (code: {})', client, code)
+        if client.state == ClientState.authenticated:
+            # noinspection PyProtectedMember
+            protocol._drop_client(client, code, by_admin=True)
+        else:
+            self._loop.create_task(client.close(code.value))
+        return True
+
+    def _path_snapshot(self, path: Path, now: float) -> Snapshot:
+        try:
+            initiator = self._client_snapshot(
+                path.get_initiator(), now)  # type: Optional[Snapshot]
+        except KeyError:
+            initiator = None
+        responders = [self._client_snapshot(path.get_responder(id_), now)
+                      for id_ in sorted(path.get_responder_ids())]
+        clients = responders if initiator is None else [initiator] + responders
+        return {
+            'path': self._hex_path(path),
+            'number': path.number,
+            'initiator': initiator,
+            'responders': responders,
+            'task_queue_size': sum(client['task_queue_size'] for client in clients),
+        }
+
+    def _client_snapshot(self, client: PathClient, now: float) -> Snapshot:
+        return {
+            'handle': self._handle(client),
+            'id': client.id,
+            'type': None if client.type is None else client.type.name,
+            'state': client.state.name,
+            'task_queue_size': client.task_queue_size,
+            'keep_alive_pings': client.keep_alive_pings,
+            'age': now - client.connected_at,
+            'idle': now - client.last_activity,
+            'bytes_in': client.bytes_in,
+            'bytes_out': client.bytes_out,
+        }
+
+    @staticmethod
+    def _handle(client: PathClient) -> str:
+        # Note: Matches the identifier used in the client's logger name
+        return '{:x}'.format(id(client))
+
+    @staticmethod
+    def _hex_path(path: Path) -> str:
+        return binascii.hexlify(path.initiator_key).decode('ascii')
+
+    @staticmethod
+    def _initiator_key(path: str) -> InitiatorPublicPermanentKey:
+        try:
+            return InitiatorPublicPermanentKey(binascii.unhexlify(path))
+        except (binascii.Error, TypeError, ValueError) as exc:
+            raise ValueError('Invalid path: {}'.format(path)) from exc
+
+    @staticmethod
+    def _enum(enum_class: Any, name: str) -> Any:
+        try:
+            return enum_class[name]
+        except KeyError as exc:
+            raise ValueError('Invalid {}: {}'.format(enum_class.__name__, name)) from exc
+
+    @staticmethod
+    def _close_code(code: int) -> CloseCode:
+        try:
+            return CloseCode(code)
+        except ValueError as exc:
+            raise ValueError('Invalid close code: {}'.format(code)) from exc
+
+    @staticmethod
+    def _page(
+            snapshots: List[Snapshot],
+            offset: int,
+            limit: int,
+    ) -> Tuple[int, List[Snapshot]]:
+        if offset < 0 or not 0 < limit <= _MAX_LIMIT:
+            raise ValueError('Offset must be positive and limit between 1 and {}'.format(
+                _MAX_LIMIT))
+        return len(snapshots), snapshots[offset:offset + limit]
+
+
+async def serve_admin(
+        server: 'Server',
+        path: str,
+        mode: int = 0o600,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> asyncio.AbstractServer:
+    """
+    Serve the :class:`AdminAPI` of a server on a Unix domain socket.
+    The listener will be closed along with the server.
+
+    Arguments:
+        - `server`: The :class:`Server` instance.
+        - `path`: The path of the Unix domain socket.
+        - `mode`: The file permissions of the socket. Defaults to
+          read and write access for the owner only.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    log = util.get_logger('admin')
+    api = AdminAPI(server, loop=loop)
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    response = {'ok': False, 'error': 'Invalid JSON'}  # type: Snapshot
+                else:
+                    response = api.handle_request(request)
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError) as exc:
+            log.debug('Admin connection failed: {}', repr(exc))
+        finally:
+            writer.close()
+
+    # Start listener
+    # Note: The socket is being bound before the first suspension point, so the
+    #       restrictive umask ensures it is never accessible by others.
+    umask = os.umask(0o077)
+    try:
+        admin_server = await asyncio.start_unix_server(_handle, path=path, loop=loop)
+    finally:
+        os.umask(umask)
+    os.chmod(path, mode)
+    log.info('Serving admin API on {}', path)
+
+    # Close along with the server
+    server.add_auxiliary_server(admin_server)
+    return admin_server
@@ -2,11 +2,17 @@
 The command line interface for the SaltyRTC signalling server.
 """
 import asyncio
+import binascii
 import enum
 import os
 import signal
+import socket
+import ssl
 import stat
+import tempfile
+import time
 from typing import Any  # noqa
+from typing import Callable  # noqa
 from typing import Coroutine  # noqa
 from typing import List  # noqa
 from typing import Optional  # noqa
@@ -17,9 +23,21 @@ import libnacl.public
 
 from . import (
     __version__ as _version,
+    admin,
+    eventlog,
+    health,
+    loadtest as loadtest_,
+    metrics,
+    profiling,
     server,
+    systemd,
+    transport,
     util,
 )
+from .common import (
+    KEY_LENGTH,
+    CloseCode,
+)
 from .typing import ServerSecretPermanentKey  # noqa
 from .typing import LogbookLevel
 
@@ -28,6 +46,7 @@ __all__ = (
     'version',
     'generate',
     'serve',
+    'loadtest',
     'main',
 )
 
@@ -59,12 +78,70 @@ def _get_logging_level(verbosity: int) -> LogbookLevel:
     }[verbosity])
 
 
+def _parse_file_mode(
+        ctx: click.Context,
+        param: click.Parameter,
+        value: Optional[str],
+) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        mode = int(value, 8)
+    except ValueError:
+        raise click.BadParameter('{} is not an octal number'.format(value))
+    if not 0 <= mode <= 0o777:
+        raise click.BadParameter('{} is not a valid file mode'.format(value))
+    return mode
+
+
+def _float_range(
+        min_: Optional[float] = None,
+        max_: Optional[float] = None,
+) -> Callable[[click.Context, click.Parameter, Optional[float]], Optional[float]]:
+    """
+    Return a callback that ensures the value of a float option is
+    within a range (:class:`click.FloatRange` requires click 7).
+    """
+    def _check(
+            ctx: click.Context,
+            param: click.Parameter,
+            value: Optional[float],
+    ) -> Optional[float]:
+        if value is None:
+            return None
+        if (min_ is not None and value < min_) or (max_ is not None and value > max_):
+            raise click.BadParameter('{} is not within the range of {} to {}'.format(
+                value, '-inf' if min_ is None else min_, 'inf' if max_ is None else max_))
+        return value
+    return _check
+
+
+def _dup_socket(sock: socket.socket) -> socket.socket:
+    """
+    Duplicate a socket (equivalent to :meth:`socket.socket.dup`).
+    """
+    return socket.socket(sock.family, sock.type, sock.proto, fileno=os.dup(sock.fileno()))
+
+
 class _ErrorCode(enum.IntEnum):
     safety_error = 2
     import_error = 3
     repeated_keys = 4
 
 
+def _set_event_loop_policy(ctx: click.Context, loop_str: str) -> None:
+    if loop_str == 'uvloop':
+        try:
+            # noinspection PyUnresolvedReferences
+            import uvloop
+        except ImportError:
+            click.echo("Cannot use event loop 'uvloop', make sure it is installed.",
+                       err=True)
+            ctx.exit(code=_ErrorCode.import_error)
+        # noinspection PyUnboundLocalVariable
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
 _logging_levels = 7
 
 
@@ -145,7 +222,14 @@ def generate(key_file: str) -> None:
 @cli.command(short_help='Start the signalling server.', help="""
 Start the SaltyRTC signalling server. A HUP signal will restart the
 server and reload the TLS certificate, the TLS private key and the
-private permanent key of the server.""")
+private permanent key of the server. A USR2 signal will drain the
+server: Connections for new paths will be rejected and the server
+stops once all remaining connections have been closed. A USR1 signal
+will profile the server for a while and, if requested, a QUIT signal
+will print all live tasks. When started by systemd, listening sockets
+passed by socket activation will be used instead of --host, --unix and
+--bind, readiness will be reported and watchdog pings will be sent
+(see examples/saltyrtc-server.service.example).""")
 @click.option('-tc', '--tlscert', type=click.Path(exists=True), help=_h("""
 Path to a PEM file that contains the TLS certificate."""))
 @click.option('-sc', '--sslcert', type=click.Path(exists=True), help=_h("""
@@ -164,8 +248,106 @@ a NaCl private key). You can provide more than one key. The first key
 provided will be used as the primary key."""))
 @click.option('-h', '--host', help='Bind to a specific host.')
 @click.option('-p', '--port', default=443, help='Listen on a specific port.')
+@click.option('--unix', type=click.Path(dir_okay=False), help=_h("""
+Listen on a Unix domain socket at a specific path instead of a host and
+port (e.g. behind a reverse proxy on the same machine)."""))
+@click.option('--unix-mode', metavar='MODE', callback=_parse_file_mode, help=_h("""
+File permissions of the Unix domain socket as an octal number (e.g.
+660). Defaults to the permissions resulting from the umask."""))
+@click.option('-b', '--bind', metavar='ADDRESS', multiple=True, help=_h("""
+Listen on a specific address: 'wss://HOST:PORT' (with TLS),
+'ws://HOST:PORT' (without TLS) or 'unix:PATH' (without TLS). IPv6
+addresses must be enclosed in square brackets and an empty host listens
+on all interfaces. You can provide more than one address, all of them
+will share the same paths. Overrides -h, -p and --unix."""))
 @click.option('-l', '--loop', type=click.Choice(['asyncio', 'uvloop']), default='asyncio',
               help="Use a specific asyncio-compatible event loop. Defaults to 'asyncio'.")
+@click.option('-e', '--engine', default=transport.Engine.websockets.value,
+              type=click.Choice([engine.value for engine in transport.Engine]),
+              help=_h("""
+Use a specific WebSocket implementation. Defaults to 'websockets'."""))
+@click.option('--drain-timeout', type=float, help=_h("""
+Amount of seconds to wait for connections to be closed when draining.
+Remaining connections will be closed afterwards. Defaults to waiting
+forever."""))
+@click.option('--drain-close-code', default=CloseCode.going_away.name,
+              type=click.Choice([code.name for code in CloseCode]), help=_h("""
+Close code used to reject new connections when draining. Defaults to
+'going_away'."""))
+@click.option('--drain-reject-all', is_flag=True, help=_h("""
+Reject all new connections when draining, including those for paths
+that already exist."""))
+@click.option('--shutdown-window', type=float, default=0.0, help=_h("""
+Amount of seconds over which closing the connections will be spread
+when stopping the server. Defaults to closing all connections at
+once."""))
+@click.option('--shutdown-batch-size', type=click.IntRange(min=1), default=100,
+              help=_h("""
+Maximum amount of connections that will be closed at once when stopping
+the server. Defaults to 100."""))
+@click.option('--shutdown-deadline', type=float, help=_h("""
+Amount of seconds after which all remaining connections will be closed
+immediately when stopping the server. Defaults to no deadline."""))
+@click.option('--health', is_flag=True, help=_h("""
+Answer 'GET /health' and 'GET /ready' requests on the listeners with
+plain HTTP responses instead of upgrading them to WebSocket (e.g. for
+load balancers). The server is not ready while draining, stopping or
+while the event loop lags behind."""))
+@click.option('--health-stats', is_flag=True, help=_h("""
+Also answer 'GET /stats' requests with the amount of connections and
+paths as JSON. Implies --health."""))
+@click.option('--health-max-loop-lag', type=float, default=0.5, help=_h("""
+Maximum lag of the event loop in seconds until the server is no longer
+considered ready. Defaults to 0.5."""))
+@click.option('--metrics-host', default='127.0.0.1', help=_h("""
+Bind the metrics endpoint to a specific host. Defaults to
+'127.0.0.1'."""))
+@click.option('--metrics-port', type=int, help=_h("""
+Serve metrics in the Prometheus text format via HTTP on a specific
+port."""))
+@click.option('--metrics-unix', type=click.Path(), help=_h("""
+Serve metrics in the Prometheus text format via HTTP on a Unix domain
+socket at a specific path (instead of a port)."""))
+@click.option('--metrics-relay-latency-per-path', is_flag=True, help=_h("""
+Record the latency of relayed messages for each path in addition to the
+latency of all paths."""))
+@click.option('--admin-unix', type=click.Path(), help=_h("""
+Serve the JSON admin API on a Unix domain socket at a specific path.
+The socket will only be accessible by the owner."""))
+@click.option('--event-log', type=click.Path(dir_okay=False), help=_h("""
+Write a structured log of protocol events (handshakes, relayed messages,
+drops and close codes) as JSON lines to a specific file."""))
+@click.option('--event-log-sample-rate', type=float, callback=_float_range(0.0, 1.0),
+              default=eventlog.EVENT_LOG_SAMPLE_RATE_DEFAULT, help=_h("""
+Fraction of relayed messages that will be written to the event log.
+Defaults to 0.01."""))
+@click.option('--event-log-max-bytes', type=click.IntRange(min=0),
+              default=100 * 1024 * 1024, help=_h("""
+Size in bytes after which the event log will be rotated. 0 disables
+rotation. Defaults to 100 MiB."""))
+@click.option('--event-log-backups', type=click.IntRange(min=0), default=5,
+              help=_h("""
+Amount of rotated event log files that will be kept. Defaults to 5."""))
+@click.option('--profile-duration', type=float, default=30.0, help=_h("""
+Amount of seconds the server will be profiled for when receiving
+SIGUSR1. Defaults to 30 seconds."""))
+@click.option('--profile-format', default=profiling.ProfileFormat.collapsed.value,
+              type=click.Choice([format_.value for format_ in profiling.ProfileFormat]),
+              help=_h("""
+Format of the profile. 'collapsed' samples stacks with a low overhead
+and writes them in a format understood by flame graph tools. 'pstats'
+traces every call with a considerably higher overhead. Defaults to
+'collapsed'."""))
+@click.option('--profile-interval', type=float,
+              default=profiling.SAMPLING_INTERVAL_DEFAULT, help=_h("""
+Sampling interval in seconds for the 'collapsed' profile format.
+Defaults to 0.005."""))
+@click.option('--profile-dir', type=click.Path(file_okay=False), help=_h("""
+Directory the profiles will be written to. Defaults to the system's
+temporary directory."""))
+@click.option('--dump-tasks', is_flag=True, help=_h("""
+Print all live tasks when receiving SIGQUIT instead of quitting (and
+dumping core)."""))
 @click.pass_context
 def serve(ctx: click.Context, **arguments: Any) -> None:
     # Get arguments
@@ -177,7 +359,34 @@ def serve(ctx: click.Context, **arguments: Any) -> None:
     keys_str = arguments['key']  # type: Sequence[str]
     host = arguments.get('host')  # type: Optional[str]
     port = arguments['port']  # type: int
+    unix_path = arguments.get('unix')  # type: Optional[str]
+    unix_mode = arguments.get('unix_mode')  # type: Optional[int]
+    bind_addresses = arguments['bind']  # type: Sequence[str]
     loop_str = arguments['loop']  # type: str
+    engine = transport.Engine(arguments['engine'])
+    drain_timeout = arguments.get('drain_timeout')  # type: Optional[float]
+    drain_close_code = CloseCode[arguments['drain_close_code']]
+    drain_reject_all = arguments['drain_reject_all']  # type: bool
+    shutdown_window = arguments['shutdown_window']  # type: float
+    shutdown_batch_size = arguments['shutdown_batch_size']  # type: int
+    shutdown_deadline = arguments.get('shutdown_deadline')  # type: Optional[float]
+    health_stats = arguments['health_stats']  # type: bool
+    health_enabled = arguments['health'] or health_stats  # type: bool
+    health_max_loop_lag = arguments['health_max_loop_lag']  # type: float
+    metrics_host = arguments['metrics_host']  # type: str
+    metrics_port = arguments.get('metrics_port')  # type: Optional[int]
+    metrics_unix = arguments.get('metrics_unix')  # type: Optional[str]
+    relay_latency_per_path = arguments['metrics_relay_latency_per_path']  # type: bool
+    admin_unix = arguments.get('admin_unix')  # type: Optional[str]
+    event_log_path = arguments.get('event_log')  # type: Optional[str]
+    event_log_sample_rate = arguments['event_log_sample_rate']  # type: float
+    event_log_max_bytes = arguments['event_log_max_bytes']  # type: int
+    event_log_backups = arguments['event_log_backups']  # type: int
+    profile_duration = arguments['profile_duration']  # type: float
+    profile_format = profiling.ProfileFormat(arguments['profile_format'])
+    profile_interval = arguments['profile_interval']  # type: float
+    profile_dir = arguments.get('profile_dir') or tempfile.gettempdir()  # type: str
+    dump_tasks = arguments['dump_tasks']  # type: bool
     safety_off = os.environ.get('SALTYRTC_SAFETY_OFF') == 'yes-and-i-know-what-im-doing'
 
     # Deprecation warning
@@ -203,6 +412,32 @@ def serve(ctx: click.Context, **arguments: Any) -> None:
         ssl_context = util.create_ssl_context(
             certfile=tls_cert, keyfile=tls_key, dh_params_file=dh_params)
 
+    # Use the listening sockets passed by systemd (if any)
+    activated_sockets = systemd.listen_sockets()
+    if len(activated_sockets) > 0:
+        ignored_options = [option for option, value in (
+            ('--host', host), ('--unix', unix_path), ('--bind', bind_addresses),
+        ) if value]
+        if len(ignored_options) > 0:
+            raise click.UsageError('{} cannot be combined with sockets passed by '
+                                   'systemd'.format(', '.join(ignored_options)), ctx=ctx)
+        click.echo('Using {} socket(s) passed by systemd'.format(len(activated_sockets)))
+
+    # Create listeners
+    if len(bind_addresses) > 0:
+        listeners = []  # type: List[server.Listener]
+        for address in bind_addresses:
+            try:
+                listeners.append(server.Listener.from_address(
+                    address, ssl_context=ssl_context, unix_mode=unix_mode))
+            except ValueError as exc:
+                raise click.BadParameter(
+                    "'{}': {}".format(address, exc), ctx=ctx, param_hint="'--bind'")
+    else:
+        listeners = [server.Listener(
+            host=host, port=port, ssl_context=ssl_context, unix_path=unix_path,
+            unix_mode=unix_mode)]
+
     # Get private permanent keys of the server
     keys = [util.load_permanent_key(key)
             for key in keys_str]  # type: List[ServerSecretPermanentKey]
@@ -215,24 +450,40 @@ def serve(ctx: click.Context, **arguments: Any) -> None:
                    err=True)
         ctx.exit(code=_ErrorCode.repeated_keys)
 
+    # Ensure the WebSocket engine is available
+    if engine is transport.Engine.wsproto and transport.wsproto is None:
+        click.echo("Cannot use engine 'wsproto', make sure it is installed.", err=True)
+        ctx.exit(code=_ErrorCode.import_error)
+
     # Set event loop policy
-    if loop_str == 'uvloop':
-        try:
-            # noinspection PyUnresolvedReferences
-            import uvloop
-        except ImportError:
-            click.echo("Cannot use event loop 'uvloop', make sure it is installed.",
-                       err=True)
-            ctx.exit(code=_ErrorCode.import_error)
-        # noinspection PyUnboundLocalVariable
-        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    _set_event_loop_policy(ctx, loop_str)
 
     # Get event loop
     loop = asyncio.get_event_loop()  # type: asyncio.AbstractEventLoop
 
+    # Start writing the event log (if requested)
+    event_log = None  # type: Optional[eventlog.EventLog]
+    if event_log_path is not None:
+        event_log = eventlog.EventLog(
+            event_log_path, relay_sample_rate=event_log_sample_rate,
+            max_bytes=event_log_max_bytes, backup_count=event_log_backups)
+        event_log.start()
+
+    # Send watchdog pings to systemd (if requested)
+    watchdog_task = None  # type: Optional[asyncio.Task[None]]
+    watchdog_timeout = systemd.watchdog_timeout()
+    if watchdog_timeout is not None:
+        watchdog_task = loop.create_task(systemd.watchdog(watchdog_timeout, loop=loop))
+
     while True:
         # Run the server
         click.echo('Starting')
+        if len(activated_sockets) > 0:
+            # Note: Closing the server closes its sockets, so duplicates keep the
+            #       activated sockets open (and new connections queued) while
+            #       restarting.
+            listeners = [server.Listener(ssl_context=ssl_context, sock=_dup_socket(sock))
+                         for sock in activated_sockets]
         if len(keys) > 0:
             primary_key, *secondary_keys = keys
             click.echo('Primary public permanent key: {}'.format(
@@ -240,11 +491,35 @@ def serve(ctx: click.Context, **arguments: Any) -> None:
             for i, key in enumerate(secondary_keys, start=1):
                 click.echo('Secondary key #{}: {}'.format(
                     i, key.hex_pk().decode('ascii')))
+        health_check = None  # type: Optional[health.HealthCheck]
+        if health_enabled:
+            health_check = health.HealthCheck(
+                max_loop_lag=health_max_loop_lag, stats=health_stats)
         coroutine = server.serve(
-            ssl_context, keys,
-            host=host, port=port, loop=loop
+            ssl_context, keys, loop=loop, engine=engine, listeners=listeners,
+            health_check=health_check,
         )  # type: Coroutine[Any, Any, server.Server]
         server_ = loop.run_until_complete(coroutine)
+        for listener in listeners:
+            click.echo('Listening on {}'.format(listener))
+        server_.shutdown_scheduler = server.ShutdownScheduler(
+            window=shutdown_window, batch_size=shutdown_batch_size,
+            deadline=shutdown_deadline)
+
+        # Serve metrics (if requested)
+        server_.metrics.relay_latency_per_path = relay_latency_per_path
+        if metrics_port is not None or metrics_unix is not None:
+            loop.run_until_complete(metrics.serve_metrics(
+                server_, host=metrics_host, port=metrics_port, path=metrics_unix,
+                loop=loop))
+
+        # Serve admin API (if requested)
+        if admin_unix is not None:
+            loop.run_until_complete(admin.serve_admin(server_, admin_unix, loop=loop))
+
+        # Log events (if requested)
+        if event_log is not None:
+            event_log.attach(server_)
 
         # Restart server on HUP signal
         restart_signal = asyncio.Future(loop=loop)  # type: asyncio.Future[None]
@@ -258,15 +533,99 @@ def serve(ctx: click.Context, **arguments: Any) -> None:
         except RuntimeError:
             click.echo('Cannot restart on SIGHUP, signal handler could not be added.')
 
+        # Drain server on USR2 signal
+        drain_signal = asyncio.Future(loop=loop)  # type: asyncio.Future[None]
+
+        def _drain_signal_handler() -> None:
+            if not drain_signal.done():
+                drain_signal.set_result(None)
+
+        # Register drain server routine
+        try:
+            loop.add_signal_handler(signal.SIGUSR2, _drain_signal_handler)
+        except RuntimeError:
+            click.echo('Cannot drain on SIGUSR2, signal handler could not be added.')
+
+        # Profile server on USR1 signal
+        profile_task = None  # type: Optional[asyncio.Task[str]]
+
+        def _profile_done(task: 'asyncio.Task[str]') -> None:
+            if task.cancelled():
+                return
+            exc = task.exception()
+            if exc is not None:
+                click.echo('Profiling failed: {}'.format(exc), err=True)
+            else:
+                click.echo('Profile written to {}'.format(task.result()))
+
+        def _profile_signal_handler() -> None:
+            nonlocal profile_task
+            if profile_task is not None and not profile_task.done():
+                click.echo('Already profiling')
+                return
+            path = os.path.join(profile_dir, 'saltyrtc-profile-{}-{}.{}'.format(
+                os.getpid(), int(time.time()), profile_format.file_extension))
+            click.echo('Profiling for {}s'.format(profile_duration))
+            profile_task = loop.create_task(profiling.profile(
+                profile_duration, path, format_=profile_format,
+                interval=profile_interval, loop=loop))
+            profile_task.add_done_callback(_profile_done)
+
+        # Register profile server routine
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, _profile_signal_handler)
+        except RuntimeError:
+            click.echo('Cannot profile on SIGUSR1, signal handler could not be added.')
+
+        # Dump tasks on QUIT signal
+        def _dump_tasks_signal_handler() -> None:
+            click.echo(profiling.dump_tasks(server_, loop=loop), err=True)
+
+        # Register dump tasks routine (if requested)
+        if dump_tasks:
+            try:
+                loop.add_signal_handler(signal.SIGQUIT, _dump_tasks_signal_handler)
+            except RuntimeError:
+                click.echo('Cannot dump tasks on SIGQUIT, signal handler could not be '
+                           'added.')
+
         # Wait until Ctrl+C has been pressed
         click.echo('Started')
+        systemd.notify('READY=1', 'STATUS=Started')
         try:
-            loop.run_until_complete(restart_signal)
+            loop.run_until_complete(asyncio.wait(
+                [restart_signal, drain_signal], loop=loop,
+                return_when=asyncio.FIRST_COMPLETED))
         except KeyboardInterrupt:
             click.echo()
+        if restart_signal.done():
+            systemd.notify('RELOADING=1', 'STATUS=Restarting')
+        elif drain_signal.done():
+            systemd.notify('STOPPING=1', 'STATUS=Draining')
+        else:
+            systemd.notify('STOPPING=1', 'STATUS=Stopping')
 
-        # Remove the signal handler
+        # Remove the signal handlers
         loop.remove_signal_handler(signal.SIGHUP)
+        loop.remove_signal_handler(signal.SIGUSR2)
+        loop.remove_signal_handler(signal.SIGUSR1)
+        loop.remove_signal_handler(signal.SIGQUIT)
+
+        # Stop profiling (if running)
+        if profile_task is not None and not profile_task.done():
+            profile_task.cancel()
+
+        # Drain the server (if requested)
+        if drain_signal.done():
+            click.echo('Draining')
+            try:
+                loop.run_until_complete(server_.drain(
+                    timeout=drain_timeout, close_code=drain_close_code,
+                    reject_all=drain_reject_all))
+            except KeyboardInterrupt:
+                click.echo()
+        else:
+            drain_signal.cancel()
 
         # Close the server
         click.echo('Stopping')
@@ -279,7 +638,114 @@ def serve(ctx: click.Context, **arguments: Any) -> None:
             restart_signal.cancel()
             break
 
-    # Close loop
+    # Stop sending watchdog pings
+    if watchdog_task is not None:
+        watchdog_task.cancel()
+        try:
+            loop.run_until_complete(watchdog_task)
+        except asyncio.CancelledError:
+            pass
+
+    # Close activated sockets, event log and loop
+    for sock in activated_sockets:
+        sock.close()
+    if event_log is not None:
+        event_log.close()
+    loop.close()
+
+
+@cli.command(short_help='Generate load on a signalling server.', help="""
+Generate load on the SaltyRTC signalling server at URL (e.g.
+wss://localhost:8765). Each path consists of one initiator and a
+configurable amount of responders which relay frames to each other.
+Live statistics will be printed periodically and a final report once
+the duration has elapsed or Ctrl+C has been pressed.""")
+@click.argument('URL')
+@click.option('-i', '--initiators', type=click.IntRange(min=1), default=10, help=_h("""
+Amount of initiators (and therefore paths). Defaults to 10."""))
+@click.option('-r', '--responders', type=click.IntRange(0, 254), default=1, help=_h("""
+Amount of responders per path. Defaults to 1."""))
+@click.option('--connect-rate', type=float, callback=_float_range(min_=0.0),
+              default=100.0, help=_h("""
+Connections per second while ramping up. 0 connects all clients at
+once. Defaults to 100."""))
+@click.option('--relay-rate', type=float, callback=_float_range(min_=0.0),
+              default=1.0, help=_h("""
+Frames per second each client relays to the other clients of its path
+(in turn). 0 disables relaying. Defaults to 1."""))
+@click.option('--frame-size', type=click.IntRange(min=8), default=1024, help=_h("""
+Payload size of a relayed frame in bytes. Defaults to 1024."""))
+@click.option('--churn', type=float, callback=_float_range(min_=0.0),
+              default=0.0, help=_h("""
+Connections per second that will be closed and reconnected (chosen at
+random). Defaults to 0."""))
+@click.option('-d', '--duration', type=float, callback=_float_range(min_=0.0),
+              default=60.0, help=_h("""
+Amount of seconds to generate load for. Defaults to 60."""))
+@click.option('--interval', type=float, callback=_float_range(min_=0.0),
+              default=5.0, help=_h("""
+Interval in seconds in which live statistics will be printed. 0
+disables live statistics. Defaults to 5."""))
+@click.option('-k', '--key', help=_h("""
+Hex-encoded public permanent key of the server. If provided, the key
+will be requested and the signed keys will be verified."""))
+@click.option('--cafile', type=click.Path(exists=True), help=_h("""
+Path to a PEM file that contains the CA certificates used to verify
+the server's TLS certificate. Defaults to the system's CAs."""))
+@click.option('--insecure', is_flag=True, help=_h("""
+Do not verify the server's TLS certificate."""))
+@click.option('-l', '--loop', type=click.Choice(['asyncio', 'uvloop']), default='asyncio',
+              help="Use a specific asyncio-compatible event loop. Defaults to 'asyncio'.")
+@click.pass_context
+def loadtest(ctx: click.Context, **arguments: Any) -> None:
+    # Get arguments
+    url = arguments['url']  # type: str
+    key_str = arguments.get('key')  # type: Optional[str]
+    cafile = arguments.get('cafile')  # type: Optional[str]
+    insecure = arguments['insecure']  # type: bool
+    loop_str = arguments['loop']  # type: str
+    duration = arguments['duration']  # type: float
+    interval = arguments['interval']  # type: float
+
+    # Decode the public permanent key of the server
+    server_key = None  # type: Optional[bytes]
+    if key_str is not None:
+        try:
+            server_key = binascii.unhexlify(key_str)
+        except binascii.Error:
+            server_key = None
+        if server_key is None or len(server_key) != KEY_LENGTH:
+            raise click.BadParameter('Invalid public permanent key', param_hint='--key')
+
+    # Create SSL context
+    ssl_context = None  # type: Optional[ssl.SSLContext]
+    if url.startswith('wss:'):
+        ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=cafile)
+        if insecure:
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+    # Set event loop policy and get event loop
+    _set_event_loop_policy(ctx, loop_str)
+    loop = asyncio.get_event_loop()  # type: asyncio.AbstractEventLoop
+
+    # Run until the duration has elapsed or Ctrl+C has been pressed
+    load_test = loadtest_.LoadTest(
+        url, initiators=arguments['initiators'], responders=arguments['responders'],
+        connect_rate=arguments['connect_rate'], relay_rate=arguments['relay_rate'],
+        frame_size=arguments['frame_size'], churn=arguments['churn'],
+        server_key=server_key, ssl_context=ssl_context, loop=loop)
+    click.echo('Generating load on {} for {}s'.format(url, duration))
+    task = loop.create_task(load_test.run(duration, interval=interval, report=click.echo))
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        click.echo()
+        task.cancel()
+        loop.run_until_complete(asyncio.gather(task, loop=loop, return_exceptions=True))
+
+    # Print report
+    click.echo(load_test.stats.report())
     loop.close()
 
 
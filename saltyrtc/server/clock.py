@@ -0,0 +1,98 @@
+"""
+This module provides an event loop running on virtual time.
+
+All timers of the server (e.g. the keep-alive interval and timeout,
+the relay timeout and the task queue join timeout) are driven by the
+event loop's clock, i.e. :meth:`asyncio.AbstractEventLoop.time`, so the
+clock is injected by passing a :class:`VirtualTimeEventLoop` as `loop`.
+
+Combined with the in-memory transport (see :func:`serve_memory`),
+scenarios spanning hours of server time run in milliseconds and in a
+deterministic order.
+"""
+import asyncio
+import selectors
+from typing import Any  # noqa
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
+
+__all__ = (
+    'VirtualTimeEventLoop',
+    'VirtualTimeEventLoopPolicy',
+)
+
+# Do not export!
+_SelectResult = List[Tuple[selectors.SelectorKey, int]]
+# Note: The stubs declare the platform's default loop and policy classes as
+#       variables of the abstract types which cannot be used as base classes.
+_SelectorEventLoop = asyncio.SelectorEventLoop  # type: Any
+_DefaultEventLoopPolicy = asyncio.DefaultEventLoopPolicy  # type: Any
+
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    """
+    Advances the virtual time of the event loop instead of waiting in
+    case no file descriptor is ready.
+    """
+    def __init__(self, loop: 'VirtualTimeEventLoop') -> None:
+        super().__init__()
+        self._loop = loop
+
+    def select(self, timeout: Optional[float] = None) -> _SelectResult:
+        events = super().select(0)
+        if len(events) > 0 or (timeout is not None and timeout <= 0):
+            return events
+
+        # Wait for I/O in case no timer has been scheduled, otherwise skip
+        # to the next timer
+        if timeout is None:
+            return super().select(None)
+        self._loop.advance(timeout)
+        return []
+
+
+class VirtualTimeEventLoop(_SelectorEventLoop):
+    """
+    An event loop whose clock starts at zero and only moves forward
+    while the loop would otherwise be idle: Instead of waiting for the
+    next timer, the clock skips to it.
+
+    .. important:: I/O is polled without waiting while timers are
+                   pending, so pending timers fire before I/O that
+                   is not ready yet. Use the in-memory transport
+                   rather than sockets and do not wait for threads.
+    """
+    def __init__(self) -> None:
+        self._virtual_time = 0.0
+        super().__init__(selector=_VirtualTimeSelector(self))
+
+    def time(self) -> float:
+        """
+        Return the current virtual time.
+        """
+        return self._virtual_time
+
+    def advance(self, seconds: float) -> None:
+        """
+        Move the clock forward. Callbacks that become due will be run
+        by the next iteration of the loop.
+
+        Arguments:
+            - `seconds`: The amount of seconds to move forward.
+
+        Raises :exc:`ValueError` in case `seconds` is negative.
+        """
+        if seconds < 0:
+            raise ValueError('Cannot move the clock backwards')
+        self._virtual_time += seconds
+
+
+class VirtualTimeEventLoopPolicy(_DefaultEventLoopPolicy):
+    """
+    Event loop policy creating :class:`VirtualTimeEventLoop` instances.
+    """
+    def new_event_loop(self) -> VirtualTimeEventLoop:
+        return VirtualTimeEventLoop()
@@ -0,0 +1,287 @@
+"""
+This module provides a structured log of protocol events of the
+SaltyRTC Signalling Server intended for forensic analysis. Events are
+written as JSON lines by a background thread, so the event loop never
+blocks on disk I/O.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict  # noqa
+from typing import List  # noqa
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Optional,
+)
+
+from . import util
+from .events import Event
+from .typing import (
+    EventData,
+    PathHex,
+)
+
+if TYPE_CHECKING:
+    from .server import Server
+
+__all__ = (
+    'EVENT_LOG_SAMPLE_RATE_DEFAULT',
+    'EventLog',
+)
+
+# Default fraction of relay events that will be logged
+EVENT_LOG_SAMPLE_RATE_DEFAULT = 0.01
+
+# Sentinel to stop the writer thread
+_STOP = object()
+
+# Amount of seconds until a failed rotation will be retried
+_ROTATE_RETRY_INTERVAL = 10.0
+
+# Events of the registry that will be logged
+# Note: Handshakes and drops are being logged by the protocol with more details.
+_REGISTRY_EVENTS = (
+    Event.initiator_connected,
+    Event.responder_connected,
+    Event.disconnected,
+    Event.path_created,
+    Event.path_removed,
+)
+
+
+class EventLog:
+    """
+    Writes protocol events (handshakes, relayed messages, drops and
+    close codes) as JSON lines to a file. Each line contains the
+    `event` name, the unix `time` and event specific fields. Relayed
+    messages only contain metadata (size, source and destination slot,
+    queueing delay and write time) and are sampled.
+
+    Records are handed over to a background thread via a bounded
+    queue. Records that do not fit into the queue will be dropped and
+    counted (see :attr:`dropped`). Records that cannot be serialised
+    will be skipped and counted (see :attr:`malformed`). The thread
+    writes records in batches to a buffered file, flushes the file at
+    least once per flush interval and rotates it once it exceeds the
+    maximum size. In case the rotation fails, writing continues with
+    the current file and the rotation will be retried later.
+
+    Arguments:
+        - `path`: The path of the file to be written.
+        - `relay_sample_rate`: The fraction (between `0` and `1`) of
+          relayed messages that will be logged. Defaults to `0.01`.
+        - `max_bytes`: The size in bytes after which the file will be
+          rotated. `0` disables rotation. Defaults to 100 MiB.
+        - `backup_count`: The amount of rotated files that will be
+          kept (with the suffixes `.1`, `.2`, ...). Defaults to `5`.
+        - `batch_size`: The maximum amount of records written at once.
+        - `flush_interval`: The maximum amount of seconds records may
+          be buffered before being flushed to disk.
+        - `queue_size`: The maximum amount of pending records.
+    """
+    def __init__(
+            self,
+            path: str,
+            relay_sample_rate: float = EVENT_LOG_SAMPLE_RATE_DEFAULT,
+            max_bytes: int = 100 * 1024 * 1024,
+            backup_count: int = 5,
+            batch_size: int = 256,
+            flush_interval: float = 1.0,
+            queue_size: int = 65536,
+    ) -> None:
+        if not 0.0 <= relay_sample_rate <= 1.0:
+            raise ValueError('Invalid relay sample rate: {}'.format(relay_sample_rate))
+        self._log = util.get_logger('eventlog')
+        self._queue = queue.Queue(maxsize=queue_size)  # type: queue.Queue[Any]
+        self._thread = None  # type: Optional[threading.Thread]
+        self._random = random.random
+        self.path = path
+        self.relay_sample_rate = relay_sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.malformed = 0
+
+    @property
+    def running(self) -> bool:
+        """
+        Return whether the writer thread is running.
+        """
+        return self._thread is not None
+
+    def start(self) -> None:
+        """
+        Open the file and start the writer thread.
+
+        Raises :exc:`RuntimeError` in case the event log is already
+        running and :exc:`OSError` in case the file could not be
+        opened.
+        """
+        if self._thread is not None:
+            raise RuntimeError('Event log is already running')
+        file = open(self.path, 'ab')
+        self._thread = threading.Thread(
+            target=self._run, args=(file,), name='saltyrtc-eventlog', daemon=True)
+        self._thread.start()
+        self._log.debug('Writing events to {}', self.path)
+
+    def close(self) -> None:
+        """
+        Write all pending records, close the file and wait for the
+        writer thread to terminate.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._queue.put(_STOP)
+        thread.join()
+        self._log.debug('Closed, {} records written, {} dropped, {} malformed',
+                        self.written, self.dropped, self.malformed)
+
+    def attach(self, server: 'Server') -> None:
+        """
+        Log the events of a server: Protocols will log handshakes,
+        relayed messages and drops and the connection events of the
+        server's :class:`EventRegistry` will be logged as well.
+
+        .. note:: Only protocols of connections that are being
+                  established afterwards will log events.
+        """
+        server.event_log = self
+        for event in _REGISTRY_EVENTS:
+            server.register_event_callback(event, self.event_callback)
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """
+        Enqueue an event record. Does nothing unless the event log is
+        running.
+
+        Arguments:
+            - `event`: The name of the event.
+            - `fields`: Additional JSON serialisable fields.
+        """
+        if self._thread is None:
+            return
+        fields['event'] = event
+        fields['time'] = time.time()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def relay(
+            self,
+            path: int,
+            source: int,
+            destination: int,
+            size: int,
+            queue_delay: float,
+            write_time: float,
+    ) -> None:
+        """
+        Enqueue a sampled record of a relayed message.
+        """
+        if self._random() < self.relay_sample_rate:
+            self.emit(
+                'relay', path=path, source=source, destination=destination, size=size,
+                queue_delay=queue_delay, write_time=write_time)
+
+    async def event_callback(
+            self,
+            event: Event,
+            path: Optional[PathHex],
+            data: EventData,
+    ) -> None:
+        """
+        Event callback for the :class:`EventRegistry`.
+        """
+        self.emit(event.value, key=path, data=data)
+
+    def _run(self, file: Any) -> None:
+        last_flush = time.monotonic()
+        rotate_after = last_flush
+        stopping = False
+        while not stopping:
+            # Wait for records (flush when idle)
+            records = []  # type: List[Dict[str, Any]]
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                file.flush()
+                last_flush = time.monotonic()
+                continue
+
+            # Gather a batch
+            while True:
+                if record is _STOP:
+                    stopping = True
+                    break
+                records.append(record)
+                if len(records) >= self.batch_size:
+                    break
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            # Serialise each record (so a malformed record does not take the
+            # rest of the batch with it)
+            lines = []  # type: List[str]
+            for record in records:
+                try:
+                    lines.append(json.dumps(record, separators=(',', ':')) + '\n')
+                except (TypeError, ValueError) as exc:
+                    self.malformed += 1
+                    self._log.error('Could not serialise {} record: {}',
+                                    record.get('event'), exc)
+
+            # Write the batch
+            try:
+                if len(lines) > 0:
+                    file.write(''.join(lines).encode('utf-8'))
+                    self.written += len(lines)
+                now = time.monotonic()
+                if now - last_flush >= self.flush_interval:
+                    file.flush()
+                    last_flush = now
+            except OSError as exc:
+                self._log.error('Could not write {} records: {}', len(lines), exc)
+                continue
+
+            # Rotate the file
+            if 0 < self.max_bytes <= file.tell() and now >= rotate_after:
+                try:
+                    file = self._rotate(file)
+                except OSError as exc:
+                    self._log.error('Could not rotate {}, continuing with the current '
+                                    'file: {}', self.path, exc)
+                    rotate_after = now + _ROTATE_RETRY_INTERVAL
+        file.close()
+
+    def _rotate(self, file: Any) -> Any:
+        """
+        Rotate the file and return the new one.
+
+        The current file stays open until the new one has been opened,
+        so writing can continue in case the rotation fails.
+        """
+        file.flush()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = '{}.{}'.format(self.path, index)
+                if os.path.exists(source):
+                    os.replace(source, '{}.{}'.format(self.path, index + 1))
+            os.replace(self.path, '{}.1'.format(self.path))
+            new_file = open(self.path, 'ab')
+        else:
+            new_file = open(self.path, 'wb')
+        file.close()
+        return new_file
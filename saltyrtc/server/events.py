@@ -1,13 +1,35 @@
+import asyncio
 import collections
 import enum
 from typing import Dict  # noqa
-from typing import List
+from typing import FrozenSet  # noqa
+from typing import Tuple  # noqa
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    List,
+    Optional,
+)
+
+from . import util
+from .typing import (
+    BatchEventCallback,
+    EventCallback,
+    EventData,
+    EventItem,
+    PathHex,
+    SyncEventCallback,
+)
 
-from .typing import EventCallback
+if TYPE_CHECKING:
+    # Note: Requires Python >= 3.5.4
+    from typing import Deque  # noqa
 
 __all__ = (
     'Event',
     'EventRegistry',
+    'OverflowPolicy',
+    'EventDispatcher',
 )
 
 
@@ -20,6 +42,11 @@ class Event(enum.Enum):
     initiator_connected = 'initiator-connected'
     responder_connected = 'responder-connected'
     disconnected = 'disconnected'
+    path_created = 'path-created'
+    path_removed = 'path-removed'
+    handshake_completed = 'handshake-completed'
+    client_dropped = 'client-dropped'
+    path_stats = 'path-stats'
 
 
 class EventRegistry:
@@ -41,10 +68,27 @@ class EventRegistry:
         - `initiator-connected`: `None`
         - `responder-connected`: `None`
         - `disconnected`: :class:`DisconnectedData`
+        - `path-created`: `None`
+        - `path-removed`: `None`
+        - `handshake-completed`: :class:`HandshakeCompletedData`
+        - `client-dropped`: :class:`ClientDroppedData`
+        - `path-stats`: :class:`PathStatsData` (raised periodically
+          for each path, see :meth:`Server.start_path_stats`)
+
+    Synchronous callbacks receive the same parameters but are invoked
+    immediately when the event is being raised. They should only be
+    used for cheap handlers.
+
+    Batch callbacks must be `async` functions which receive a list of
+    `(event, path, data)` tuples.
     """
     def __init__(self) -> None:
         self.events = \
             collections.defaultdict(list)  # type: Dict[Event, List[EventCallback]]
+        self.sync_events = \
+            collections.defaultdict(list)  # type: Dict[Event, List[SyncEventCallback]]
+        self.batch_callbacks = \
+            []  # type: List[Tuple[FrozenSet[Event], BatchEventCallback]]
 
     def register(self, event: Event, handler: EventCallback) -> None:
         """
@@ -52,8 +96,250 @@ class EventRegistry:
         """
         self.events[event].append(handler)
 
+    def register_sync(self, event: Event, handler: SyncEventCallback) -> None:
+        """
+        Register a synchronous event callback.
+        """
+        self.sync_events[event].append(handler)
+
+    def register_batch(
+            self,
+            handler: BatchEventCallback,
+            events: Optional[Iterable[Event]] = None,
+    ) -> None:
+        """
+        Register a batch event callback for specific events (or all
+        events if `None`).
+        """
+        self.batch_callbacks.append((frozenset(Event if events is None else events),
+                                     handler))
+
     def get_callbacks(self, event: Event) -> List[EventCallback]:
         """
         Return callbacks associated to a specific event.
         """
         return self.events[event]
+
+    def get_sync_callbacks(self, event: Event) -> List[SyncEventCallback]:
+        """
+        Return synchronous callbacks associated to a specific event.
+        """
+        return self.sync_events[event]
+
+    def has_callbacks(self, event: Event) -> bool:
+        """
+        Return whether any callbacks are associated to a specific
+        event.
+        """
+        return len(self.sync_events[event]) > 0 or self.has_async_callbacks(event)
+
+    def has_async_callbacks(self, event: Event) -> bool:
+        """
+        Return whether `async` or batch callbacks are associated to a
+        specific event.
+        """
+        return (len(self.events[event]) > 0 or
+                any(event in events for events, _ in self.batch_callbacks))
+
+
+@enum.unique
+class OverflowPolicy(enum.Enum):
+    """
+    Determines what happens with an event that is being raised while
+    the queue of the :class:`EventDispatcher` is full.
+    """
+    # Discard the event
+    drop = 'drop'
+    # Discard the event and count it (see :attr:`EventDispatcher.dropped`)
+    count = 'count'
+    # Queue the event anyway and let the raising connection wait until
+    # the queue has room again (see :meth:`EventDispatcher.wait_writable`)
+    block = 'block'
+
+
+class EventDispatcher:
+    """
+    Dispatches raised events to the callbacks of an
+    :class:`EventRegistry`.
+
+    Synchronous callbacks are invoked immediately. Events for `async`
+    and batch callbacks are put into a bounded queue which is being
+    processed by a fixed amount of worker tasks. Each worker takes up
+    to `batch_size` events at once from the queue, awaits the `async`
+    callbacks of each event and passes the events to the batch
+    callbacks.
+
+    Arguments:
+        - `registry`: The :class:`EventRegistry` to dispatch to.
+          Defaults to an empty registry.
+        - `maxsize`: The maximum amount of queued events.
+        - `concurrency`: The amount of worker tasks.
+        - `policy`: The :class:`OverflowPolicy` applied when the queue
+          is full. Defaults to :attr:`OverflowPolicy.block` which
+          never discards events.
+        - `batch_size`: The maximum amount of events processed by a
+          worker at once.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+    """
+    def __init__(
+            self,
+            registry: Optional[EventRegistry] = None,
+            maxsize: int = 1024,
+            concurrency: int = 4,
+            policy: OverflowPolicy = OverflowPolicy.block,
+            batch_size: int = 64,
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError('Invalid maximum queue size: {}'.format(maxsize))
+        if concurrency < 1:
+            raise ValueError('Invalid concurrency: {}'.format(concurrency))
+        if batch_size < 1:
+            raise ValueError('Invalid batch size: {}'.format(batch_size))
+        self._log = util.get_logger('events')
+        self._loop = asyncio.get_event_loop() if loop is None else loop
+        self._queue = collections.deque()  # type: Deque[EventItem]
+        self._workers = []  # type: List[asyncio.Task[None]]
+        self._not_empty = asyncio.Event(loop=self._loop)
+        self._writable = asyncio.Event(loop=self._loop)
+        self._writable.set()
+        self._finished = asyncio.Event(loop=self._loop)
+        self._finished.set()
+        self._unfinished = 0
+        self.registry = EventRegistry() if registry is None else registry
+        self.maxsize = maxsize
+        self.concurrency = concurrency
+        self.policy = policy
+        self.batch_size = batch_size
+        self.dropped = 0
+
+    @property
+    def size(self) -> int:
+        """
+        Return the amount of queued events.
+        """
+        return len(self._queue)
+
+    def dispatch(self, event: Event, path: Optional[PathHex], data: EventData) -> None:
+        """
+        Invoke the synchronous callbacks of an event and enqueue the
+        event for the `async` and batch callbacks.
+        """
+        for sync_callback in self.registry.get_sync_callbacks(event):
+            try:
+                sync_callback(event, path, data)
+            except Exception as exc:
+                self._log.exception('Event callback raised an exception:', exc)
+
+        # Nobody is interested
+        if not self.registry.has_async_callbacks(event):
+            return
+
+        # Apply the overflow policy
+        queue = self._queue
+        if len(queue) >= self.maxsize:
+            if self.policy == OverflowPolicy.count:
+                self.dropped += 1
+            if self.policy != OverflowPolicy.block:
+                self._log.warning('Queue full, discarding event {}', event)
+                return
+
+        # Enqueue
+        queue.append((event, path, data))
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+        if self.policy == OverflowPolicy.block and len(queue) >= self.maxsize:
+            self._writable.clear()
+
+        # Start workers (if not already started)
+        if len(self._workers) == 0:
+            self._workers = [self._loop.create_task(self._worker())
+                             for _ in range(self.concurrency)]
+
+    async def wait_writable(self) -> None:
+        """
+        Wait until the queue has room for further events. Only blocks
+        when using the :attr:`OverflowPolicy.block` policy.
+        """
+        await self._writable.wait()
+
+    async def join(self) -> None:
+        """
+        Wait until all queued events have been processed.
+        """
+        await self._finished.wait()
+
+    async def close(self, timeout: Optional[float] = 10.0) -> None:
+        """
+        Wait until all queued events have been processed and stop the
+        workers.
+
+        Arguments:
+            - `timeout`: The maximum amount of seconds to wait for the
+              queued events to be processed. Remaining events will be
+              discarded once the timeout has been reached. `None`
+              waits indefinitely.
+        """
+        try:
+            await asyncio.wait_for(self.join(), timeout, loop=self._loop)
+        except asyncio.TimeoutError:
+            pending = self._unfinished
+        else:
+            pending = 0
+
+        # Stop the workers
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, loop=self._loop, return_exceptions=True)
+
+        # Discard remaining events
+        if pending > 0:
+            self._log.warning('Closing timed out, dropped {} events', pending)
+            self._queue.clear()
+            self._unfinished = 0
+            self._finished.set()
+            self._writable.set()
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            # Wait for events
+            while len(queue) == 0:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+
+            # Take a batch
+            batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+            if len(queue) < self.maxsize:
+                self._writable.set()
+
+            # Process the batch
+            try:
+                await self._process(batch)
+            finally:
+                self._unfinished -= len(batch)
+                if self._unfinished == 0:
+                    self._finished.set()
+
+    async def _process(self, batch: List[EventItem]) -> None:
+        for event, path, data in batch:
+            for callback in self.registry.get_callbacks(event):
+                try:
+                    await callback(event, path, data)
+                except asyncio.CancelledError:
+                    # Note: Required for Python < 3.8 where it is an `Exception`
+                    raise
+                except Exception as exc:
+                    self._log.exception('Event callback raised an exception:', exc)
+        for events, batch_callback in self.registry.batch_callbacks:
+            items = [item for item in batch if item[0] in events]
+            if len(items) > 0:
+                try:
+                    await batch_callback(items)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    self._log.exception('Batch event callback raised an exception:', exc)
@@ -0,0 +1,126 @@
+"""
+This module provides lightweight health, readiness and statistics
+endpoints which are being answered with plain HTTP responses on the
+WebSocket listeners of the SaltyRTC Signalling Server (e.g. for load
+balancers) without upgrading the connection to WebSocket.
+"""
+import http
+import json
+from typing import (
+    TYPE_CHECKING,
+    Optional,
+)
+
+import websockets.http
+
+from .transport import HTTPResponse
+
+if TYPE_CHECKING:
+    from .server import Server
+
+__all__ = (
+    'HEALTH_PATH',
+    'READY_PATH',
+    'STATS_PATH',
+    'HealthCheck',
+)
+
+# Paths of the endpoints
+HEALTH_PATH = '/health'
+READY_PATH = '/ready'
+STATS_PATH = '/stats'
+
+# Constants
+_TEXT_CONTENT_TYPE = 'text/plain; charset=utf-8'
+_JSON_CONTENT_TYPE = 'application/json'
+
+
+class HealthCheck:
+    """
+    Answers requests for the following endpoints instead of handing
+    them to the WebSocket opening handshake:
+
+    - `GET /health`: Responds with `200` as long as the event loop is
+      serving requests.
+    - `GET /ready`: Responds with `200` while the server accepts new
+      paths and the event loop lag is below `max_loop_lag`.
+      Otherwise, responds with `503` and the reason (`draining`,
+      `closing` or `lagging`) in the body.
+    - `GET /stats`: Responds with a compact JSON object containing the
+      amount of connections and paths (if enabled).
+
+    All other paths are being handled as WebSocket connections.
+
+    Arguments:
+        - `max_loop_lag`: The maximum lag of the event loop in seconds
+          until the server is no longer considered ready. Defaults to
+          `0.5`.
+        - `loop_lag_interval`: The interval in seconds in which the
+          lag of the event loop is being measured. Defaults to `1`.
+        - `stats`: Whether to serve the `/stats` endpoint. Defaults to
+          `False`.
+    """
+    __slots__ = ('max_loop_lag', 'loop_lag_interval', 'stats')
+
+    def __init__(
+            self,
+            max_loop_lag: float = 0.5,
+            loop_lag_interval: float = 1.0,
+            stats: bool = False,
+    ) -> None:
+        if loop_lag_interval <= 0:
+            raise ValueError('Invalid loop lag interval: {}'.format(loop_lag_interval))
+        self.max_loop_lag = max_loop_lag
+        self.loop_lag_interval = loop_lag_interval
+        self.stats = stats
+
+    def readiness(self, server: 'Server') -> Optional[str]:
+        """
+        Return the reason why a server is not ready or `None` in case
+        it is ready.
+        """
+        if server.closing:
+            return 'closing'
+        if server.draining:
+            return 'draining'
+        if server.loop_lag > self.max_loop_lag:
+            return 'lagging'
+        return None
+
+    def process_request(
+            self,
+            server: 'Server',
+            path: str,
+            request_headers: websockets.http.Headers,
+    ) -> Optional[HTTPResponse]:
+        """
+        Return the response to a request or `None` in case the request
+        should be handled as a WebSocket connection.
+        """
+        path = path.split('?', 1)[0]
+        if path == HEALTH_PATH:
+            return _text_response(http.HTTPStatus.OK, 'ok')
+        elif path == READY_PATH:
+            reason = self.readiness(server)
+            if reason is None:
+                return _text_response(http.HTTPStatus.OK, 'ready')
+            return _text_response(http.HTTPStatus.SERVICE_UNAVAILABLE, reason)
+        elif path == STATS_PATH and self.stats:
+            body = json.dumps({
+                'connections': len(server.protocols),
+                'paths': len(server.paths.paths),
+                'ready': self.readiness(server) is None,
+                'loop_lag': round(server.loop_lag, 6),
+            }, separators=(',', ':')).encode('utf-8')
+            return http.HTTPStatus.OK, [
+                ('Content-Type', _JSON_CONTENT_TYPE),
+                ('Cache-Control', 'no-store'),
+            ], body
+        return None
+
+
+def _text_response(status: http.HTTPStatus, text: str) -> HTTPResponse:
+    return status, [
+        ('Content-Type', _TEXT_CONTENT_TYPE),
+        ('Cache-Control', 'no-store'),
+    ], '{}\n'.format(text).encode('utf-8')
@@ -0,0 +1,622 @@
+"""
+This module provides a load generator for the SaltyRTC Signalling
+Server (see the ``loadtest`` command of the CLI).
+
+It implements the client side of the signalling protocol as far as
+the server is concerned: The handshake (including cookie and combined
+sequence number handling, the encryption of ``client-auth`` and the
+verification of the signed keys), the messages the server sends to
+authenticated clients and relaying frames between clients.
+"""
+import asyncio
+import binascii
+import os
+import random
+import ssl
+import struct
+from typing import Dict  # noqa
+from typing import List  # noqa
+from typing import (
+    Any,
+    Callable,
+    Optional,
+    Tuple,
+)
+
+import libnacl
+import libnacl.public
+import umsgpack
+import websockets
+
+from . import util
+from .common import (
+    COOKIE_LENGTH,
+    INITIATOR_ADDRESS,
+    NONCE_FORMATTER,
+    NONCE_LENGTH,
+    SERVER_ADDRESS,
+    SubProtocol,
+    validate_public_key,
+    validate_responder_id,
+)
+from .exception import MessageError
+from .metrics import LatencyHistogram
+
+__all__ = (
+    'LoadTestStats',
+    'LoadTestClient',
+    'LoadTest',
+)
+
+# Format of the time a frame has been sent at (prepended to relayed frames)
+_TIMESTAMP = struct.Struct('!d')
+
+# Seconds to wait before reconnecting after a failed connection attempt
+_RETRY_DELAY = 1.0
+
+# Maximum amount of responders per path (0x02 to 0xff)
+_MAX_RESPONDERS = 0xff - INITIATOR_ADDRESS
+
+
+def _pack_nonce(cookie: bytes, source: int, destination: int, csn: int) -> bytes:
+    return struct.pack(
+        NONCE_FORMATTER, cookie, source, destination, struct.pack('!Q', csn)[2:])
+
+
+class LoadTestStats:
+    """
+    Counters and latencies of a load test.
+
+    All latencies are recorded in seconds. The relay latency is only
+    meaningful if the clients share a clock (i.e. they run in the
+    same process).
+    """
+    def __init__(self) -> None:
+        self.duration = 0.0
+        self.connected = 0
+        self.handshakes = 0
+        self.failed = 0
+        self.reconnects = 0
+        self.disconnects = 0
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.send_errors = 0
+        self.handshake_latency = LatencyHistogram(
+            'saltyrtc_loadtest_handshake_seconds', 'Duration of handshakes.')
+        self.relay_latency = LatencyHistogram(
+            'saltyrtc_loadtest_relay_seconds', 'Latency of relayed frames.')
+
+    def live(self, elapsed: float, previous: Optional['LoadTestStats'] = None) -> str:
+        """
+        Return a line of live statistics. Rates are calculated since
+        the `previous` snapshot (if any) or since the start.
+
+        Arguments:
+            - `elapsed`: Seconds since the `previous` snapshot (or
+              the start).
+            - `previous`: A snapshot created by :meth:`snapshot`.
+        """
+        handshakes, frames = self.handshakes, self.frames_received
+        if previous is not None:
+            handshakes -= previous.handshakes
+            frames -= previous.frames_received
+        elapsed = max(elapsed, 1e-9)
+        return ('connected: {}, handshakes: {:.1f}/s, frames: {:.1f}/s, '
+                'relay p50/p99: {}/{} ms, failed: {}, reconnects: {}, '
+                'send-errors: {}').format(
+            self.connected, handshakes / elapsed, frames / elapsed,
+            self._format_percentile(self.relay_latency, 0.5),
+            self._format_percentile(self.relay_latency, 0.99),
+            self.failed, self.reconnects, self.send_errors)
+
+    def snapshot(self) -> 'LoadTestStats':
+        """
+        Return a copy of the counters (without latencies).
+        """
+        snapshot = LoadTestStats()
+        snapshot.__dict__.update({
+            name: value for name, value in self.__dict__.items()
+            if not isinstance(value, LatencyHistogram)
+        })
+        return snapshot
+
+    def report(self) -> str:
+        """
+        Return a final report.
+        """
+        duration = max(self.duration, 1e-9)
+        lines = [
+            'Duration: {:.1f}s'.format(self.duration),
+            'Handshakes: {} ({:.1f}/s), failed: {}, reconnects: {}, '
+            'disconnects: {}'.format(
+                self.handshakes, self.handshakes / duration, self.failed,
+                self.reconnects, self.disconnects),
+            'Frames sent: {} ({:.1f}/s, {:.2f} MB/s)'.format(
+                self.frames_sent, self.frames_sent / duration,
+                self.bytes_sent / duration / 1e6),
+            'Frames received: {} ({:.1f}/s, {:.2f} MB/s)'.format(
+                self.frames_received, self.frames_received / duration,
+                self.bytes_received / duration / 1e6),
+            'Send errors: {}'.format(self.send_errors),
+        ]
+        for name, histogram in (
+                ('Handshake', self.handshake_latency),
+                ('Relay', self.relay_latency),
+        ):
+            lines.append('{} latency: p50 {} ms, p90 {} ms, p99 {} ms, max {} ms'.format(
+                name,
+                self._format_percentile(histogram, 0.5),
+                self._format_percentile(histogram, 0.9),
+                self._format_percentile(histogram, 0.99),
+                self._format_percentile(histogram, 1.0)))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _format_percentile(histogram: LatencyHistogram, quantile: float) -> str:
+        if histogram.count == 0:
+            return '-'
+        return '{:.2f}'.format(histogram.percentile(quantile) * 1000.0)
+
+
+class LoadTestClient:
+    """
+    An initiator or a responder connecting to the server.
+
+    Arguments:
+        - `url`: The WebSocket URL of the server (without a path).
+        - `initiator_key`: The initiator's permanent key pair which
+          determines the path.
+        - `key`: The client's permanent key pair. If this is
+          `initiator_key`, the client is an initiator.
+        - `server_key`: The server's public permanent key. If
+          provided, the key will be requested in `client-auth` and the
+          signed keys of `server-auth` will be verified.
+        - `ssl_context`: An SSL context for `wss` URLs.
+        - `loop`: The event loop.
+    """
+    def __init__(
+            self,
+            url: str,
+            initiator_key: libnacl.public.SecretKey,
+            key: libnacl.public.SecretKey,
+            server_key: Optional[bytes] = None,
+            ssl_context: Optional[ssl.SSLContext] = None,
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        self._loop = asyncio.get_event_loop() if loop is None else loop
+        self.url = url
+        self.initiator_key = initiator_key
+        self.key = key
+        self.server_key = server_key
+        self.ssl_context = ssl_context
+        self.id = None  # type: Optional[int]
+        self.peers = []  # type: List[int]
+        self._connection = None  # type: Optional[websockets.WebSocketClientProtocol]
+        self._box = None  # type: Optional[libnacl.public.Box]
+        self._cookie_out = b''
+        self._csn_out = 0
+        self._cookie_in = None  # type: Optional[bytes]
+        self._csn_in = 0
+        self._peer_cookie = b''
+        self._peer_csn = 0
+
+    @property
+    def is_initiator(self) -> bool:
+        return self.key is self.initiator_key
+
+    @property
+    def connected(self) -> bool:
+        """
+        Return whether the client is connected (and authenticated).
+        """
+        return self._connection is not None and self._connection.open \
+            and self.id is not None
+
+    async def connect(self) -> None:
+        """
+        Connect to the server and do the handshake.
+
+        Raises :exc:`MessageError` in case the server sent an invalid
+        message and :exc:`websockets.ConnectionClosed`,
+        :exc:`websockets.InvalidHandshake` or :exc:`OSError` in case
+        the connection failed.
+        """
+        # Reset the connection's state
+        self.id = None
+        self.peers = []
+        self._box = None
+        self._cookie_out = os.urandom(COOKIE_LENGTH)
+        self._csn_out, = struct.unpack('!Q', b'\x00' * 4 + os.urandom(4))
+        self._cookie_in = None
+        self._peer_cookie = os.urandom(COOKIE_LENGTH)
+        self._peer_csn = 0
+
+        # Connect
+        path = binascii.hexlify(self.initiator_key.pk).decode('ascii')
+        self._connection = await websockets.connect(
+            '{}/{}'.format(self.url, path), ssl=self.ssl_context, compression=None,
+            subprotocols=[SubProtocol.saltyrtc_v1.value], ping_interval=None,
+            loop=self._loop)
+        try:
+            await self._handshake()
+        except Exception:
+            await self.close()
+            raise
+
+    async def close(self) -> None:
+        """
+        Close the connection (if any).
+        """
+        if self._connection is not None:
+            await self._connection.close()
+
+    async def _handshake(self) -> None:
+        # server-hello
+        _, _, message = await self._receive(encrypted=False)
+        self._expect_type(message, 'server-hello')
+        server_session_key = message.get('key', b'')
+        validate_public_key(server_session_key)
+
+        # Make sure our cookie differs from the server's cookie
+        while self._cookie_out == self._cookie_in:
+            self._cookie_out = os.urandom(COOKIE_LENGTH)
+
+        # client-hello
+        if not self.is_initiator:
+            await self._send({
+                'type': 'client-hello',
+                'key': self.key.pk,
+            }, encrypted=False)
+
+        # client-auth
+        self._box = libnacl.public.Box(self.key, server_session_key)
+        payload = {
+            'type': 'client-auth',
+            'your_cookie': self._cookie_in,
+            'subprotocols': [SubProtocol.saltyrtc_v1.value],
+        }  # type: Dict[str, Any]
+        if self.server_key is not None:
+            payload['your_key'] = self.server_key
+        await self._send(payload)
+
+        # server-auth
+        nonce, destination, message = await self._receive()
+        self._expect_type(message, 'server-auth')
+        if message.get('your_cookie') != self._cookie_out:
+            raise MessageError('Server did not repeat our cookie')
+        if self.server_key is not None:
+            box = libnacl.public.Box(self.key, self.server_key)
+            try:
+                signed_keys = box.decrypt(message['signed_keys'], nonce=nonce)
+            except (KeyError, ValueError, libnacl.CryptError) as exc:
+                raise MessageError('Could not decrypt signed keys') from exc
+            if signed_keys != server_session_key + self.key.pk:
+                raise MessageError('Invalid signed keys')
+
+        # Authenticated
+        if self.is_initiator:
+            if destination != INITIATOR_ADDRESS:
+                raise MessageError('Invalid initiator address: {}'.format(destination))
+            self.peers = list(message.get('responders', []))
+        else:
+            validate_responder_id(destination)
+            if message.get('initiator_connected', False):
+                self.peers = [INITIATOR_ADDRESS]
+        self.id = destination
+
+    @staticmethod
+    def _expect_type(message: Dict[str, Any], type_: str) -> None:
+        if message.get('type') != type_:
+            raise MessageError('Expected {}, got {}'.format(type_, message.get('type')))
+
+    def _get_connection(self) -> websockets.WebSocketClientProtocol:
+        connection = self._connection
+        if connection is None:
+            raise MessageError('Not connected')
+        return connection
+
+    def _get_box(self) -> libnacl.public.Box:
+        box = self._box
+        if box is None:
+            raise MessageError('No session key of the server')
+        return box
+
+    def _get_id(self) -> int:
+        id_ = self.id
+        if id_ is None:
+            raise MessageError('Not authenticated')
+        return id_
+
+    async def _send(self, payload: Dict[str, Any], encrypted: bool = True) -> None:
+        source = SERVER_ADDRESS if self.id is None else self.id
+        nonce = _pack_nonce(self._cookie_out, source, SERVER_ADDRESS, self._csn_out)
+        self._csn_out += 1
+        data = umsgpack.packb(payload)
+        if encrypted:
+            _, data = self._get_box().encrypt(data, nonce=nonce, pack_nonce=False)
+        await self._get_connection().send(nonce + data)
+
+    async def _receive(
+            self,
+            encrypted: bool = True,
+    ) -> Tuple[bytes, int, Dict[str, Any]]:
+        data = await self._get_connection().recv()
+        if not isinstance(data, bytes) or len(data) < NONCE_LENGTH:
+            raise MessageError('Invalid message from server')
+        nonce, payload = data[:NONCE_LENGTH], data[NONCE_LENGTH:]
+        return nonce, nonce[COOKIE_LENGTH + 1], self._unpack(nonce, payload, encrypted)
+
+    def _unpack(self, nonce: bytes, payload: bytes, encrypted: bool) -> Dict[str, Any]:
+        cookie, _, _, csn_bytes = struct.unpack(NONCE_FORMATTER, nonce)
+        csn, = struct.unpack('!Q', b'\x00\x00' + csn_bytes)
+
+        # Validate cookie and combined sequence number
+        if self._cookie_in is None:
+            if csn >> 32 != 0:
+                raise MessageError('Overflow number of the server is not zero')
+            self._cookie_in, self._csn_in = cookie, csn
+        if cookie != self._cookie_in:
+            raise MessageError('Server changed its cookie')
+        if csn != self._csn_in:
+            raise MessageError('Invalid sequence number from server, expected {}, '
+                               'got {}'.format(self._csn_in, csn))
+        self._csn_in += 1
+
+        # Decrypt and decode
+        if encrypted:
+            try:
+                payload = self._get_box().decrypt(payload, nonce=nonce)
+            except (ValueError, libnacl.CryptError) as exc:
+                raise MessageError('Could not decrypt message from server') from exc
+        try:
+            message = umsgpack.unpackb(payload)
+        except umsgpack.UnpackException as exc:
+            raise MessageError('Could not decode message from server') from exc
+        if not isinstance(message, dict):
+            raise MessageError('Message from server is not a dict')
+        return message
+
+    async def send(self, destination: int, payload: bytes) -> int:
+        """
+        Relay a frame to another client of the path and return the
+        amount of bytes sent.
+
+        Raises :exc:`MessageError` in case the client is not
+        connected.
+        """
+        nonce = _pack_nonce(
+            self._peer_cookie, self._get_id(), destination, self._peer_csn)
+        self._peer_csn += 1
+        data = nonce + payload
+        await self._get_connection().send(data)
+        return len(data)
+
+    async def receive(self) -> Tuple[int, Any]:
+        """
+        Receive the next message. Return the source address and
+        either the decrypted message (if sent by the server) or the
+        payload of the frame (if relayed from another client).
+
+        Messages of the server that announce new or disconnected
+        clients update the peers of the client.
+
+        Raises :exc:`MessageError` in case the client is not connected
+        or the message is invalid.
+        """
+        data = await self._get_connection().recv()
+        if not isinstance(data, bytes) or len(data) < NONCE_LENGTH:
+            raise MessageError('Invalid message')
+        nonce, payload = data[:NONCE_LENGTH], data[NONCE_LENGTH:]
+        source = nonce[COOKIE_LENGTH]
+        if source != SERVER_ADDRESS:
+            return source, payload
+
+        # Update peers
+        message = self._unpack(nonce, payload, True)
+        type_ = message.get('type')
+        if type_ == 'new-responder' and self.is_initiator:
+            if message.get('id') not in self.peers:
+                self.peers.append(message['id'])
+        elif type_ == 'new-initiator' and not self.is_initiator:
+            self.peers = [INITIATOR_ADDRESS]
+        elif type_ == 'disconnected' and message.get('id') in self.peers:
+            self.peers.remove(message['id'])
+        return source, message
+
+
+class LoadTest:
+    """
+    Drives a server with paths of one initiator and a configurable
+    amount of responders. Each client relays frames to the other
+    clients of its path in turn. Each frame carries the time it has
+    been sent, so the receiving client can record the relay latency.
+
+    Arguments:
+        - `url`: The WebSocket URL of the server (without a path).
+        - `initiators`: The amount of initiators (and therefore paths).
+        - `responders`: The amount of responders per path.
+        - `connect_rate`: Connections per second while ramping up.
+          `0` connects all clients at once.
+        - `relay_rate`: Frames per second each client sends. `0`
+          disables relaying.
+        - `frame_size`: The payload size of a frame in bytes.
+        - `churn`: Connections per second that will be closed and
+          reconnected (chosen at random). `0` disables churn.
+        - `server_key`: The server's public permanent key. If
+          provided, the signed keys will be verified.
+        - `ssl_context`: An SSL context for `wss` URLs.
+        - `loop`: The event loop.
+
+    Raises :exc:`ValueError` in case a parameter is out of range.
+    """
+    def __init__(
+            self,
+            url: str,
+            initiators: int = 1,
+            responders: int = 1,
+            connect_rate: float = 0.0,
+            relay_rate: float = 1.0,
+            frame_size: int = 1024,
+            churn: float = 0.0,
+            server_key: Optional[bytes] = None,
+            ssl_context: Optional[ssl.SSLContext] = None,
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        if initiators < 1:
+            raise ValueError('At least one initiator is required')
+        if not 0 <= responders <= _MAX_RESPONDERS:
+            raise ValueError('Responders per path must be between 0 and {}'.format(
+                _MAX_RESPONDERS))
+        if connect_rate < 0 or relay_rate < 0 or churn < 0:
+            raise ValueError('Rates must not be negative')
+        if frame_size < _TIMESTAMP.size:
+            raise ValueError('Frame size must be at least {}'.format(_TIMESTAMP.size))
+        self._log = util.get_logger('loadtest')
+        self._loop = asyncio.get_event_loop() if loop is None else loop
+        self.connect_rate = connect_rate
+        self.relay_rate = relay_rate
+        self.frame_size = frame_size
+        self.churn = churn
+        self.stats = LoadTestStats()
+
+        # Create clients (the initiator of a path first)
+        self.clients = []  # type: List[LoadTestClient]
+        for _ in range(initiators):
+            initiator_key = libnacl.public.SecretKey()
+            self.clients.append(LoadTestClient(
+                url, initiator_key, initiator_key, server_key=server_key,
+                ssl_context=ssl_context, loop=self._loop))
+            for _ in range(responders):
+                self.clients.append(LoadTestClient(
+                    url, initiator_key, libnacl.public.SecretKey(), server_key=server_key,
+                    ssl_context=ssl_context, loop=self._loop))
+
+    async def run(
+            self,
+            duration: float,
+            interval: float = 0.0,
+            report: Optional[Callable[[str], None]] = None,
+    ) -> LoadTestStats:
+        """
+        Run the load test for `duration` seconds and return the
+        statistics.
+
+        Arguments:
+            - `duration`: Seconds the load test runs for.
+            - `interval`: Interval in seconds in which `report` will
+              be called with a line of live statistics. `0` disables
+              live statistics.
+            - `report`: A callable receiving live statistics.
+        """
+        start = self._loop.time()
+        tasks = []  # type: List[asyncio.Task[None]]
+        for index, client in enumerate(self.clients):
+            delay = index / self.connect_rate if self.connect_rate > 0 else 0.0
+            tasks.append(self._loop.create_task(self._client_loop(client, delay)))
+        if self.churn > 0:
+            tasks.append(self._loop.create_task(self._churn_loop()))
+        if interval > 0 and report is not None:
+            tasks.append(self._loop.create_task(self._report_loop(interval, report)))
+
+        try:
+            await asyncio.sleep(duration, loop=self._loop)
+        finally:
+            self.stats.duration = self._loop.time() - start
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, loop=self._loop, return_exceptions=True)
+            await asyncio.gather(*[
+                client.close() for client in self.clients
+            ], loop=self._loop, return_exceptions=True)
+        return self.stats
+
+    async def _client_loop(self, client: LoadTestClient, delay: float) -> None:
+        stats = self.stats
+        await asyncio.sleep(delay, loop=self._loop)
+        reconnect = False
+        while True:
+            # Connect and authenticate
+            start = self._loop.time()
+            try:
+                await client.connect()
+            except (OSError, MessageError, websockets.InvalidHandshake,
+                    websockets.ConnectionClosed) as exc:
+                self._log.debug('Connection failed: {}', exc)
+                stats.failed += 1
+                await asyncio.sleep(_RETRY_DELAY, loop=self._loop)
+                continue
+            stats.handshake_latency.record(self._loop.time() - start)
+            stats.handshakes += 1
+            stats.connected += 1
+            if reconnect:
+                stats.reconnects += 1
+            reconnect = True
+
+            # Relay until disconnected
+            sender = None  # type: Optional[asyncio.Task[None]]
+            if self.relay_rate > 0:
+                sender = self._loop.create_task(self._send_loop(client))
+            try:
+                await self._receive_loop(client)
+            except websockets.ConnectionClosed:
+                pass
+            except MessageError as exc:
+                self._log.warning('Invalid message: {}', exc)
+                stats.failed += 1
+            finally:
+                stats.connected -= 1
+                stats.disconnects += 1
+                if sender is not None:
+                    sender.cancel()
+                    await asyncio.gather(sender, loop=self._loop, return_exceptions=True)
+                await client.close()
+
+    async def _send_loop(self, client: LoadTestClient) -> None:
+        stats = self.stats
+        padding = bytes(self.frame_size - _TIMESTAMP.size)
+        start, sent = self._loop.time(), 0
+        while True:
+            peers = client.peers
+            if len(peers) > 0:
+                payload = _TIMESTAMP.pack(self._loop.time()) + padding
+                stats.bytes_sent += await client.send(peers[sent % len(peers)], payload)
+                stats.frames_sent += 1
+            sent += 1
+            await asyncio.sleep(
+                max(0.0, start + sent / self.relay_rate - self._loop.time()),
+                loop=self._loop)
+
+    async def _receive_loop(self, client: LoadTestClient) -> None:
+        stats = self.stats
+        while True:
+            source, payload = await client.receive()
+            if source == SERVER_ADDRESS:
+                if payload.get('type') == 'send-error':
+                    stats.send_errors += 1
+                continue
+            stats.frames_received += 1
+            stats.bytes_received += NONCE_LENGTH + len(payload)
+            if len(payload) >= _TIMESTAMP.size:
+                sent_at, = _TIMESTAMP.unpack_from(payload)
+                stats.relay_latency.record(self._loop.time() - sent_at)
+
+    async def _churn_loop(self) -> None:
+        while True:
+            # Close connections in a Poisson process
+            await asyncio.sleep(random.expovariate(self.churn), loop=self._loop)
+            clients = [client for client in self.clients if client.connected]
+            if len(clients) > 0:
+                await random.choice(clients).close()
+
+    async def _report_loop(self, interval: float, report: Callable[[str], None]) -> None:
+        start = self._loop.time()
+        previous = self.stats.snapshot()
+        previous_time = start
+        while True:
+            await asyncio.sleep(interval, loop=self._loop)
+            now = self._loop.time()
+            report('[{:7.1f}s] {}'.format(
+                now - start, self.stats.live(now - previous_time, previous=previous)))
+            previous, previous_time = self.stats.snapshot(), now
@@ -147,6 +147,9 @@ class OutgoingMessageMixin(BaseMessageMixin, metaclass=abc.ABCMeta):
 
 
 class IncomingMessageMixin(BaseMessageMixin, metaclass=abc.ABCMeta):
+    # Note: The event loop time at which the client received the message
+    received_at = None  # type: Optional[float]
+
     @classmethod
     @abc.abstractmethod
     def unpack(cls, client: 'PathClient', data: Packet) -> 'IncomingMessageMixin':
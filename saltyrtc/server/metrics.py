@@ -0,0 +1,546 @@
+"""
+This module provides metrics for the SaltyRTC Signalling Server which
+can be exposed in the Prometheus text format.
+
+All metrics are bound when the :class:`Metrics` instance is being
+created, so updating a metric is a plain attribute access and an
+addition. Metrics that can be derived from the server's state (such
+as the amount of connections per state) are only collected when the
+metrics are being rendered.
+"""
+import abc
+import asyncio
+import bisect
+import itertools
+import math
+from collections import OrderedDict
+from typing import Dict  # noqa
+from typing import List  # noqa
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
+
+from . import util
+from .common import (
+    AddressType,
+    ClientState,
+    CloseCode,
+)
+
+if TYPE_CHECKING:
+    from .server import Server
+
+__all__ = (
+    'DURATION_BUCKETS',
+    'LATENCY_QUANTILES',
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'LatencyHistogram',
+    'RelayLatency',
+    'Metrics',
+    'serve_metrics',
+)
+
+# Quantiles exposed for latency histograms
+LATENCY_QUANTILES = (0.5, 0.9, 0.99, 0.999)  # type: Tuple[float, ...]
+
+# Default buckets (in seconds) for durations
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)  # type: Tuple[float, ...]
+
+# Constants
+_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+_REQUEST_TIMEOUT = 10.0
+
+# Do not export!
+Labels = Sequence[Tuple[str, str]]
+Number = Union[int, float]
+_MetricT = TypeVar('_MetricT', bound='_Metric')
+
+
+def _format_labels(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(name, value) for name, value in labels))
+
+
+def _format_value(value: Number) -> str:
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    return repr(value)
+
+
+class _Metric(metaclass=abc.ABCMeta):
+    __slots__ = ('name', 'help', 'labels', '_label_str')
+    type = None  # type: str
+
+    def __init__(self, name: str, help_: str, labels: Optional[Labels] = None) -> None:
+        self.name = name
+        self.help = help_
+        if labels is None:
+            labels = ()
+        self.labels = tuple(labels)  # type: Labels
+        self._label_str = _format_labels(self.labels)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[str]:
+        """
+        Return the lines of all samples of the metric.
+        """
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing value.
+    """
+    __slots__ = ('value',)
+    type = 'counter'
+
+    def __init__(self, name: str, help_: str, labels: Optional[Labels] = None) -> None:
+        super().__init__(name, help_, labels=labels)
+        self.value = 0  # type: Number
+
+    def inc(self, amount: Number = 1) -> None:
+        self.value += amount
+
+    def samples(self) -> Iterable[str]:
+        yield '{}{} {}'.format(self.name, self._label_str, _format_value(self.value))
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down.
+    """
+    __slots__ = ()
+    type = 'gauge'
+
+    def set(self, value: Number) -> None:
+        self.value = value
+
+
+class Histogram(_Metric):
+    """
+    Counts observed values in buckets with fixed upper bounds.
+    """
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+    type = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            help_: str,
+            labels: Optional[Labels] = None,
+            bounds: Sequence[float] = DURATION_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_, labels=labels)
+        self.bounds = tuple(sorted(bounds))  # type: Tuple[float, ...]
+        # Note: The last bucket counts values exceeding the largest bound
+        self.counts = [0] * (len(self.bounds) + 1)  # type: List[int]
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self) -> Iterable[str]:
+        cumulative = 0
+        bounds = self.bounds + (float('inf'),)
+        for bound, count in zip(bounds, self.counts):
+            cumulative += count
+            labels = _format_labels(tuple(self.labels) + (('le', _format_value(bound)),))
+            yield '{}_bucket{} {}'.format(self.name, labels, cumulative)
+        yield '{}_sum{} {}'.format(self.name, self._label_str, _format_value(self.sum))
+        yield '{}_count{} {}'.format(self.name, self._label_str, self.count)
+
+
+class LatencyHistogram(_Metric):
+    """
+    A log-linear histogram in the style of HdrHistogram that records
+    latencies with a bounded relative error and without having to
+    configure buckets up front.
+
+    Values are recorded with a resolution of one microsecond. Each
+    power of two is divided into ``2 ** sub_bucket_bits`` linear
+    sub-buckets, so the relative error of a recorded value is at most
+    ``2 ** -sub_bucket_bits``.
+
+    In the Prometheus text format, the histogram is exposed as a
+    summary with the quantiles of :data:`LATENCY_QUANTILES`.
+    """
+    __slots__ = ('_sub_bucket_bits', '_sub_bucket_count', 'counts',
+                 'count', 'sum', 'min', 'max')
+    type = 'summary'
+
+    def __init__(
+            self,
+            name: str,
+            help_: str,
+            labels: Optional[Labels] = None,
+            sub_bucket_bits: int = 5,
+    ) -> None:
+        super().__init__(name, help_, labels=labels)
+        self._sub_bucket_bits = sub_bucket_bits
+        self._sub_bucket_count = 1 << sub_bucket_bits
+        self.counts = []  # type: List[int]
+        self.count = 0
+        self.sum = 0.0
+        self.min = None  # type: Optional[float]
+        self.max = None  # type: Optional[float]
+
+    def _index(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self._sub_bucket_bits - 1)
+        return shift * self._sub_bucket_count + (value >> shift)
+
+    def _highest_equivalent_value(self, index: int) -> int:
+        shift = max(0, index // self._sub_bucket_count - 1)
+        sub_bucket = index - shift * self._sub_bucket_count
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, value: float) -> None:
+        """
+        Record a latency.
+
+        Arguments:
+            - `value`: The latency in seconds.
+        """
+        index = self._index(max(0, int(value * 1e6)))
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index - len(counts) + 1))
+        counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, quantile: float) -> float:
+        """
+        Return the recorded latency at a specific quantile in seconds
+        or `0.0` if nothing has been recorded, yet.
+
+        Arguments:
+            - `quantile`: The quantile between `0.0` and `1.0`.
+        """
+        if self.count == 0:
+            return 0.0
+        threshold = max(1, math.ceil(quantile * self.count))
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                value = self._highest_equivalent_value(index) / 1e6
+                return min(value, cast(float, self.max))
+        return cast(float, self.max)
+
+    def samples(self) -> Iterable[str]:
+        for quantile in LATENCY_QUANTILES:
+            labels = _format_labels(
+                tuple(self.labels) + (('quantile', _format_value(quantile)),))
+            yield '{}{} {}'.format(
+                self.name, labels, _format_value(self.percentile(quantile)))
+        yield '{}_sum{} {}'.format(self.name, self._label_str, _format_value(self.sum))
+        yield '{}_count{} {}'.format(self.name, self._label_str, self.count)
+
+
+class RelayLatency:
+    """
+    The time relayed messages spend inside the server, split into the
+    delay until the destination starts sending the message (queueing
+    delay) and the time it takes to write the message (write time).
+
+    Arguments:
+        - `labels`: Optional labels for both histograms.
+    """
+    __slots__ = ('queue_delay', 'write_time')
+
+    def __init__(self, labels: Optional[Labels] = None) -> None:
+        self.queue_delay = LatencyHistogram(
+            'saltyrtc_relay_queue_delay_seconds',
+            'Delay between receiving a relay message and sending it.',
+            labels=labels)
+        self.write_time = LatencyHistogram(
+            'saltyrtc_relay_write_seconds', 'Time spent writing a relay message.',
+            labels=labels)
+
+    def record(self, queue_delay: float, write_time: float) -> None:
+        """
+        Record the latencies of a relayed message in seconds.
+        """
+        self.queue_delay.record(queue_delay)
+        self.write_time.record(write_time)
+
+
+class Metrics:
+    """
+    Contains all metrics of a :class:`Server` instance.
+
+    Set :attr:`relay_latency_per_path` to `True` in order to record the
+    relay latency for each path in addition to the global one.
+    """
+    def __init__(self) -> None:
+        self._families = OrderedDict()  # type: Dict[str, List[_Metric]]
+        self.relay_latency_per_path = False
+
+        # Connections & paths (collected)
+        self.connections = {
+            state: self._add(Gauge(
+                'saltyrtc_connections', 'Connections by client state.',
+                labels=(('state', state.name),)))
+            for state in ClientState
+        }  # type: Dict[ClientState, Gauge]
+        self.paths = self._add(Gauge('saltyrtc_paths', 'Paths currently in use.'))
+
+        # Handshakes
+        handshakes_help = 'Completed handshakes.'
+        self.handshakes_initiator = self._add(Counter(
+            'saltyrtc_handshakes_total', handshakes_help,
+            labels=(('role', 'initiator'),)))
+        self.handshakes_responder = self._add(Counter(
+            'saltyrtc_handshakes_total', handshakes_help,
+            labels=(('role', 'responder'),)))
+        handshake_duration_help = 'Duration of completed handshakes in seconds.'
+        self.handshake_duration_initiator = self._add(Histogram(
+            'saltyrtc_handshake_duration_seconds', handshake_duration_help,
+            labels=(('role', 'initiator'),)))
+        self.handshake_duration_responder = self._add(Histogram(
+            'saltyrtc_handshake_duration_seconds', handshake_duration_help,
+            labels=(('role', 'responder'),)))
+
+        # Relayed frames and bytes
+        relayed_frames_help = 'Successfully relayed frames.'
+        relayed_bytes_help = 'Successfully relayed bytes.'
+        to_responder = (('direction', 'initiator_to_responder'),)
+        to_initiator = (('direction', 'responder_to_initiator'),)
+        self.relayed_frames_to_responder = self._add(Counter(
+            'saltyrtc_relayed_frames_total', relayed_frames_help, labels=to_responder))
+        self.relayed_frames_to_initiator = self._add(Counter(
+            'saltyrtc_relayed_frames_total', relayed_frames_help, labels=to_initiator))
+        self.relayed_bytes_to_responder = self._add(Counter(
+            'saltyrtc_relayed_bytes_total', relayed_bytes_help, labels=to_responder))
+        self.relayed_bytes_to_initiator = self._add(Counter(
+            'saltyrtc_relayed_bytes_total', relayed_bytes_help, labels=to_initiator))
+        self.send_errors = self._add(Counter(
+            'saltyrtc_send_errors_total', "Enqueued 'send-error' messages."))
+
+        # Relay latency
+        self.relay_latency = RelayLatency()
+        self._add(self.relay_latency.queue_delay)
+        self._add(self.relay_latency.write_time)
+
+        # Task queues (collected)
+        self.task_queue_size_sum = self._add(Gauge(
+            'saltyrtc_task_queue_size_sum', 'Sum of queued tasks of all clients.'))
+        self.task_queue_size_max = self._add(Gauge(
+            'saltyrtc_task_queue_size_max', 'Maximum of queued tasks of a client.'))
+
+        # Keep alive
+        self.ping_rtt = self._add(Histogram(
+            'saltyrtc_ping_rtt_seconds', 'Round-trip time of keep-alive pings.'))
+        self.ping_timeouts = self._add(Counter(
+            'saltyrtc_ping_timeouts_total', 'Keep-alive pings that timed out.'))
+
+        # Close codes
+        close_codes_help = 'Closed connections by close code.'
+        # Note: 1000 is the normal closure code of the WebSocket protocol
+        self.close_codes = {
+            code: self._add(Counter(
+                'saltyrtc_close_codes_total', close_codes_help,
+                labels=(('code', str(code)),)))
+            for code in (1000,) + tuple(code.value for code in CloseCode)
+        }  # type: Dict[int, Counter]
+        self.close_codes_other = self._add(Counter(
+            'saltyrtc_close_codes_total', close_codes_help, labels=(('code', 'other'),)))
+
+        # Events (collected)
+        self.events_queued = self._add(Gauge(
+            'saltyrtc_events_queued', 'Events waiting to be dispatched to callbacks.'))
+        self.events_dropped = self._add(Counter(
+            'saltyrtc_events_dropped_total',
+            'Events that have been discarded because the event queue was full.'))
+
+        # Server state (collected)
+        self.draining = self._add(Gauge(
+            'saltyrtc_draining', 'Whether the server is being drained.'))
+        self.shutdown_total = self._add(Gauge(
+            'saltyrtc_shutdown_connections', 'Connections to be closed on shutdown.'))
+        self.shutdown_closed = self._add(Gauge(
+            'saltyrtc_shutdown_closed_connections',
+            'Connections that have been closed on shutdown.'))
+
+    def _add(self, metric: '_MetricT') -> '_MetricT':
+        self._families.setdefault(metric.name, []).append(metric)
+        return metric
+
+    def handshake_completed(self, type_: Optional[AddressType], duration: float) -> None:
+        """
+        Count a completed handshake and its duration.
+        """
+        if type_ == AddressType.initiator:
+            self.handshakes_initiator.inc()
+            self.handshake_duration_initiator.observe(duration)
+        else:
+            self.handshakes_responder.inc()
+            self.handshake_duration_responder.observe(duration)
+
+    def closed(self, code: int) -> None:
+        """
+        Count a closed connection by its close code.
+        """
+        counter = self.close_codes.get(code)
+        if counter is None:
+            counter = self.close_codes_other
+        counter.inc()
+
+    def collect(self, server: 'Server') -> None:
+        """
+        Collect the metrics that are derived from the server's state.
+        """
+        # Connections by state and task queue sizes
+        states = dict.fromkeys(ClientState, 0)
+        queue_size_sum, queue_size_max = 0, 0
+        for protocol in server.protocols:
+            client = protocol.client
+            if client is None:
+                continue
+            states[client.state] += 1
+            queue_size = client.task_queue_size
+            queue_size_sum += queue_size
+            queue_size_max = max(queue_size_max, queue_size)
+        for state, count in states.items():
+            self.connections[state].set(count)
+        self.task_queue_size_sum.set(queue_size_sum)
+        self.task_queue_size_max.set(queue_size_max)
+
+        # Paths
+        self.paths.set(len(server.paths.paths))
+
+        # Events
+        self.events_queued.set(server.event_dispatcher.size)
+        self.events_dropped.value = server.event_dispatcher.dropped
+
+        # Server state
+        self.draining.set(1 if server.draining else 0)
+        self.shutdown_total.set(server.shutdown_scheduler.total)
+        self.shutdown_closed.set(server.shutdown_scheduler.closed)
+
+    def render(self, server: Optional['Server'] = None) -> str:
+        """
+        Return all metrics in the Prometheus text format.
+
+        Arguments:
+            - `server`: If provided, metrics derived from the server's
+              state will be collected beforehand.
+        """
+        path_metrics = {}  # type: Dict[str, List[_Metric]]
+        if server is not None:
+            self.collect(server)
+
+            # Relay latency of each path
+            for path in server.paths.paths.values():
+                relay_latency = path.relay_latency
+                if relay_latency is not None:
+                    histograms = (relay_latency.queue_delay, relay_latency.write_time)
+                    for histogram in histograms:
+                        path_metrics.setdefault(histogram.name, []).append(histogram)
+
+        lines = []  # type: List[str]
+        for name, metrics in self._families.items():
+            first = metrics[0]
+            lines.append('# HELP {} {}'.format(name, first.help))
+            lines.append('# TYPE {} {}'.format(name, first.type))
+            for metric in itertools.chain(metrics, path_metrics.get(name, ())):
+                lines.extend(metric.samples())
+        lines.append('')
+        return '\n'.join(lines)
+
+
+async def serve_metrics(
+        server: 'Server',
+        host: Optional[str] = '127.0.0.1',
+        port: Optional[int] = None,
+        path: Optional[str] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> asyncio.AbstractServer:
+    """
+    Serve the metrics of a server in the Prometheus text format via
+    HTTP. The listener will be closed along with the server.
+
+    Arguments:
+        - `server`: The :class:`Server` instance.
+        - `host`: The hostname or IP address to listen on. Defaults to
+          `127.0.0.1`.
+        - `port`: The port to listen on.
+        - `path`: The path of a Unix domain socket to listen on
+          instead of `host` and `port`.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+
+    Raises :exc:`ValueError` in case neither `port` nor `path` have
+    been provided.
+    """
+    event_loop = asyncio.get_event_loop() if loop is None else loop
+    log = util.get_logger('metrics')
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # Read request line and skip headers
+            request_line = await asyncio.wait_for(
+                reader.readline(), _REQUEST_TIMEOUT, loop=event_loop)
+            while True:
+                line = await asyncio.wait_for(
+                    reader.readline(), _REQUEST_TIMEOUT, loop=event_loop)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            # Render metrics
+            try:
+                method, target, *_ = request_line.decode('ascii').split()
+            except ValueError:
+                method, target = '', ''
+            if method != 'GET' or target.split('?')[0] not in ('/', '/metrics'):
+                status, body = '404 Not Found', b''
+            else:
+                status, body = '200 OK', server.metrics.render(server).encode('utf-8')
+
+            # Send response
+            writer.write('\r\n'.join((
+                'HTTP/1.1 {}'.format(status),
+                'Content-Type: {}'.format(_CONTENT_TYPE),
+                'Content-Length: {}'.format(len(body)),
+                'Connection: close',
+                '', '',
+            )).encode('ascii') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, UnicodeDecodeError) as exc:
+            log.debug('Metrics request failed: {}', repr(exc))
+        finally:
+            writer.close()
+
+    # Start listener
+    if path is not None:
+        metrics_server = await asyncio.start_unix_server(
+            _handle, path=path, loop=event_loop)
+    elif port is not None:
+        metrics_server = await asyncio.start_server(
+            _handle, host=host, port=port, loop=event_loop)
+    else:
+        raise ValueError('Either a port or a path is required')
+    log.info('Serving metrics on {}', path if path is not None else (host, port))
+
+    # Close along with the server
+    server.add_auxiliary_server(metrics_server)
+    return metrics_server
@@ -0,0 +1,282 @@
+"""
+This module provides a low-overhead sampling profiler and a dump of
+all live :mod:`asyncio` tasks for the SaltyRTC Signalling Server.
+Both are intended to be triggered on a running server (see the
+``serve`` command of the CLI).
+"""
+import asyncio
+import collections
+import cProfile
+import enum
+import os
+import sys
+import threading
+import traceback
+from types import FrameType
+from typing import Dict  # noqa
+from typing import List  # noqa
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Iterable,
+    Iterator,
+    Optional,
+)
+
+from . import util
+
+if TYPE_CHECKING:
+    from typing import Counter as CounterType  # noqa
+
+    from .server import Server
+
+__all__ = (
+    'SAMPLING_INTERVAL_DEFAULT',
+    'ProfileFormat',
+    'SamplingProfiler',
+    'profile',
+    'dump_tasks',
+)
+
+# Default sampling interval in seconds
+SAMPLING_INTERVAL_DEFAULT = 0.005
+
+
+@enum.unique
+class ProfileFormat(enum.Enum):
+    # Collapsed stacks as used by flame graph tools (sampling)
+    collapsed = 'collapsed'
+    # A :mod:`pstats` compatible file (deterministic, higher overhead)
+    pstats = 'pstats'
+
+    @property
+    def file_extension(self) -> str:
+        return 'txt' if self == ProfileFormat.collapsed else 'pstats'
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of a thread (usually the one running the event
+    loop) from a background thread and aggregates the samples as
+    collapsed stacks.
+
+    Arguments:
+        - `interval`: The sampling interval in seconds.
+        - `thread_id`: The identifier of the thread to be sampled.
+          Defaults to the thread calling :meth:`start`.
+    """
+    def __init__(
+            self,
+            interval: float = SAMPLING_INTERVAL_DEFAULT,
+            thread_id: Optional[int] = None,
+    ) -> None:
+        self._log = util.get_logger('profiler')
+        self._thread = None  # type: Optional[threading.Thread]
+        self._stop_event = threading.Event()
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = collections.Counter()  # type: CounterType[str]
+
+    @property
+    def running(self) -> bool:
+        """
+        Return whether the profiler is currently sampling.
+        """
+        return self._thread is not None
+
+    def start(self) -> None:
+        """
+        Start sampling.
+
+        Raises :exc:`RuntimeError` in case the profiler is already
+        running.
+        """
+        if self._thread is not None:
+            raise RuntimeError('Profiler is already running')
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='saltyrtc-profiler', daemon=True)
+        self._thread.start()
+        self._log.debug('Started sampling every {}s', self.interval)
+
+    def stop(self) -> None:
+        """
+        Stop sampling and wait for the sampling thread to terminate.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop_event.set()
+        thread.join()
+        self._thread = None
+        self._log.debug('Stopped sampling, {} samples', sum(self.samples.values()))
+
+    def _run(self) -> None:
+        # noinspection PyProtectedMember
+        current_frames = sys._current_frames
+        thread_id = self.thread_id
+        assert thread_id is not None
+        while not self._stop_event.wait(self.interval):
+            frame = current_frames().get(thread_id)
+            if frame is not None:
+                self.samples[self._collapse(frame)] += 1
+                # Note: Drop the reference to avoid keeping the frame alive
+                del frame
+
+    @staticmethod
+    def _collapse(frame: Optional[FrameType]) -> str:
+        names = []  # type: List[str]
+        while frame is not None:
+            code = frame.f_code
+            names.append('{} ({}:{})'.format(
+                code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    def collapsed(self) -> Iterable[str]:
+        """
+        Return the samples as collapsed stack lines (the stack frames
+        separated by ``;`` followed by the amount of samples).
+        """
+        for stack, count in self.samples.most_common():
+            yield '{} {}'.format(stack, count)
+
+    def write(self, path: str) -> None:
+        """
+        Write the collapsed stacks to a file.
+        """
+        with open(path, 'w') as file:
+            for line in self.collapsed():
+                file.write(line)
+                file.write('\n')
+
+
+async def profile(
+        duration: float,
+        path: str,
+        format_: ProfileFormat = ProfileFormat.collapsed,
+        interval: float = SAMPLING_INTERVAL_DEFAULT,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> str:
+    """
+    Profile the event loop's thread for a specific amount of time and
+    write the result to a file.
+
+    Arguments:
+        - `duration`: The amount of seconds to profile.
+        - `path`: The path of the file to be written.
+        - `format_`: The :class:`ProfileFormat`. Collapsed stacks are
+          being sampled whereas the :mod:`pstats` format requires
+          :mod:`cProfile` which traces every call and therefore has
+          a considerably higher overhead.
+        - `interval`: The sampling interval in seconds (only applies
+          to collapsed stacks).
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+
+    Return the path of the written file. Nothing will be written in
+    case the coroutine is being cancelled.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    log = util.get_logger('profiler')
+    log.info('Profiling for {}s ({})', duration, format_.value)
+
+    if format_ == ProfileFormat.pstats:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(duration, loop=loop)
+        finally:
+            profiler.disable()
+        profiler.dump_stats(path)
+    else:
+        sampler = SamplingProfiler(interval=interval)
+        sampler.start()
+        try:
+            await asyncio.sleep(duration, loop=loop)
+        finally:
+            sampler.stop()
+        sampler.write(path)
+
+    log.info('Profile written to {}', path)
+    return path
+
+
+def _coroutine_stack(coroutine: Any) -> Iterator[FrameType]:
+    """
+    Yield the frames of a coroutine and of all coroutines (and
+    generators) it is awaiting.
+    """
+    while coroutine is not None:
+        frame = getattr(coroutine, 'cr_frame', getattr(coroutine, 'gi_frame', None))
+        if frame is None:
+            break
+        yield frame
+        coroutine = getattr(
+            coroutine, 'cr_await', getattr(coroutine, 'gi_yieldfrom', None))
+
+
+def _task_owners(server: 'Server') -> Dict[int, str]:
+    """
+    Map the identifiers of the tasks of a server's protocols to a
+    description of the task and its owning client.
+    """
+    owners = {}  # type: Dict[int, str]
+    for protocol in server.protocols:
+        client = protocol.client
+        if protocol.handler_task is not None:
+            owners[id(protocol.handler_task)] = 'handler of {}'.format(client)
+        if client is None:
+            continue
+        tasks = client.tasks
+        for name, task in (
+            ('task loop', tasks.task_loop),
+            ('receive loop', tasks.receive_loop),
+            ('keep alive loop', tasks.keep_alive_loop),
+        ):
+            if task is not None:
+                owners[id(task)] = '{} of {}'.format(name, client)
+    return owners
+
+
+def dump_tasks(
+        server: Optional['Server'] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> str:
+    """
+    Return a human readable dump of all live tasks of an event loop
+    including their coroutine stack and, if a server has been provided,
+    the owning :class:`PathClient`.
+
+    Arguments:
+        - `server`: An optional :class:`Server` instance used to
+          determine the owner of a task.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    try:
+        tasks = asyncio.all_tasks(loop=loop)
+    except AttributeError:
+        # Python < 3.7
+        tasks = asyncio.Task.all_tasks(loop=loop)
+    owners = {} if server is None else _task_owners(server)
+
+    lines = ['{} live tasks'.format(len(tasks))]  # type: List[str]
+    for task in tasks:
+        lines.append('')
+        owner = owners.get(id(task))
+        if owner is not None:
+            lines.append('{} ({})'.format(task, owner))
+        else:
+            lines.append(str(task))
+        coroutine = getattr(task, 'get_coro', lambda: getattr(task, '_coro', None))()
+        summary = traceback.StackSummary.extract(
+            (frame, frame.f_lineno) for frame in _coroutine_stack(coroutine))
+        lines.extend(line.rstrip('\n') for line in summary.format())
+    return '\n'.join(lines)
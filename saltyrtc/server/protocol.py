@@ -49,6 +49,8 @@ from .message import (
     OutgoingMessageMixin,
     unpack,
 )
+from .metrics import RelayLatency  # noqa
+from .transport import Connection
 from .typing import (
     ClientCookie,
     ClientPublicKey,
@@ -72,6 +74,10 @@ __all__ = (
     'PathClient',
 )
 
+# Responder slots (0x02 to 0xff)
+_RESPONDER_ADDRESS_FIRST = 0x02
+_RESPONDER_SLOTS = 0x100 - _RESPONDER_ADDRESS_FIRST
+
 # Do not export!
 SNT = TypeVar('SNT', bound=SequenceNumber)
 
@@ -84,8 +90,9 @@ class _TaskQueueState(enum.IntEnum):
 
 
 class Path:
-    __slots__ = ('_initiator', '_responders',
-                 'log', 'initiator_key', 'number', 'attached')
+    __slots__ = ('_initiator', '_responders', '_used_slots',
+                 'log', 'initiator_key', 'number', 'attached', 'relay_latency',
+                 'relayed_frames', 'relayed_bytes')
 
     def __init__(
             self,
@@ -95,10 +102,17 @@ class Path:
     ) -> None:
         self._initiator = None  # type: Optional[PathClient]
         self._responders = {}  # type: Dict[ResponderAddress, PathClient]
-        self.log = util.get_logger('path.{}'.format(number))
+        # Bitmap of the responder slots in use (bit 0 is address 0x02)
+        self._used_slots = 0
+        self.log = util.get_context_logger('path', 'path.{}'.format(number), path=number)
         self.initiator_key = initiator_key
         self.number = number
         self.attached = attached
+        # Note: Will only be set if the relay latency is recorded per path
+        self.relay_latency = None  # type: Optional[RelayLatency]
+        # Note: Will be reset each time the path statistics are being raised
+        self.relayed_frames = 0
+        self.relayed_bytes = 0
 
     @property
     def empty(self) -> bool:
@@ -198,14 +212,15 @@ class Path:
 
         Return the assigned slot identifier.
         """
-        # Calculate slot id
-        id_ = len(self._responders) + 0x02
-        try:
-            id_ = ResponderAddress(id_)
-        except ValueError as exc:
-            raise SlotsFullError('No free slot on path') from exc
+        # Find the lowest free slot (lowest unset bit of the bitmap)
+        used_slots = self._used_slots
+        slot = (~used_slots & (used_slots + 1)).bit_length() - 1
+        if slot >= _RESPONDER_SLOTS:
+            raise SlotsFullError('No free slot on path')
+        id_ = ResponderAddress(slot + _RESPONDER_ADDRESS_FIRST)
 
         # Set responder
+        self._used_slots = used_slots | (1 << slot)
         self._responders[id_] = responder
         self.log.debug('Added responder {}', responder)
         # Update responder's log name
@@ -248,6 +263,7 @@ class Path:
             except ValueError:
                 raise KeyError('Invalid responder id: {}'.format(id_))
             del self._responders[id_]
+            self._used_slots &= ~(1 << (id_ - _RESPONDER_ADDRESS_FIRST))
         self.log.debug('Removed {}', 'initiator' if is_initiator else 'responder')
 
 
@@ -343,6 +359,10 @@ class PathClient:
         'type',
         'keep_alive_timeout',
         'keep_alive_pings',
+        'connected_at',
+        'last_activity',
+        'bytes_in',
+        'bytes_out',
         'tasks',
         '_task_queue',
         '_task_queue_state',
@@ -369,14 +389,14 @@ class PathClient:
 
     def __init__(
             self,
-            connection: websockets.WebSocketServerProtocol,
+            connection: Connection,
             path_number: int,
             initiator_key: InitiatorPublicPermanentKey,
             loop: Optional[asyncio.AbstractEventLoop] = None,
     ) -> None:
         self._loop = asyncio.get_event_loop() if loop is None else loop
         self._state = ClientState.restricted
-        self._connection = connection  # type: websockets.WebSocketServerProtocol
+        self._connection = connection  # type: Connection
         connection_closed_future = \
             asyncio.Future(loop=self._loop)  # type: asyncio.Future[int]
         self._connection_closed_future = connection_closed_future
@@ -393,15 +413,25 @@ class PathClient:
         self._sign_box = None  # type: Optional[SignBox]
         self._id = SERVER_ADDRESS  # type: Address
         self._keep_alive_interval = KEEP_ALIVE_INTERVAL_DEFAULT
-        self.log = util.get_logger('path.{}.client.{:x}'.format(path_number, id(self)))
+        self.log = util.get_context_logger(
+            'client', 'path.{}.client.{:x}'.format(path_number, id(self)),
+            path=path_number, client='{:x}'.format(id(self)))
         self.type = None  # type: Optional[AddressType]
         self.keep_alive_timeout = KEEP_ALIVE_TIMEOUT
         self.keep_alive_pings = 0
+        self.connected_at = self._loop.time()
+        self.last_activity = self.connected_at
+        self.bytes_in = 0
+        self.bytes_out = 0
         self.tasks = PathClientTasks()
 
         # Schedule connection closed future
         def _connection_closed(_: Any) -> None:
-            connection_closed_future.set_result(connection.close_code)
+            # Note: The close code is set once the connection has been lost, so the
+            #       abnormal closure code is merely a fallback.
+            close_code = connection.close_code
+            connection_closed_future.set_result(
+                1006 if close_code is None else close_code)
         self._connection.connection_lost_waiter.add_done_callback(_connection_closed)
 
         # Queue for tasks to be run on the client (relay messages, closing, ...)
@@ -624,12 +654,16 @@ class PathClient:
 
     def update_log_name(self, slot_id: ClientAddress) -> None:
         """
-        Update the logger's name by the assigned slot identifier.
+        Update the logger's name and context by the assigned slot
+        identifier.
 
         Arguments:
             - `slot_id`: The slot identifier of the client.
         """
         self.log.name += '.0x{:02x}'.format(slot_id)
+        self.log.context['slot'] = int(slot_id)
+        self.log.context['role'] = ('initiator' if slot_id == INITIATOR_ADDRESS
+                                    else 'responder')
 
     def valid_cookie(self, cookie_in: Optional[ClientCookie]) -> bool:
         """
@@ -685,6 +719,13 @@ class PathClient:
                 self._csn_in, csn_in
             ))
 
+    @property
+    def task_queue_size(self) -> int:
+        """
+        Return the amount of tasks currently in the task queue.
+        """
+        return self._task_queue.qsize()
+
     def p2p_allowed(self, destination_type: AddressType) -> bool:
         """
         Return `True` if :class:`RelayMessage` instances are allowed
@@ -742,7 +783,8 @@ class PathClient:
         Raises :exc:`InternalError` if called more times than there
         were tasks placed in the queue.
         """
-        self.log.debug('Done task {}', awaitable)
+        if util.log_guard.debug:
+            self.log.debug('Done task {}', awaitable)
         try:
             self._task_queue.task_done()
         except ValueError:
@@ -846,18 +888,24 @@ class PathClient:
         MessageFlowError
         """
         # Pack
-        self.log.debug('Packing message: {}', message.type)
+        if util.log_guard.debug:
+            self.log.debug('Packing message: {}', message.type)
         data = message.pack(self)
-        self.log.trace('server >> {}', message)
+        if util.log_guard.trace:
+            self.log.trace('server >> {}', message)
 
         # Send data
-        self.log.debug('Sending message')
+        if util.log_guard.debug:
+            self.log.debug('Sending message')
         try:
             await self._connection.send(data)
         except websockets.ConnectionClosed as exc:
-            self.log.debug('Connection closed while sending')
+            if util.log_guard.debug:
+                self.log.debug('Connection closed while sending')
             self.close_task_queue()
             raise Disconnected(exc.code) from exc
+        self.bytes_out += len(data)
+        self.last_activity = self._loop.time()
 
     async def receive(self) -> IncomingMessageMixin:
         """
@@ -872,30 +920,40 @@ class PathClient:
         try:
             data = await self._connection.recv()
         except websockets.ConnectionClosed as exc:
-            self.log.debug('Connection closed while receiving')
+            if util.log_guard.debug:
+                self.log.debug('Connection closed while receiving')
             self.close_task_queue()
             raise Disconnected(exc.code) from exc
-        self.log.debug('Received message')
+        received_at = self._loop.time()
+        if util.log_guard.debug:
+            self.log.debug('Received message')
 
         # Ensure binary
         if not isinstance(data, bytes):
             raise MessageError("Data must be 'bytes', not '{}'".format(type(data)))
+        self.bytes_in += len(data)
+        self.last_activity = received_at
 
         # Unpack data and return
         message = unpack(self, Packet(data))
-        self.log.debug('Unpacked message: {}', message.type)
-        self.log.trace('server << {}', message)
+        message.received_at = received_at
+        if util.log_guard.debug:
+            self.log.debug('Unpacked message: {}', message.type)
+        if util.log_guard.trace:
+            self.log.trace('server << {}', message)
         return message
 
     async def ping(self) -> Awaitable[None]:
         """
         Disconnected
         """
-        self.log.debug('Sending ping')
+        if util.log_guard.debug:
+            self.log.debug('Sending ping')
         try:
             pong_future = await self._connection.ping()
         except websockets.ConnectionClosed as exc:
-            self.log.debug('Connection closed while pinging')
+            if util.log_guard.debug:
+                self.log.debug('Connection closed while pinging')
             self.close_task_queue()
             raise Disconnected(exc.code) from exc
         return self._wait_pong(pong_future)
@@ -907,7 +965,8 @@ class PathClient:
         try:
             await pong_future
         except websockets.ConnectionClosed as exc:
-            self.log.debug('Connection closed while waiting for pong')
+            if util.log_guard.debug:
+                self.log.debug('Connection closed while waiting for pong')
             self.close_task_queue()
             raise Disconnected(exc.code) from exc
 
@@ -1,6 +1,12 @@
 import asyncio
 import binascii
+import functools
+import math
+import os
+import random
+import socket
 import ssl
+import urllib.parse
 from collections import OrderedDict
 from typing import Awaitable  # noqa
 from typing import ClassVar  # noqa
@@ -37,9 +43,10 @@ from .common import (
     ResponderAddress,
     SubProtocol,
 )
+from .eventlog import EventLog  # noqa
 from .events import (
     Event,
-    EventRegistry,
+    EventDispatcher,
 )
 from .exception import (
     Disconnected,
@@ -53,6 +60,7 @@ from .exception import (
     SignalingError,
     SlotsFullError,
 )
+from .health import HealthCheck
 from .message import (
     ClientAuthMessage,
     ClientHelloMessage,
@@ -65,19 +73,33 @@ from .message import (
     ServerAuthMessage,
     ServerHelloMessage,
 )
+from .metrics import Counter  # noqa
+from .metrics import (
+    Metrics,
+    RelayLatency,
+)
 from .protocol import (
     Path,
     PathClient,
 )
+from .transport import (
+    Connection,
+    Engine,
+    MemoryServer,
+    StreamServer,
+)
 from .typing import (
     ChosenSubProtocol,
+    ClientDroppedData,
     DisconnectedData,
     EventCallback,
     EventData,
+    HandshakeCompletedData,
     InitiatorPublicPermanentKey,
     ListOrTuple,
     MessageId,
     PathHex,
+    PathStatsData,
     ResponderPublicSessionKey,
     ServerCookie,
     ServerPublicPermanentKey,
@@ -85,9 +107,12 @@ from .typing import (
 )
 
 __all__ = (
+    'Listener',
     'serve',
+    'serve_memory',
     'ServerProtocol',
     'Paths',
+    'ShutdownScheduler',
     'Server',
 )
 
@@ -98,6 +123,110 @@ _TASK_QUEUE_JOIN_TIMEOUT = 10.0
 ST = TypeVar('ST', bound='Server')
 CloseFuture = Union['asyncio.Future[None]', Coroutine[Any, Any, None]]
 Keys = Mapping[ServerPublicPermanentKey, ServerSecretPermanentKey]
+WSServer = Union[websockets.server.WebSocketServer, MemoryServer, StreamServer]
+
+
+class Listener:
+    """
+    An address the server listens on: Either a host and port, a Unix
+    domain socket or an already listening socket.
+
+    Arguments:
+        - `host`: The hostname or IP address to listen on. Defaults to
+          all interfaces.
+        - `port`: The port to listen on. Defaults to `8765`.
+        - `ssl_context`: An `ssl.SSLContext` instance for WSS or `None`
+          for plain WS.
+        - `unix_path`: The path of a Unix domain socket to listen on
+          instead of `host` and `port`.
+        - `unix_mode`: The file permissions of the Unix domain socket.
+          Defaults to the permissions resulting from the umask.
+        - `sock`: A listening socket to accept connections from instead
+          of `host`, `port` and `unix_path` (e.g. passed by systemd).
+          Closing the server closes the socket, so pass a duplicate
+          (see :meth:`socket.socket.dup`) in case the socket should be
+          reused.
+    """
+    __slots__ = ('host', 'port', 'ssl_context', 'unix_path', 'unix_mode', 'sock')
+
+    def __init__(
+            self,
+            host: Optional[str] = None,
+            port: int = 8765,
+            ssl_context: Optional[ssl.SSLContext] = None,
+            unix_path: Optional[str] = None,
+            unix_mode: Optional[int] = None,
+            sock: Optional[socket.socket] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.unix_path = unix_path
+        self.unix_mode = unix_mode
+        self.sock = sock
+
+    def __str__(self) -> str:
+        if self.sock is not None:
+            return 'socket:{}'.format(self.sock.getsockname() or '<unnamed>')
+        if self.unix_path is not None:
+            return 'unix:{}'.format(self.unix_path)
+        host = '' if self.host is None else self.host
+        if ':' in host:
+            host = '[{}]'.format(host)
+        return '{}://{}:{}'.format(
+            'ws' if self.ssl_context is None else 'wss', host, self.port)
+
+    def __repr__(self) -> str:
+        return '<{} {}>'.format(self.__class__.__name__, self)
+
+    @classmethod
+    def from_address(
+            cls,
+            address: str,
+            ssl_context: Optional[ssl.SSLContext] = None,
+            unix_mode: Optional[int] = None,
+    ) -> 'Listener':
+        """
+        Create a listener from an address in one of the following
+        formats:
+
+        - `wss://HOST:PORT` listens with TLS on a host and port,
+        - `ws://HOST:PORT` listens without TLS on a host and port,
+        - `unix:PATH` listens without TLS on a Unix domain socket.
+
+        IPv6 addresses must be enclosed in square brackets. An empty
+        host listens on all interfaces.
+
+        Arguments:
+            - `address`: The address to be parsed.
+            - `ssl_context`: The `ssl.SSLContext` instance used for
+              `wss` addresses.
+            - `unix_mode`: The file permissions used for `unix`
+              addresses.
+
+        Raises :exc:`ValueError` in case the address is invalid or a
+        `wss` address has been provided without an SSL context.
+        """
+        if address.startswith('unix:'):
+            unix_path = address[5:]
+            if len(unix_path) == 0:
+                raise ValueError('Missing path of the Unix domain socket')
+            return cls(unix_path=unix_path, unix_mode=unix_mode)
+
+        # Parse host and port
+        url = urllib.parse.urlsplit(address)
+        if url.scheme not in ('ws', 'wss'):
+            raise ValueError("Unsupported scheme: '{}'".format(url.scheme))
+        if url.path not in ('', '/') or url.query != '' or url.fragment != '':
+            raise ValueError('Unexpected path, query or fragment')
+        port = url.port  # Note: Raises ValueError in case the port is invalid
+        if port is None:
+            raise ValueError('Missing port')
+        if url.scheme == 'wss' and ssl_context is None:
+            raise ValueError('A TLS certificate is required for wss addresses')
+        return cls(
+            host=url.hostname or None, port=port,
+            ssl_context=ssl_context if url.scheme == 'wss' else None)
 
 
 async def serve(
@@ -110,6 +239,13 @@ async def serve(
         event_callbacks: Optional[Mapping[Event, Iterable[EventCallback]]] = None,
         server_class: Optional[Type[ST]] = None,
         ws_kwargs: Optional[Mapping[str, Any]] = None,
+        event_dispatcher: Optional[EventDispatcher] = None,
+        path_stats_interval: Optional[float] = 60.0,
+        engine: Engine = Engine.websockets,
+        unix_path: Optional[str] = None,
+        unix_mode: Optional[int] = None,
+        listeners: Optional[Sequence[Listener]] = None,
+        health_check: Optional[HealthCheck] = None,
 ) -> ST:
     """
     Start serving SaltyRTC Signalling Clients.
@@ -137,15 +273,166 @@ async def serve(
         - `ws_kwargs`: Additional keyword arguments passed to
           :func:`websockets.server.serve`. Note that the fields `ssl`,
           `host`, `port`, `loop`, `subprotocols` and `ping_interval`
-          will be overridden.
+          will be overridden (as well as `process_request` if
+          `health_check` has been provided).
 
           If the `compression` field is not explicitly set,
           compression will be disabled (since the data to be compressed
           is already encrypted, compression will have little to no
           positive effect).
 
+          For other engines, the arguments are passed to the
+          connection class (see :class:`StreamConnection`).
+        - `event_dispatcher`: An optional :class:`EventDispatcher`
+          instance that dispatches events to the event callbacks.
+          Defaults to a dispatcher with a bounded queue that discards
+          and counts events on overflow.
+        - `path_stats_interval`: The interval in seconds in which the
+          `path-stats` event will be raised for each path. `None`
+          disables the event. Defaults to `60`.
+        - `engine`: The :class:`Engine` implementing WebSocket.
+          Defaults to :mod:`websockets`.
+        - `unix_path`: The path of a Unix domain socket the server
+          will listen on instead of `host` and `port` (e.g. behind a
+          reverse proxy).
+        - `unix_mode`: The file permissions of the Unix domain socket.
+          Defaults to the permissions resulting from the umask.
+        - `listeners`: A sequence of :class:`Listener` instances to
+          listen on multiple addresses (e.g. IPv4 and IPv6, Unix
+          domain sockets and TLS next to plain listeners) with the
+          same server and paths. Overrides `ssl_context`, `host`,
+          `port`, `unix_path` and `unix_mode`.
+        - `health_check`: An optional :class:`HealthCheck` instance
+          which answers health, readiness and statistics requests on
+          all listeners without upgrading them to WebSocket (e.g. for
+          load balancers).
+
     Raises :exc:`ServerKeyError` in case one or more keys have been repeated.
+    Raises :exc:`ImportError` in case the engine's dependencies are not
+    installed.
+    Raises :exc:`ValueError` in case an empty sequence of listeners has
+    been provided.
+    Raises :exc:`OSError` in case a listener could not be started. All
+    other listeners will be closed in that case.
     """
+    # Prepare arguments for the WS servers
+    if ws_kwargs is None:
+        ws_kwargs = {}
+    if listeners is None:
+        listeners = [Listener(
+            host=host, port=port, ssl_context=ssl_context, unix_path=unix_path,
+            unix_mode=unix_mode)]
+    elif len(listeners) == 0:
+        raise ValueError('At least one listener is required')
+
+    server = _create_server(
+        keys, paths, loop, event_callbacks, server_class, event_dispatcher,
+        path_stats_interval)
+
+    # Measure the event loop lag for readiness requests
+    if health_check is not None:
+        server.health_check = health_check
+        server.start_loop_lag_monitor(health_check.loop_lag_interval)
+
+    # Start a WS server for each listener
+    try:
+        for listener in listeners:
+            server.add_server(await _listen(server, listener, engine, ws_kwargs, loop))
+    except Exception:
+        # Close the listeners that have already been started
+        server.close()
+        await server.wait_closed()
+        raise
+
+    # Return server
+    return server
+
+
+async def _listen(
+        server: 'Server',
+        listener: Listener,
+        engine: Engine,
+        ws_kwargs: Mapping[str, Any],
+        loop: Optional[asyncio.AbstractEventLoop],
+) -> WSServer:
+    """
+    Start a WS server listening on the address of a listener.
+    """
+    kwargs = dict(ws_kwargs)
+    if server.health_check is not None:
+        kwargs['process_request'] = functools.partial(
+            server.health_check.process_request, server)
+    if engine is Engine.websockets:
+        kwargs['ssl'] = listener.ssl_context
+        kwargs.setdefault('compression', None)
+        # Disable the keep-alive of the transport library
+        kwargs['ping_interval'] = None
+        kwargs['subprotocols'] = server.subprotocols
+        if listener.sock is not None:
+            ws_server = await websockets.serve(
+                server.handler, sock=listener.sock, **kwargs)  # type: WSServer
+        elif listener.unix_path is not None:
+            ws_server = await websockets.unix_serve(
+                server.handler, listener.unix_path, **kwargs)
+        else:
+            kwargs['host'] = listener.host
+            kwargs['port'] = listener.port
+            ws_server = await websockets.serve(server.handler, **kwargs)
+    else:
+        stream_server = StreamServer(
+            engine, server.handler, server.subprotocols, loop=loop, **kwargs)
+        if listener.sock is not None:
+            await stream_server.listen(
+                sock=listener.sock, ssl_context=listener.ssl_context)
+        elif listener.unix_path is not None:
+            await stream_server.listen_unix(
+                listener.unix_path, ssl_context=listener.ssl_context)
+        else:
+            await stream_server.listen(
+                host=listener.host, port=listener.port, ssl_context=listener.ssl_context)
+        ws_server = stream_server
+
+    # Apply permissions of the Unix domain socket
+    if (listener.sock is None and listener.unix_path is not None
+            and listener.unix_mode is not None):
+        os.chmod(listener.unix_path, listener.unix_mode)
+    return ws_server
+
+
+async def serve_memory(
+        keys: Optional[Sequence[ServerSecretPermanentKey]],
+        paths: Optional['Paths'] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        event_callbacks: Optional[Mapping[Event, Iterable[EventCallback]]] = None,
+        server_class: Optional[Type[ST]] = None,
+        event_dispatcher: Optional[EventDispatcher] = None,
+        path_stats_interval: Optional[float] = 60.0,
+) -> ST:
+    """
+    Start serving SaltyRTC Signalling Clients via in-memory connections
+    instead of WebSockets. Clients connect by calling
+    :meth:`MemoryServer.connect` of the server's :attr:`Server.server`.
+
+    All arguments are the same as for :func:`serve`.
+
+    Raises :exc:`ServerKeyError` in case one or more keys have been repeated.
+    """
+    server = _create_server(
+        keys, paths, loop, event_callbacks, server_class, event_dispatcher,
+        path_stats_interval)
+    server.server = MemoryServer(server.handler, server.subprotocols, loop=loop)
+    return server
+
+
+def _create_server(
+        keys: Optional[Sequence[ServerSecretPermanentKey]],
+        paths: Optional['Paths'],
+        loop: Optional[asyncio.AbstractEventLoop],
+        event_callbacks: Optional[Mapping[Event, Iterable[EventCallback]]],
+        server_class: Optional[Type[ST]],
+        event_dispatcher: Optional[EventDispatcher],
+        path_stats_interval: Optional[float],
+) -> ST:
     if loop is None:
         loop = asyncio.get_event_loop()
 
@@ -156,7 +443,7 @@ async def serve(
     # Create server
     if server_class is None:
         server_class = cast('Type[ST]', Server)
-    server = server_class(keys, paths, loop=loop)
+    server = server_class(keys, paths, loop=loop, event_dispatcher=event_dispatcher)
 
     # Register event callbacks
     if event_callbacks is not None:
@@ -164,25 +451,10 @@ async def serve(
             for callback in callbacks:
                 server.register_event_callback(event, callback)
 
-    # Prepare arguments for the WS server
-    if ws_kwargs is None:
-        ws_kwargs = {}
-    else:
-        ws_kwargs = dict(ws_kwargs)
-    ws_kwargs['ssl'] = ssl_context
-    ws_kwargs['host'] = host
-    ws_kwargs['port'] = port
-    ws_kwargs.setdefault('compression', None)
-    ws_kwargs['ping_interval'] = None  # Disable the keep-alive of the transport library
-    ws_kwargs['subprotocols'] = server.subprotocols
-
-    # Start WS server
-    ws_server = await websockets.serve(server.handler, **ws_kwargs)
-
-    # Set WS server instance
-    server.server = ws_server
+    # Raise path statistics periodically
+    if path_stats_interval is not None:
+        server.start_path_stats(path_stats_interval)
 
-    # Return server
     return server
 
 
@@ -193,6 +465,11 @@ class ServerProtocol:
         '_log',
         '_loop',
         '_server',
+        '_metrics',
+        '_relayed_frames',
+        '_relayed_bytes',
+        '_relay_latencies',
+        '_event_log',
         'subprotocol',
         'path',
         'client',
@@ -203,7 +480,7 @@ class ServerProtocol:
             self,
             server: 'Server',
             subprotocol: SubProtocol,
-            connection: websockets.WebSocketServerProtocol,
+            connection: Connection,
             ws_path: str,
             loop: Optional[asyncio.AbstractEventLoop] = None,
     ) -> None:
@@ -214,6 +491,15 @@ class ServerProtocol:
         self._server = server
         self.subprotocol = subprotocol
 
+        # Metrics (relay counters will be bound once the client's role is known)
+        self._metrics = server.metrics
+        self._relayed_frames = None  # type: Optional[Counter]
+        self._relayed_bytes = None  # type: Optional[Counter]
+        self._relay_latencies = ()  # type: Tuple[RelayLatency, ...]
+
+        # Event log (if any)
+        self._event_log = server.event_log
+
         # Path and client instance
         self.path = None  # type: Optional[Path]
         self.client = None  # type: Optional[PathClient]
@@ -227,6 +513,7 @@ class ServerProtocol:
 
             async def close_with_protocol_error() -> None:
                 await connection.close(code=CloseCode.protocol_error.value)
+                self._metrics.closed(CloseCode.protocol_error.value)
                 self._server.notify_disconnected(
                     None, DisconnectedData(CloseCode.protocol_error.value))
             handler_coroutine = close_with_protocol_error()
@@ -235,6 +522,11 @@ class ServerProtocol:
             client.log.info('Connection established')
             client.log.debug('Worker started')
 
+            # Count the close code once the connection has been closed
+            # Note: This includes connections closed before the client has been
+            #       authenticated (e.g. due to a handshake timeout).
+            client.connection_closed_future.add_done_callback(self._count_close_code)
+
             # Store path and client
             self.path = path
             self.client = client
@@ -368,6 +660,9 @@ class ServerProtocol:
         self._server.unregister(self)
         client.log.debug('Worker stopped')
 
+    def _count_close_code(self, connection_closed_future: 'asyncio.Future[int]') -> None:
+        self._metrics.closed(connection_closed_future.result())
+
     async def close(self, code: CloseCode) -> None:
         """
         Close the underlying connection and stop the protocol.
@@ -383,25 +678,38 @@ class ServerProtocol:
             # 'disconnect' message for each client.
             await self._drop_client(self.client, code)
 
-    def get_path_client(
-            self,
-            connection: websockets.WebSocketServerProtocol,
-            ws_path: str,
-    ) -> Tuple[Path, PathClient]:
+    @classmethod
+    def get_initiator_key(cls, ws_path: str) -> InitiatorPublicPermanentKey:
+        """
+        Return the initiator's public permanent key from the WebSocket
+        path.
+
+        Raises :exc:`PathError` in case the path is invalid.
+        """
         # Extract public key from path
         initiator_key_hex = ws_path[1:]
 
         # Validate key
-        if len(initiator_key_hex) != self.PATH_LENGTH:
+        if len(initiator_key_hex) != cls.PATH_LENGTH:
             raise PathError('Invalid path length: {}'.format(len(initiator_key_hex)))
         try:
-            initiator_key = InitiatorPublicPermanentKey(
-                binascii.unhexlify(initiator_key_hex))
+            return InitiatorPublicPermanentKey(binascii.unhexlify(initiator_key_hex))
         except (binascii.Error, ValueError) as exc:
             raise PathError('Could not unhexlify path') from exc
 
+    def get_path_client(
+            self,
+            connection: Connection,
+            ws_path: str,
+    ) -> Tuple[Path, PathClient]:
+        # Extract and validate public key from path
+        initiator_key = self.get_initiator_key(ws_path)
+
         # Get path instance
-        path = self._server.paths.get(initiator_key)
+        path, created = self._server.paths.get_or_create(initiator_key)
+        if created:
+            self._server.notify_path_created(
+                PathHex(binascii.hexlify(initiator_key).decode('ascii')))
 
         # Create client instance
         client = PathClient(connection, path.number, initiator_key, loop=self._loop)
@@ -427,7 +735,23 @@ class ServerProtocol:
 
         # Do handshake
         client.log.debug('Starting handshake')
+        event_log = self._event_log
+        if event_log is not None:
+            event_log.emit(
+                'handshake_started', path=path.number, client='{:x}'.format(id(client)))
+        handshake_start = self._loop.time()
         await self.handshake()
+        handshake_duration = self._loop.time() - handshake_start
+        self._metrics.handshake_completed(client.type, handshake_duration)
+        hex_path = PathHex(binascii.hexlify(path.initiator_key).decode('ascii'))
+        assert client.type is not None
+        self._server.notify_handshake_completed(hex_path, HandshakeCompletedData(
+            client.type.name, handshake_duration))
+        if event_log is not None:
+            event_log.emit(
+                'handshake_completed', path=path.number,
+                client='{:x}'.format(id(client)), id=client.id,
+                key=hex_path, duration=handshake_duration)
 
         # Check if the client is still connected to the path or has already been dropped.
         # Note: This can happen when the client is being picked up and dropped by another
@@ -443,15 +767,25 @@ class ServerProtocol:
         client.log.debug('Starting to poll for enqueued tasks')
         task_loop = self.task_loop()
 
+        # Bind relay latency histograms
+        self._relay_latencies = (self._metrics.relay_latency,)
+        if self._metrics.relay_latency_per_path:
+            if path.relay_latency is None:
+                path.relay_latency = RelayLatency(labels=(('path', hex_path),))
+            self._relay_latencies += (path.relay_latency,)
+
         # Task: Poll for messages
-        hex_path = PathHex(binascii.hexlify(path.initiator_key).decode('ascii'))
         receive_loop = None  # type: Optional[Coroutine[Any, Any, None]]
         if client.type == AddressType.initiator:
+            self._relayed_frames = self._metrics.relayed_frames_to_responder
+            self._relayed_bytes = self._metrics.relayed_bytes_to_responder
             self._server.notify_initiator_connected(hex_path)
             if is_connected:
                 client.log.debug('Starting runner for initiator')
                 receive_loop = self.initiator_receive_loop()
         elif client.type == AddressType.responder:
+            self._relayed_frames = self._metrics.relayed_frames_to_initiator
+            self._relayed_bytes = self._metrics.relayed_bytes_to_initiator
             self._server.notify_responder_connected(hex_path)
             if is_connected:
                 client.log.debug('Starting runner for responder')
@@ -459,6 +793,9 @@ class ServerProtocol:
         else:
             raise ValueError('Invalid address type: {}'.format(client.type))
 
+        # Wait until the event dispatcher has room (only blocks if requested)
+        await self._server.event_dispatcher.wait_writable()
+
         # Task: Keep alive
         keep_alive_loop = None  # type: Optional[Coroutine[Any, Any, None]]
         if is_connected:
@@ -539,7 +876,8 @@ class ServerProtocol:
                 # We can safely ignore this since clients will be removed immediately
                 # from the path in case they are being dropped by another client.
                 pass
-            self._server.paths.clean(path)
+            if self._server.paths.clean(path):
+                self._server.notify_path_removed(hex_path)
 
             # Finally, raise the exception
             raise exc
@@ -680,14 +1018,16 @@ class ServerProtocol:
             awaitable = await client.dequeue_task()
 
             # Wait and handle exceptions
-            client.log.debug('Waiting for task to complete {}', awaitable)
+            if util.log_guard.debug:
+                client.log.debug('Waiting for task to complete {}', awaitable)
             try:
                 await awaitable
             except Exception as exc:
-                if isinstance(exc, asyncio.CancelledError):
-                    client.log.debug('Cancelling active task {}', awaitable)
-                else:
-                    client.log.debug('Stopping active task {}, ', awaitable)
+                if util.log_guard.debug:
+                    if isinstance(exc, asyncio.CancelledError):
+                        client.log.debug('Cancelling active task {}', awaitable)
+                    else:
+                        client.log.debug('Stopping active task {}, ', awaitable)
                 if asyncio.iscoroutine(awaitable):
                     coroutine = cast('Coroutine[Any, Any, None]', awaitable)
                     coroutine.close()
@@ -768,16 +1108,22 @@ class ServerProtocol:
     ) -> None:
         source = self.client
         assert source is not None
+        received_at = message.received_at
+        if received_at is None:
+            received_at = self._loop.time()
 
         # Prepare message
-        source.log.debug('Packing relay message')
-        message_id = MessageId(message.pack(source)[COOKIE_LENGTH:NONCE_LENGTH])
+        if util.log_guard.debug:
+            source.log.debug('Packing relay message')
+        data = message.pack(source)
+        message_id = MessageId(data[COOKIE_LENGTH:NONCE_LENGTH])
 
         async def send_error_message() -> None:
             assert source is not None
             # Create message and add send coroutine to task queue of the source
             error = SendErrorMessage.create(ClientAddress(source.id), message_id)
             source.log.info('Relaying failed, enqueuing send-error')
+            self._metrics.send_errors.inc()
             await source.enqueue_task(source.send(error))
 
         # Destination not connected? Send 'send-error' to source
@@ -789,8 +1135,10 @@ class ServerProtocol:
             return
 
         # Add send task to task queue of the source
-        task = self._loop.create_task(destination.send(message))
-        destination.log.debug('Enqueueing relayed message from 0x{:02x}', source.id)
+        task = self._loop.create_task(
+            self._send_relay_message(destination, message, len(data), received_at))
+        if util.log_guard.debug:
+            destination.log.debug('Enqueueing relayed message from 0x{:02x}', source.id)
         await destination.enqueue_task(task)
 
         # noinspection PyBroadException
@@ -811,8 +1159,41 @@ class ServerProtocol:
             source.log.info(log_message, destination_id)
             await send_error_message()
         else:
-            source.log.debug('Sending relayed message to 0x{:02x} successful',
-                             destination.id)
+            if util.log_guard.debug:
+                source.log.debug('Sending relayed message to 0x{:02x} successful',
+                                 destination.id)
+            relayed_frames, relayed_bytes = self._relayed_frames, self._relayed_bytes
+            if relayed_frames is not None and relayed_bytes is not None:
+                relayed_frames.inc()
+                relayed_bytes.inc(len(data))
+            path = self.path
+            assert path is not None
+            path.relayed_frames += 1
+            path.relayed_bytes += len(data)
+
+    async def _send_relay_message(
+            self,
+            destination: PathClient,
+            message: RelayMessage,
+            size: int,
+            received_at: float,
+    ) -> None:
+        """
+        Send a relay message to the destination and record the queueing
+        delay and the write time.
+        """
+        started_at = self._loop.time()
+        await destination.send(message)
+        queue_delay, write_time = started_at - received_at, self._loop.time() - started_at
+        for relay_latency in self._relay_latencies:
+            relay_latency.record(queue_delay, write_time)
+        event_log = self._event_log
+        if event_log is not None:
+            path = self.path
+            assert path is not None
+            event_log.relay(
+                path.number, message.source, message.destination, size,
+                queue_delay, write_time)
 
     async def keep_alive_loop(self) -> None:
         """
@@ -827,17 +1208,23 @@ class ServerProtocol:
             await asyncio.sleep(client.keep_alive_interval, loop=self._loop)
 
             # Send ping and wait for pong
-            client.log.debug('Ping')
+            if util.log_guard.debug:
+                client.log.debug('Ping')
+            ping_start = self._loop.time()
             pong_future = await client.ping()
             try:
                 await asyncio.wait_for(
                     pong_future, client.keep_alive_timeout, loop=self._loop)
             except asyncio.TimeoutError:
-                client.log.debug('Ping timed out')
+                if util.log_guard.debug:
+                    client.log.debug('Ping timed out')
+                self._metrics.ping_timeouts.inc()
                 raise PingTimeoutError(str(client))
             else:
-                client.log.debug('Pong')
+                if util.log_guard.debug:
+                    client.log.debug('Pong')
                 client.keep_alive_pings += 1
+                self._metrics.ping_rtt.observe(self._loop.time() - ping_start)
 
     def _handle_client_auth(self, client_auth: ClientAuthMessage) -> None:
         """
@@ -909,18 +1296,26 @@ class ServerProtocol:
         if chosen != self.subprotocol.value:
             raise DowngradeError('Subprotocol downgrade detected')
 
-    def _drop_client(self, client: PathClient, code: CloseCode) -> 'asyncio.Task[None]':
+    def _drop_client(
+            self,
+            client: PathClient,
+            code: CloseCode,
+            by_admin: bool = False,
+    ) -> 'asyncio.Task[None]':
         """
         Mark the client as closed, schedule the closing procedure on
         the client's task queue, remove it from the path and return the
         drop operation in form of a :class:`asyncio.Task`.
 
         .. important:: This should only be called by clients dropping
-                       another client or when the server is closing.
+                       another client, by the admin API or when the
+                       server is closing.
 
         Arguments:
             - `client`: The client to be dropped.
             - `close`: The close code.
+            - `by_admin`: Whether the client is being dropped via the
+              admin API.
         """
         # Drop the client
         drop_task = client.drop(code)
@@ -930,6 +1325,20 @@ class ServerProtocol:
         assert path is not None
         path.remove_client(client)
 
+        # Raise and log the drop (the dropping party is unset if the server or the
+        # admin API drops the client)
+        dropping_client = self.client
+        assert dropping_client is not None
+        dropped_by = None if client is dropping_client else dropping_client.id
+        self._server.notify_client_dropped(
+            PathHex(binascii.hexlify(path.initiator_key).decode('ascii')),
+            ClientDroppedData(client.id, code.value, dropped_by, by_admin))
+        event_log = self._event_log
+        if event_log is not None:
+            event_log.emit(
+                'drop', path=path.number, client='{:x}'.format(id(client)), id=client.id,
+                code=code.value, by=dropped_by, admin=by_admin)
+
         return drop_task
 
 
@@ -942,13 +1351,30 @@ class Paths:
         self.paths = {}  # type: Dict[InitiatorPublicPermanentKey, Path]
 
     def get(self, initiator_key: InitiatorPublicPermanentKey) -> Path:
-        if self.paths.get(initiator_key) is None:
-            self.number += 1
-            self.paths[initiator_key] = Path(initiator_key, self.number, attached=True)
-            self._log.debug('Created new path: {}', self.number)
-        return self.paths[initiator_key]
+        return self.get_or_create(initiator_key)[0]
+
+    def get_or_create(
+            self,
+            initiator_key: InitiatorPublicPermanentKey,
+    ) -> Tuple[Path, bool]:
+        """
+        Return the path of an initiator's public permanent key and
+        whether it has been created.
+        """
+        path = self.paths.get(initiator_key)
+        if path is not None:
+            return path, False
+        self.number += 1
+        path = self.paths[initiator_key] = Path(initiator_key, self.number, attached=True)
+        self._log.debug('Created new path: {}', self.number)
+        return path, True
+
+    def clean(self, path: Path) -> bool:
+        """
+        Remove a path if it is empty.
 
-    def clean(self, path: Path) -> None:
+        Return whether the path has been removed.
+        """
         if path.attached and path.empty:
             path.attached = False
             try:
@@ -957,18 +1383,154 @@ class Paths:
                 self._log.error('Path {} has already been removed', path.number)
             else:
                 self._log.debug('Removed empty path: {}', path.number)
+                return True
+        return False
+
+
+class ShutdownScheduler:
+    """
+    Closes protocols in batches which are spread over a time window in
+    order to avoid load spikes on the server and a synchronised wave of
+    reconnects towards other servers.
+
+    Each batch will be closed at a random point in time within its
+    slot of the window.
+
+    Arguments:
+        - `window`: The time window in seconds over which the batches
+          will be spread. Defaults to `0` which closes all protocols
+          at once.
+        - `batch_size`: The maximum amount of protocols that will be
+          closed per batch. Defaults to `100`.
+        - `deadline`: The amount of seconds after which all remaining
+          protocols will be closed immediately. Closing does not wait
+          for protocols beyond the deadline, so the server's listeners
+          will close the remaining connections. Defaults to no
+          deadline.
+    """
+    __slots__ = ('_log', 'window', 'batch_size', 'deadline', 'total', 'closed')
+
+    def __init__(
+            self,
+            window: float = 0.0,
+            batch_size: int = 100,
+            deadline: Optional[float] = None,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError('Batch size must be positive')
+        self._log = util.get_logger('server.shutdown')
+        self.window = window
+        self.batch_size = batch_size
+        self.deadline = deadline
+        self.total = 0
+        self.closed = 0
+
+    async def close_protocols(
+            self,
+            protocols: Set['ServerProtocol'],
+            loop: asyncio.AbstractEventLoop,
+    ) -> None:
+        """
+        Close the protocols and wait until all of them have returned.
+
+        Arguments:
+            - `protocols`: The set of protocols of the server. Protocols
+              that have been removed from the set in the meantime will
+              not be closed.
+            - `loop`: The event loop.
+        """
+        pending = list(protocols)
+        self.total, self.closed = len(pending), 0
+        start = loop.time()
+        deadline = None if self.deadline is None else start + self.deadline
+
+        # Determine the interval between batches
+        batches = max(1, math.ceil(len(pending) / self.batch_size))
+        interval = self.window / batches if self.window > 0 else 0.0
+        if interval > 0:
+            self._log.info('Closing {} protocols in {} batches over {} seconds',
+                           len(pending), batches, self.window)
+
+        for index in range(batches):
+            # Wait until the batch is due (at a random point within its slot)
+            if interval > 0:
+                due = start + interval * (index + random.random())
+                if deadline is not None and due >= deadline:
+                    self._log.notice('Shutdown deadline reached')
+                    due = deadline
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay, loop=loop)
+
+            # Close the batch (or all remaining protocols once the deadline has passed)
+            if deadline is not None and loop.time() >= deadline:
+                batch, pending = pending, []
+            else:
+                batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+            await self._close_batch(
+                [protocol for protocol in batch if protocol in protocols], loop,
+                self._remaining(deadline, loop))
+            self._log.info('Closed {}/{} protocols', self.closed, self.total)
+            if len(pending) == 0:
+                break
+
+        # Wait until all protocols have returned (or the deadline has been reached)
+        handler_tasks = [protocol.handler_task for protocol in protocols]
+        if len(handler_tasks) > 0:
+            _, pending_tasks = await asyncio.wait(
+                handler_tasks, timeout=self._remaining(deadline, loop), loop=loop)
+            if len(pending_tasks) > 0:
+                self._log.notice(
+                    '{} protocols are still closing after the shutdown deadline',
+                    len(pending_tasks))
+
+    @staticmethod
+    def _remaining(
+            deadline: Optional[float],
+            loop: asyncio.AbstractEventLoop,
+    ) -> Optional[float]:
+        return None if deadline is None else max(deadline - loop.time(), 0.0)
+
+    async def _close_batch(
+            self,
+            batch: Sequence['ServerProtocol'],
+            loop: asyncio.AbstractEventLoop,
+            timeout: Optional[float],
+    ) -> None:
+        # Note: Closing continues in the background once the timeout has been reached.
+        close_tasks = []
+        for protocol in batch:
+            close_task = loop.create_task(protocol.close(CloseCode.going_away))
+            close_task.add_done_callback(functools.partial(self._closed, protocol))
+            close_tasks.append(close_task)
+        if len(close_tasks) > 0:
+            await asyncio.wait(close_tasks, timeout=timeout, loop=loop)
+
+    def _closed(
+            self,
+            protocol: 'ServerProtocol',
+            close_task: 'asyncio.Task[None]',
+    ) -> None:
+        if close_task.cancelled():
+            return
+        exc = close_task.exception()
+        if exc is not None:
+            self._log.error('Could not close protocol {}: {}', protocol, repr(exc))
+        else:
+            self.closed += 1
 
 
 class Server:
     subprotocols = [
         SubProtocol.saltyrtc_v1.value
-    ]  # type: ClassVar[Sequence[SubProtocol]]
+    ]  # type: ClassVar[Sequence[str]]
 
     def __init__(
             self,
             keys: Optional[Sequence[ServerSecretPermanentKey]],
             paths: Paths,
             loop: Optional[asyncio.AbstractEventLoop] = None,
+            event_dispatcher: Optional[EventDispatcher] = None,
     ) -> None:
         self._log = util.get_logger('server')
         self._loop = asyncio.get_event_loop() if loop is None else loop
@@ -976,8 +1538,14 @@ class Server:
         # Protocol class
         self._protocol_class = ServerProtocol
 
-        # WebSocket server instance
-        self._server = None
+        # WebSocket server instances (one per listener) and auxiliary servers
+        # (e.g. for metrics)
+        self._servers = []  # type: List[WSServer]
+        self._auxiliary_servers = []  # type: List[asyncio.AbstractServer]
+
+        # Metrics and event log
+        self.metrics = Metrics()
+        self.event_log = None  # type: Optional[EventLog]
 
         # Validate & store keys
         if keys is None:
@@ -994,21 +1562,102 @@ class Server:
         self.protocols = set()  # type: Set[ServerProtocol]
         self._close_task = None  # type: Optional[asyncio.Task[None]]
 
-        # Event Registry
-        self._events = EventRegistry()
+        # Shutdown scheduler used when closing
+        self.shutdown_scheduler = ShutdownScheduler()
+
+        # Drain state
+        self._drain_close_code = None  # type: Optional[CloseCode]
+        self._drain_reject_all = False
+        self._drained_future = None  # type: Optional[asyncio.Future[None]]
+
+        # Event dispatcher (and its registry)
+        if event_dispatcher is None:
+            event_dispatcher = EventDispatcher(loop=self._loop)
+        self.event_dispatcher = event_dispatcher
+        self._path_stats_task = None  # type: Optional[asyncio.Task[None]]
+
+        # Health check and event loop lag
+        self.health_check = None  # type: Optional[HealthCheck]
+        self.loop_lag = 0.0
+        self._loop_lag_task = None  # type: Optional[asyncio.Task[None]]
 
     @property
-    def server(self) -> websockets.server.WebSocketServer:
-        return self._server
+    def server(self) -> Optional[WSServer]:
+        """
+        Return the WebSocket server instance of the first listener.
+        """
+        return self._servers[0] if len(self._servers) > 0 else None
 
     @server.setter
-    def server(self, server: websockets.server.WebSocketServer) -> None:
-        self._server = server
+    def server(
+            self,
+            server: WSServer,
+    ) -> None:
+        self._servers = []
+        self.add_server(server)
+
+    @property
+    def servers(self) -> Sequence[WSServer]:
+        """
+        Return the WebSocket server instances of all listeners.
+        """
+        return tuple(self._servers)
+
+    def add_server(self, server: WSServer) -> None:
+        """
+        Add a WebSocket server instance (e.g. of an additional listener)
+        which will be closed along with this server.
+        """
+        self._servers.append(server)
         self._log.debug('Server instance: {}', server)
 
+    @property
+    def draining(self) -> bool:
+        """
+        Return whether the server is being drained.
+        """
+        return self._drain_close_code is not None
+
+    @property
+    def closing(self) -> bool:
+        """
+        Return whether the server is being closed.
+        """
+        return self._close_task is not None
+
+    @property
+    def healthy(self) -> bool:
+        """
+        Return whether the server is healthy, i.e. it is neither being
+        drained nor being closed.
+        """
+        return self._drain_close_code is None and self._close_task is None
+
+    def get_relay_latency(self, path: Optional[PathHex] = None) -> Optional[RelayLatency]:
+        """
+        Return the latency histograms of relayed messages.
+
+        Arguments:
+            - `path`: The hex-encoded path (i.e. the initiator's public
+              permanent key) to return the histograms of. Defaults to
+              the histograms of all paths.
+
+        Returns `None` in case the path does not exist or the latency
+        is not being recorded per path (see
+        :attr:`Metrics.relay_latency_per_path`).
+        """
+        if path is None:
+            return self.metrics.relay_latency
+        try:
+            initiator_key = InitiatorPublicPermanentKey(binascii.unhexlify(path))
+        except (binascii.Error, ValueError):
+            return None
+        path_ = self.paths.paths.get(initiator_key)
+        return None if path_ is None else path_.relay_latency
+
     async def handler(
             self,
-            connection: websockets.WebSocketServerProtocol,
+            connection: Connection,
             ws_path: str,
     ) -> None:
         # Closing? Drop immediately
@@ -1016,6 +1665,12 @@ class Server:
             await connection.close(CloseCode.going_away.value)
             return
 
+        # Draining? Drop unless the path already exists
+        if self._drain_close_code is not None and not self._accept_draining(ws_path):
+            self._log.debug('Draining, rejecting connection on WS path {}', ws_path)
+            await connection.close(self._drain_close_code.value)
+            return
+
         # Convert sub-protocol
         subprotocol = None  # type: Optional[SubProtocol]
         try:
@@ -1029,6 +1684,7 @@ class Server:
             # We need to close the connection manually as the client may choose
             # to ignore
             await connection.close(code=CloseCode.subprotocol_error.value)
+            self.metrics.closed(CloseCode.subprotocol_error.value)
             self.notify_disconnected(
                 None, DisconnectedData(CloseCode.subprotocol_error.value))
         else:
@@ -1037,6 +1693,13 @@ class Server:
                 self, subprotocol, connection, ws_path, loop=self._loop)
             await protocol.handler_task
 
+    def add_auxiliary_server(self, server: asyncio.AbstractServer) -> None:
+        """
+        Add an auxiliary server (e.g. for metrics) which will be
+        closed along with this server.
+        """
+        self._auxiliary_servers.append(server)
+
     def register(self, protocol: ServerProtocol) -> None:
         self.protocols.add(protocol)
         self._log.debug('Protocol registered: {}', protocol)
@@ -1045,11 +1708,17 @@ class Server:
         self.protocols.remove(protocol)
         self._log.debug('Protocol unregistered: {}', protocol)
 
+        # Resolve the drained future once the last protocol has been removed
+        drained_future = self._drained_future
+        if (drained_future is not None and not drained_future.done()
+                and len(self.protocols) == 0):
+            drained_future.set_result(None)
+
     def register_event_callback(self, event: Event, callback: EventCallback) -> None:
         """
         Register a new event callback.
         """
-        self._events.register(event, callback)
+        self.event_dispatcher.registry.register(event, callback)
 
     def notify_initiator_connected(self, path: PathHex) -> None:
         self._raise_event(Event.initiator_connected, path, None)
@@ -1064,6 +1733,77 @@ class Server:
     ) -> None:
         self._raise_event(Event.disconnected, path, data)
 
+    def notify_path_created(self, path: PathHex) -> None:
+        self._raise_event(Event.path_created, path, None)
+
+    def notify_path_removed(self, path: PathHex) -> None:
+        self._raise_event(Event.path_removed, path, None)
+
+    def notify_handshake_completed(
+            self,
+            path: PathHex,
+            data: HandshakeCompletedData,
+    ) -> None:
+        self._raise_event(Event.handshake_completed, path, data)
+
+    def notify_client_dropped(self, path: PathHex, data: ClientDroppedData) -> None:
+        self._raise_event(Event.client_dropped, path, data)
+
+    def start_path_stats(self, interval: float) -> None:
+        """
+        Start raising the `path-stats` event for each path periodically
+        (or restart with a different interval).
+
+        Arguments:
+            - `interval`: The interval in seconds. The event contains
+              the amount of frames and bytes that have been relayed on
+              the path since the previous event.
+        """
+        if interval <= 0:
+            raise ValueError('Invalid path statistics interval: {}'.format(interval))
+        if self._path_stats_task is not None:
+            self._path_stats_task.cancel()
+        self._path_stats_task = self._loop.create_task(self._path_stats_loop(interval))
+
+    async def _path_stats_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval, loop=self._loop)
+            self._raise_path_stats(interval)
+
+    def start_loop_lag_monitor(self, interval: float) -> None:
+        """
+        Start measuring the lag of the event loop periodically (or
+        restart with a different interval). The lag is the delay of a
+        timer beyond its scheduled time and will be stored in
+        :attr:`loop_lag`.
+
+        Arguments:
+            - `interval`: The interval in seconds.
+        """
+        if interval <= 0:
+            raise ValueError('Invalid loop lag interval: {}'.format(interval))
+        if self._loop_lag_task is not None:
+            self._loop_lag_task.cancel()
+        self._loop_lag_task = self._loop.create_task(self._loop_lag_loop(interval))
+
+    async def _loop_lag_loop(self, interval: float) -> None:
+        while True:
+            scheduled = self._loop.time() + interval
+            await asyncio.sleep(interval, loop=self._loop)
+            self.loop_lag = max(self._loop.time() - scheduled, 0.0)
+
+    def _raise_path_stats(self, interval: float) -> None:
+        # Note: Paths are shared with other servers, so the counters are only being
+        #       reset if someone is interested.
+        if not self.event_dispatcher.registry.has_callbacks(Event.path_stats):
+            return
+        for path in list(self.paths.paths.values()):
+            relayed_frames, relayed_bytes = path.relayed_frames, path.relayed_bytes
+            path.relayed_frames = path.relayed_bytes = 0
+            hex_path = PathHex(binascii.hexlify(path.initiator_key).decode('ascii'))
+            self._raise_event(Event.path_stats, hex_path, PathStatsData(
+                interval, relayed_frames, relayed_bytes))
+
     def _raise_event(
             self,
             event: Event,
@@ -1071,7 +1811,8 @@ class Server:
             data: EventData,
     ) -> None:
         """
-        Raise an event and invoke all registered event callbacks.
+        Raise an event and dispatch it to all registered event
+        callbacks.
 
         Arguments:
             - `event`: Event to be raised.
@@ -1080,44 +1821,119 @@ class Server:
             - `data`: Additional data for the event as explained for
               :class:`EventRegistry`.
         """
-        for callback in self._events.get_callbacks(event):
-            coroutine = callback(event, path, data)
-            asyncio.ensure_future(coroutine, loop=self._loop)
+        self.event_dispatcher.dispatch(event, path, data)
+
+    async def drain(
+            self,
+            timeout: Optional[float] = None,
+            close_code: CloseCode = CloseCode.going_away,
+            reject_all: bool = False,
+    ) -> None:
+        """
+        Drain the server: Connections for paths that already exist will
+        still be accepted and relayed but connections for new paths
+        will be rejected. The server will be closed once all
+        connections have been closed or the timeout has been reached.
+
+        Arguments:
+            - `timeout`: Amount of seconds to wait for all connections
+              to be closed. Remaining connections will be closed after
+              the timeout has been reached. Defaults to waiting
+              forever.
+            - `close_code`: The :class:`CloseCode` used to reject new
+              connections. Defaults to *going away*.
+            - `reject_all`: Whether to also reject new connections for
+              paths that already exist. Defaults to `False`.
+        """
+        if self._drain_close_code is None:
+            self._log.info('Draining, {} protocols remaining', len(self.protocols))
+        self._drain_close_code = close_code
+        self._drain_reject_all = reject_all
+
+        # Wait until all protocols have been closed (or the timeout has been reached)
+        if len(self.protocols) > 0:
+            if self._drained_future is None:
+                self._drained_future = asyncio.Future(loop=self._loop)
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(self._drained_future, loop=self._loop), timeout,
+                    loop=self._loop)
+            except asyncio.TimeoutError:
+                self._log.notice(
+                    'Draining timed out, closing {} remaining protocols',
+                    len(self.protocols))
+        self._log.info('Drained')
+
+        # Close the server
+        self.close()
+        await self.wait_closed()
 
-    def close(self) -> None:
+    def _accept_draining(self, ws_path: str) -> bool:
+        """
+        Return whether a connection on a specific WebSocket path should
+        be accepted while the server is being drained.
+
+        .. note:: Connections on invalid paths will be accepted in
+                  order to be handled by the protocol.
+        """
+        if self._drain_reject_all:
+            return False
+        try:
+            initiator_key = self._protocol_class.get_initiator_key(ws_path)
+        except PathError:
+            return True
+        return initiator_key in self.paths.paths
+
+    def close(self, scheduler: Optional[ShutdownScheduler] = None) -> None:
         """
         Close open connections and the server.
+
+        Arguments:
+            - `scheduler`: The :class:`ShutdownScheduler` that closes
+              the connections. Defaults to the server's
+              :attr:`shutdown_scheduler`.
         """
         if self._close_task is None:
+            if scheduler is None:
+                scheduler = self.shutdown_scheduler
             self._close_task = self._loop.create_task(
-                self._close_after_all_protocols_closed())
+                self._close_after_all_protocols_closed(scheduler=scheduler))
+            if self._path_stats_task is not None:
+                self._path_stats_task.cancel()
+            if self._loop_lag_task is not None:
+                self._loop_lag_task.cancel()
 
     async def wait_closed(self) -> None:
         """
         Wait until all connections and the server itself has been
         closed.
         """
-        await self.server.wait_closed()
+        if self._close_task is not None:
+            await asyncio.shield(self._close_task, loop=self._loop)
+        for server in self._servers:
+            await server.wait_closed()
+        for server in self._auxiliary_servers:
+            await server.wait_closed()
+        await self.event_dispatcher.close()
 
     async def _close_after_all_protocols_closed(
             self,
             timeout: Optional[float] = None,
+            scheduler: Optional[ShutdownScheduler] = None,
     ) -> None:
+        if scheduler is None:
+            scheduler = self.shutdown_scheduler
+
         # Schedule closing all protocols
         self._log.info('Closing protocols')
         if len(self.protocols) > 0:
-            async def _close_and_wait() -> None:
-                # Wait until all connections have been scheduled to be closed
-                close_tasks = [protocol.close(CloseCode.going_away)
-                               for protocol in self.protocols]
-                await asyncio.gather(*close_tasks, loop=self._loop)
-
-                # Wait until all protocols have returned
-                handler_tasks = [protocol.handler_task for protocol in self.protocols]
-                await asyncio.gather(*handler_tasks, loop=self._loop)
-
-            await asyncio.wait_for(_close_and_wait(), timeout, loop=self._loop)
+            await asyncio.wait_for(
+                scheduler.close_protocols(self.protocols, self._loop), timeout,
+                loop=self._loop)
 
         # Now we can close the server
         self._log.info('Closing server')
-        self.server.close()
+        for server in self._servers:
+            server.close()
+        for server in self._auxiliary_servers:
+            server.close()
@@ -0,0 +1,146 @@
+"""
+This module provides the integration of the SaltyRTC Signalling Server
+with systemd: Socket activation, readiness and state notifications and
+watchdog pings.
+
+The protocols are implemented directly (see `sd_listen_fds(3)` and
+`sd_notify(3)`), so no additional dependencies are required. All
+functions are no-ops in case the process has not been started by
+systemd.
+"""
+import asyncio
+import os
+import socket
+import sys
+from typing import List  # noqa
+from typing import Optional
+
+from . import util
+
+__all__ = (
+    'LISTEN_FDS_START',
+    'listen_sockets',
+    'notify',
+    'watchdog_timeout',
+    'watchdog',
+)
+
+# The first file descriptor passed by systemd
+LISTEN_FDS_START = 3
+
+
+def _socket_from_fd(fd: int) -> socket.socket:
+    # Note: Python >= 3.7 detects the family and type of a file descriptor
+    if sys.version_info >= (3, 7):
+        return socket.socket(fileno=fd)
+    probe = socket.fromfd(fd, socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        family = probe.getsockopt(socket.SOL_SOCKET, getattr(socket, 'SO_DOMAIN', 39))
+        type_ = probe.getsockopt(socket.SOL_SOCKET, socket.SO_TYPE)
+    finally:
+        probe.close()
+    return socket.socket(family, type_, fileno=fd)
+
+
+def listen_sockets(unset_environment: bool = True) -> List[socket.socket]:
+    """
+    Return the listening sockets passed by systemd (socket activation)
+    in the order of the `Listen*` directives of the socket unit.
+
+    Arguments:
+        - `unset_environment`: Whether to remove the `LISTEN_*`
+          environment variables, so they will not be inherited by
+          child processes.
+
+    Returns an empty list in case no sockets have been passed to this
+    process.
+    """
+    try:
+        pid = int(os.environ.get('LISTEN_PID', ''))
+        count = int(os.environ.get('LISTEN_FDS', ''))
+    except ValueError:
+        return []
+    finally:
+        if unset_environment:
+            for name in ('LISTEN_PID', 'LISTEN_FDS', 'LISTEN_FDNAMES'):
+                os.environ.pop(name, None)
+    if pid != os.getpid():
+        return []
+
+    # Wrap file descriptors (which should not be inherited)
+    sockets = []
+    for fd in range(LISTEN_FDS_START, LISTEN_FDS_START + count):
+        os.set_inheritable(fd, False)
+        sockets.append(_socket_from_fd(fd))
+    return sockets
+
+
+def notify(*states: str) -> bool:
+    """
+    Notify systemd about state changes of the service, e.g.
+    `READY=1`, `RELOADING=1`, `STOPPING=1`, `WATCHDOG=1` or
+    `STATUS=...`.
+
+    Arguments:
+        - `states`: The assignments to be sent.
+
+    Return whether the notification has been sent.
+    """
+    address = os.environ.get('NOTIFY_SOCKET')
+    if address is None or len(address) == 0:
+        return False
+
+    # Abstract namespace socket
+    if address[0] == '@':
+        address = '\0' + address[1:]
+
+    # Send notification
+    # Note: This must never block the event loop, even if the receiver does not
+    #       read notifications fast enough.
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto('\n'.join(states).encode('utf-8'), address)
+    except OSError as exc:
+        util.get_logger('systemd').warning('Could not notify systemd: {}', exc)
+        return False
+    return True
+
+
+def watchdog_timeout() -> Optional[float]:
+    """
+    Return the watchdog timeout in seconds or `None` in case the
+    watchdog is disabled for this process.
+    """
+    try:
+        usec = int(os.environ.get('WATCHDOG_USEC', ''))
+    except ValueError:
+        return None
+    pid = os.environ.get('WATCHDOG_PID')
+    if usec <= 0 or (pid is not None and pid != str(os.getpid())):
+        return None
+    return usec / 1000000
+
+
+async def watchdog(
+        timeout: float,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> None:
+    """
+    Send watchdog pings to systemd until cancelled.
+
+    The pings are being sent from the event loop in half the watchdog
+    timeout, so a stalled event loop will miss the timeout and the
+    service will be restarted.
+
+    Arguments:
+        - `timeout`: The watchdog timeout in seconds (see
+          :func:`watchdog_timeout`).
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    while True:
+        notify('WATCHDOG=1')
+        await asyncio.sleep(timeout / 2, loop=loop)
@@ -0,0 +1,1299 @@
+"""
+This module provides the connection interface the SaltyRTC Signalling
+Server uses to talk to clients and the transports implementing it.
+
+The WebSocket engine a server runs on can be selected (see
+:class:`Engine`): The default engine is :mod:`websockets`. The
+alternative engines implement WebSocket directly on top of an
+:class:`asyncio.Protocol` (see :class:`StreamConnection`) with fewer
+layers, buffers and futures per message.
+
+The in-memory transport runs the full protocol stack inside a single
+process without any sockets, TLS or WebSocket framing which allows
+for large-scale simulations and fast, deterministic tests and
+benchmarks (see :func:`serve_memory`).
+"""
+import abc
+import asyncio
+import codecs
+import collections
+import enum
+import http
+import random
+import socket
+import ssl
+import struct
+from typing import Dict  # noqa
+from typing import List  # noqa
+from typing import Set  # noqa
+from typing import Type  # noqa
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
+
+import websockets
+import websockets.framing
+import websockets.handshake
+import websockets.headers
+import websockets.http
+
+from . import util
+
+try:
+    from websockets.speedups import apply_mask as _speedups_apply_mask
+except ImportError:
+    _speedups_apply_mask = None
+
+try:
+    import wsproto
+    import wsproto.connection
+    import wsproto.events
+    import wsproto.utilities
+except ImportError:
+    wsproto = None
+
+if TYPE_CHECKING:
+    from collections import OrderedDict  # noqa
+
+    # Note: Requires Python >= 3.5.4
+    from typing import Deque  # noqa
+
+__all__ = (
+    'Engine',
+    'Connection',
+    'MemoryConnection',
+    'MemoryServer',
+    'StreamConnection',
+    'WsprotoConnection',
+    'NativeConnection',
+    'StreamServer',
+)
+
+# Do not export!
+Data = Union[bytes, str]
+ConnectionHandler = Callable[['Connection', str], Awaitable[None]]
+HTTPResponse = Tuple[http.HTTPStatus, Sequence[Tuple[str, str]], bytes]
+ProcessRequest = Callable[[str, websockets.http.Headers], Optional[HTTPResponse]]
+_PING = struct.Struct('!I')
+_HEADER = struct.Struct('!BB')
+_HEADER_16 = struct.Struct('!BBH')
+_HEADER_64 = struct.Struct('!BBQ')
+_LENGTH_16 = struct.Struct('!H')
+_LENGTH_64 = struct.Struct('!Q')
+_MAX_REQUEST_SIZE = 2 ** 14
+_MAX_HEADERS = 256
+# Payloads above this size are written separately from the frame header
+# instead of being copied into a single buffer
+_WRITE_COPY_THRESHOLD = 2 ** 12
+
+
+@enum.unique
+class Engine(enum.Enum):
+    """
+    The WebSocket implementation a server is running on.
+    """
+    websockets = 'websockets'
+    wsproto = 'wsproto'
+    native = 'native'
+
+
+class Connection(metaclass=abc.ABCMeta):
+    """
+    A message-oriented connection of a client.
+
+    Once the connection has been closed, all methods raise
+    :exc:`websockets.ConnectionClosed` containing the close code.
+
+    :class:`websockets.WebSocketServerProtocol` is a virtual subclass
+    of this class.
+
+    Attributes:
+        - `subprotocol`: The negotiated subprotocol (if any).
+        - `close_code`: The close code once the connection has been
+          closed, otherwise `None`.
+        - `connection_lost_waiter`: A future that resolves once the
+          connection has been closed.
+    """
+    subprotocol = None  # type: Optional[str]
+    close_code = None  # type: Optional[int]
+    connection_lost_waiter = None  # type: asyncio.Future[None]
+
+    @abc.abstractmethod
+    async def recv(self) -> Data:
+        """
+        Receive the next message.
+        """
+
+    @abc.abstractmethod
+    async def send(self, data: Data) -> None:
+        """
+        Send a message.
+        """
+
+    @abc.abstractmethod
+    async def ping(self) -> 'asyncio.Future[None]':
+        """
+        Send a ping and return a future that resolves once the
+        corresponding pong has been received.
+        """
+
+    @abc.abstractmethod
+    async def close(self, code: int = 1000, reason: str = '') -> None:
+        """
+        Close the connection with a close code.
+        """
+
+
+Connection.register(websockets.WebSocketServerProtocol)
+
+
+class MemoryConnection(Connection):
+    """
+    One end of an in-memory connection (see :meth:`pair`). Messages
+    sent on one end are delivered to the other end without being
+    copied.
+
+    Pings are answered by :meth:`pong` of the other end.
+
+    Arguments:
+        - `subprotocol`: The negotiated subprotocol (if any).
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+    """
+    def __init__(
+            self,
+            subprotocol: Optional[str] = None,
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        self._loop = asyncio.get_event_loop() if loop is None else loop
+        self._peer = self
+        self._messages = collections.deque()  # type: Deque[Data]
+        self._message_waiter = None  # type: Optional[asyncio.Future[None]]
+        self._pong_waiters = []  # type: List[asyncio.Future[None]]
+        self.subprotocol = subprotocol
+        self.close_code = None  # type: Optional[int]
+        self.close_reason = ''
+        self.connection_lost_waiter = \
+            asyncio.Future(loop=self._loop)  # type: asyncio.Future[None]
+
+    @classmethod
+    def pair(
+            cls,
+            subprotocol: Optional[str] = None,
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> Tuple['MemoryConnection', 'MemoryConnection']:
+        """
+        Return both ends of a new connection.
+        """
+        first, second = cls(subprotocol, loop=loop), cls(subprotocol, loop=loop)
+        first._peer, second._peer = second, first
+        return first, second
+
+    @property
+    def open(self) -> bool:
+        """
+        Return whether the connection is open.
+        """
+        return self.close_code is None
+
+    @property
+    def closed(self) -> bool:
+        """
+        Return whether the connection has been closed.
+        """
+        return self.close_code is not None
+
+    def _ensure_open(self) -> None:
+        if self.close_code is not None:
+            raise websockets.ConnectionClosed(self.close_code, self.close_reason)
+
+    async def recv(self) -> Data:
+        """
+        Receive the next message. Messages that have been delivered
+        before the connection has been closed can still be received.
+        """
+        while len(self._messages) == 0:
+            self._ensure_open()
+            waiter = asyncio.Future(loop=self._loop)  # type: asyncio.Future[None]
+            self._message_waiter = waiter
+            try:
+                await waiter
+            finally:
+                self._message_waiter = None
+        return self._messages.popleft()
+
+    async def send(self, data: Data) -> None:
+        self._ensure_open()
+        peer = self._peer
+        peer._messages.append(data)
+        peer._wake()
+
+    async def ping(self) -> 'asyncio.Future[None]':
+        self._ensure_open()
+        pong_waiter = asyncio.Future(loop=self._loop)  # type: asyncio.Future[None]
+        self._pong_waiters.append(pong_waiter)
+        asyncio.ensure_future(self._peer.pong(), loop=self._loop)
+        return pong_waiter
+
+    async def pong(self) -> None:
+        """
+        Answer all pending pings of the other end. This is being
+        called automatically when the other end sends a ping and has
+        no effect once the connection has been closed.
+        """
+        if self.close_code is not None:
+            return
+        pong_waiters, self._peer._pong_waiters = self._peer._pong_waiters, []
+        for pong_waiter in pong_waiters:
+            if not pong_waiter.done():
+                pong_waiter.set_result(None)
+
+    async def close(self, code: int = 1000, reason: str = '') -> None:
+        """
+        Close both ends of the connection with a close code. Closing
+        an already closed connection has no effect.
+        """
+        if self.close_code is None:
+            self._connection_lost(code, reason)
+            self._peer._connection_lost(code, reason)
+
+        # Let the callbacks of the connection lost waiter run before returning
+        # (like after a WebSocket closing handshake)
+        await asyncio.sleep(0, loop=self._loop)
+
+    async def wait_closed(self) -> None:
+        """
+        Wait until the connection has been closed.
+        """
+        await asyncio.shield(self.connection_lost_waiter, loop=self._loop)
+
+    def _wake(self) -> None:
+        waiter = self._message_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _connection_lost(self, code: int, reason: str) -> None:
+        self.close_code, self.close_reason = code, reason
+        self.connection_lost_waiter.set_result(None)
+        self._wake()
+
+        # Abort pending pings
+        # Note: Retrieving the exception prevents asyncio from logging it in
+        #       case nobody awaits the future.
+        pong_waiters, self._pong_waiters = self._pong_waiters, []
+        for pong_waiter in pong_waiters:
+            if not pong_waiter.done():
+                pong_waiter.set_exception(websockets.ConnectionClosed(code, reason))
+                pong_waiter.exception()
+
+
+class _ConnectionServer(metaclass=abc.ABCMeta):
+    """
+    Hands connections to a connection handler and closes them once the
+    handler returns (code `1000`) or raises (code `1011`).
+    """
+    def __init__(
+            self,
+            name: str,
+            handler: ConnectionHandler,
+            subprotocols: Sequence[str],
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        self._log = util.get_logger('server.{}'.format(name))
+        self._loop = asyncio.get_event_loop() if loop is None else loop
+        self._handler = handler
+        self._handler_tasks = {}  # type: Dict[Connection, asyncio.Task[None]]
+        self._close_task = None  # type: Optional[asyncio.Task[None]]
+        self._closed_future = \
+            asyncio.Future(loop=self._loop)  # type: asyncio.Future[None]
+        self.subprotocols = subprotocols
+
+    def _select_subprotocol(
+            self,
+            client_subprotocols: Optional[Sequence[str]],
+    ) -> Optional[str]:
+        subprotocol = websockets.WebSocketServerProtocol.select_subprotocol(
+            list(client_subprotocols or ()),
+            list(self.subprotocols))  # type: Optional[str]
+        return subprotocol
+
+    def _start_handler(self, connection: Connection, path: str) -> None:
+        self._handler_tasks[connection] = self._loop.create_task(
+            self._handle(connection, path))
+
+    async def _handle(self, connection: Connection, path: str) -> None:
+        try:
+            await self._handler(connection, path)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._log.exception('Error in connection handler')
+            await connection.close(code=1011)
+        else:
+            await connection.close()
+        finally:
+            del self._handler_tasks[connection]
+
+    def close(self) -> None:
+        """
+        Stop accepting connections and close all open connections.
+        """
+        if self._close_task is None:
+            self._close_task = self._loop.create_task(self._close())
+
+    @abc.abstractmethod
+    async def _close(self) -> None:
+        """
+        Close all connections, wait for the handlers and resolve
+        the closed future.
+        """
+
+    async def wait_closed(self) -> None:
+        """
+        Wait until the server has been closed and all connection
+        handlers have returned.
+        """
+        await asyncio.shield(self._closed_future, loop=self._loop)
+
+
+class MemoryServer(_ConnectionServer):
+    """
+    Accepts in-memory connections and hands them to a connection
+    handler in the same way :func:`websockets.serve` does for
+    WebSocket connections.
+
+    Arguments:
+        - `handler`: A coroutine function that will be called with the
+          server's end of each connection and its path.
+        - `subprotocols`: The subprotocols supported by the server in
+          order of preference.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+    """
+    def __init__(
+            self,
+            handler: ConnectionHandler,
+            subprotocols: Sequence[str],
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        super().__init__('memory', handler, subprotocols, loop=loop)
+
+    async def connect(
+            self,
+            path: str,
+            subprotocols: Optional[Sequence[str]] = None,
+    ) -> MemoryConnection:
+        """
+        Open a connection on a path (e.g. `/<initiator's public key>`)
+        and return the client's end of it.
+
+        Arguments:
+            - `path`: The path of the connection.
+            - `subprotocols`: The subprotocols supported by the client
+              in order of preference.
+
+        Raises :exc:`ConnectionRefusedError` in case the server has
+        been closed.
+        """
+        if self._close_task is not None:
+            raise ConnectionRefusedError('Server has been closed')
+
+        # Negotiate the subprotocol and start the handler
+        subprotocol = self._select_subprotocol(subprotocols)
+        client, connection = MemoryConnection.pair(subprotocol, loop=self._loop)
+        self._start_handler(connection, path)
+
+        # Let the handler start before returning (like after a WebSocket handshake)
+        await asyncio.sleep(0, loop=self._loop)
+        return client
+
+    async def _close(self) -> None:
+        # Close all connections (going away) and wait for the handlers
+        handler_tasks = list(self._handler_tasks.items())
+        for connection, _ in handler_tasks:
+            await connection.close(code=1001)
+        await asyncio.gather(
+            *[task for _, task in handler_tasks], loop=self._loop,
+            return_exceptions=True)
+        self._closed_future.set_result(None)
+
+
+class _StreamState(enum.IntEnum):
+    connecting = 1
+    open = 2
+    closing = 3
+    closed = 4
+
+
+class StreamConnection(Connection, asyncio.Protocol):
+    """
+    Base class of WebSocket connections implemented directly on top of
+    an :class:`asyncio.Protocol`.
+
+    Subclasses parse the received bytes and report the opening
+    handshake, messages, pings, pongs and close frames to this class
+    which takes care of queueing, flow control and the closing
+    handshake. Subclasses write frames by implementing the `_write_*`
+    methods.
+
+    Arguments:
+        - `server`: The :class:`StreamServer` accepting the connection.
+        - `max_size`: The maximum size of an incoming message in
+          bytes. Larger messages fail the connection with close code
+          `1009`.
+        - `max_queue`: The maximum amount of incoming messages to be
+          buffered before reading from the transport is paused.
+        - `close_timeout`: The amount of seconds to wait for the
+          closing handshake before the transport is aborted.
+        - `write_limit`: The high-water mark of the write buffer in
+          bytes. Sending a message waits while the buffer is above
+          the mark.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+    """
+    def __init__(
+            self,
+            server: 'StreamServer',
+            max_size: Optional[int] = 2 ** 20,
+            max_queue: int = 32,
+            close_timeout: float = 10.0,
+            write_limit: int = 2 ** 16,
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        self._loop = asyncio.get_event_loop() if loop is None else loop
+        self._server = server
+        self._max_size = max_size
+        self._max_queue = max_queue
+        self._close_timeout = close_timeout
+        self._write_limit = write_limit
+        self._state = _StreamState.connecting
+        self._transport = None  # type: Optional[asyncio.Transport]
+        self._abort_handle = None  # type: Optional[asyncio.Handle]
+        self._messages = collections.deque()  # type: Deque[Data]
+        self._message_waiter = None  # type: Optional[asyncio.Future[None]]
+        self._fragments = []  # type: List[Data]
+        self._fragments_size = 0
+        self._reading_paused = False
+        self._drain_waiter = None  # type: Optional[asyncio.Future[None]]
+        self._writing_paused = False
+        self._pong_waiters = \
+            collections.OrderedDict()  # type: OrderedDict[bytes, asyncio.Future[None]]
+        self.path = None  # type: Optional[str]
+        self.subprotocol = None  # type: Optional[str]
+        self.close_code = None  # type: Optional[int]
+        self.close_reason = ''
+        self.connection_lost_waiter = \
+            asyncio.Future(loop=self._loop)  # type: asyncio.Future[None]
+
+    @property
+    def open(self) -> bool:
+        """
+        Return whether the connection is open.
+        """
+        return self._state is _StreamState.open
+
+    @property
+    def closed(self) -> bool:
+        """
+        Return whether the connection has been closed.
+        """
+        return self._state is _StreamState.closed
+
+    @property
+    def transport(self) -> Optional[asyncio.Transport]:
+        """
+        Return the underlying transport.
+        """
+        return self._transport
+
+    # Protocol
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self._transport = transport
+        transport.set_write_buffer_limits(high=self._write_limit)
+        self._server.connection_made(self)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._state = _StreamState.closed
+        if self.close_code is None:
+            self.close_code = 1006
+        if self._abort_handle is not None:
+            self._abort_handle.cancel()
+        self.connection_lost_waiter.set_result(None)
+
+        # Wake up receivers and senders
+        waiter = self._message_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+        waiter = self._drain_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+        # Abort pending pings
+        # Note: Retrieving the exception prevents asyncio from logging it in
+        #       case nobody awaits the future.
+        pong_waiters, self._pong_waiters = self._pong_waiters, collections.OrderedDict()
+        for pong_waiter in pong_waiters.values():
+            if not pong_waiter.done():
+                pong_waiter.set_exception(websockets.ConnectionClosed(
+                    self.close_code, self.close_reason))
+                pong_waiter.exception()
+        self._server.connection_lost(self)
+
+    def pause_writing(self) -> None:
+        self._writing_paused = True
+
+    def resume_writing(self) -> None:
+        self._writing_paused = False
+        waiter = self._drain_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    # Connection
+
+    async def recv(self) -> Data:
+        """
+        Receive the next message. Messages that have been received
+        before the connection has been closed can still be received.
+        """
+        messages = self._messages
+        while len(messages) == 0:
+            if self._state is not _StreamState.open:
+                await self._raise_closed()
+            waiter = asyncio.Future(loop=self._loop)  # type: asyncio.Future[None]
+            self._message_waiter = waiter
+            try:
+                await waiter
+            finally:
+                self._message_waiter = None
+        data = messages.popleft()
+
+        # Resume reading once the queue has room again
+        if self._reading_paused and len(messages) < self._max_queue:
+            self._reading_paused = False
+            assert self._transport is not None
+            self._transport.resume_reading()
+        return data
+
+    async def send(self, data: Data) -> None:
+        if self._state is not _StreamState.open:
+            await self._raise_closed()
+        self._write_message(data)
+
+        # Wait for the write buffer to drain
+        if self._writing_paused:
+            waiter = self._drain_waiter
+            if waiter is None or waiter.done():
+                waiter = asyncio.Future(loop=self._loop)
+                self._drain_waiter = waiter
+            await waiter
+
+    async def ping(self) -> 'asyncio.Future[None]':
+        if self._state is not _StreamState.open:
+            await self._raise_closed()
+        payload = _PING.pack(random.getrandbits(32))
+        while payload in self._pong_waiters:
+            payload = _PING.pack(random.getrandbits(32))
+        pong_waiter = asyncio.Future(loop=self._loop)  # type: asyncio.Future[None]
+        self._pong_waiters[payload] = pong_waiter
+        self._write_ping(payload)
+        return pong_waiter
+
+    async def close(self, code: int = 1000, reason: str = '') -> None:
+        """
+        Start the closing handshake with a close code and wait until
+        the connection has been closed.
+        """
+        assert self._transport is not None
+        if self._state is _StreamState.connecting:
+            self._state = _StreamState.closing
+            self._close_transport()
+        elif self._state is _StreamState.open:
+            self._state = _StreamState.closing
+            self._write_close(code, reason)
+            self._close_transport(wait_for_peer=True)
+        await self.wait_closed()
+
+    async def wait_closed(self) -> None:
+        """
+        Wait until the connection has been closed.
+        """
+        await asyncio.shield(self.connection_lost_waiter, loop=self._loop)
+
+    async def _raise_closed(self) -> None:
+        # Wait for the closing handshake to complete (to report the close code)
+        if self._state is _StreamState.closing:
+            await self.wait_closed()
+        raise websockets.ConnectionClosed(self.close_code, self.close_reason)
+
+    def _close_transport(self, wait_for_peer: bool = False) -> None:
+        # Close the transport (or let the peer close it after the closing
+        # handshake) and abort it in case it does not close in time
+        assert self._transport is not None
+        if not wait_for_peer:
+            self._transport.close()
+        if self._abort_handle is None:
+            self._abort_handle = self._loop.call_later(
+                self._close_timeout, self._transport.abort)
+
+    # Events reported by subclasses
+
+    def _select_subprotocol(
+            self,
+            path: str,
+            client_subprotocols: Sequence[str],
+    ) -> Optional[str]:
+        """
+        Called once the opening handshake request has been received.
+        Return the negotiated subprotocol.
+        """
+        self.path = path
+        self.subprotocol = self._server.select_subprotocol(client_subprotocols)
+        return self.subprotocol
+
+    def _processed_request(self, path: str, headers: websockets.http.Headers) -> bool:
+        """
+        Called once the opening handshake request has been parsed.
+        Return whether the request has been answered with a plain HTTP
+        response (see `process_request` of :class:`StreamServer`) in
+        which case the connection is being closed.
+        """
+        response = self._server.process_request(path, headers)
+        if response is None:
+            return False
+        self._write_http_response(*response)
+        return True
+
+    def _write_http_response(
+            self,
+            status: http.HTTPStatus,
+            headers: Sequence[Tuple[str, str]],
+            body: bytes,
+    ) -> None:
+        """
+        Write a plain HTTP response instead of the opening handshake
+        response and close the connection.
+        """
+        response_headers = websockets.http.Headers(headers)
+        response_headers.setdefault('Content-Type', 'text/plain')
+        response_headers['Content-Length'] = str(len(body))
+        response_headers['Connection'] = 'close'
+        assert self._transport is not None
+        self._transport.write('HTTP/1.1 {} {}\r\n{}'.format(
+            status.value, status.phrase, response_headers).encode('ascii') + body)
+        self._state = _StreamState.closing
+        self._close_transport()
+
+    def _opened(self) -> None:
+        """
+        Called once the opening handshake response has been written.
+        """
+        assert self.path is not None
+        self._state = _StreamState.open
+        self._server.connection_opened(self, self.path)
+
+    def _received_data(self, data: Data, finished: bool = True) -> None:
+        """
+        Called for each data frame. `finished` indicates whether the
+        frame is the last frame of a message.
+        """
+        if self._state is not _StreamState.open:
+            return
+
+        # Reassemble fragmented messages
+        if not finished or len(self._fragments) > 0:
+            self._fragments.append(data)
+            self._fragments_size += len(data)
+            if self._max_size is not None and self._fragments_size > self._max_size:
+                self._fail(1009, 'Message too big')
+                return
+            if not finished:
+                return
+            if isinstance(data, str):
+                data = ''.join(cast(List[str], self._fragments))
+            else:
+                data = b''.join(cast(List[bytes], self._fragments))
+            self._fragments, self._fragments_size = [], 0
+        elif self._max_size is not None and len(data) > self._max_size:
+            self._fail(1009, 'Message too big')
+            return
+
+        # Enqueue message and pause reading when the queue is full
+        messages = self._messages
+        messages.append(data)
+        waiter = self._message_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+        if len(messages) >= self._max_queue and not self._reading_paused:
+            self._reading_paused = True
+            assert self._transport is not None
+            self._transport.pause_reading()
+
+    def _received_ping(self, payload: bytes) -> None:
+        if self._state is _StreamState.open:
+            self._write_pong(payload)
+
+    def _received_pong(self, payload: bytes) -> None:
+        if payload not in self._pong_waiters:
+            return
+
+        # Acknowledge the matching ping and all pings sent before
+        pong_waiters = self._pong_waiters
+        while len(pong_waiters) > 0:
+            ping_payload, pong_waiter = pong_waiters.popitem(last=False)
+            if not pong_waiter.done():
+                pong_waiter.set_result(None)
+            if ping_payload == payload:
+                break
+
+    def _received_close(self, code: int, reason: str) -> None:
+        if self.close_code is None:
+            self.close_code, self.close_reason = code, reason
+        if self._state is _StreamState.open:
+            # Answer the closing handshake
+            self._state = _StreamState.closing
+            self._write_close(code, reason)
+        self._close_transport()
+
+    def _fail(self, code: int, reason: str = '') -> None:
+        """
+        Fail the connection with a close code.
+        """
+        if self._state is _StreamState.open:
+            self._write_close(code, reason)
+        self._state = _StreamState.closing
+        self._close_transport()
+
+    # Frames written by subclasses
+
+    @abc.abstractmethod
+    def _write_message(self, data: Data) -> None:
+        """
+        Write a binary (`bytes`) or a text (`str`) message.
+        """
+
+    @abc.abstractmethod
+    def _write_ping(self, payload: bytes) -> None:
+        """
+        Write a ping frame.
+        """
+
+    @abc.abstractmethod
+    def _write_pong(self, payload: bytes) -> None:
+        """
+        Write a pong frame.
+        """
+
+    @abc.abstractmethod
+    def _write_close(self, code: int, reason: str) -> None:
+        """
+        Write a close frame.
+        """
+
+
+class WsprotoConnection(StreamConnection):
+    """
+    A WebSocket connection using the sans-I/O implementation
+    :mod:`wsproto`.
+
+    All arguments are the same as for :class:`StreamConnection`.
+    """
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._ws = wsproto.WSConnection(wsproto.ConnectionType.SERVER)
+        self._request_buffer = bytearray() \
+            if self._server.processes_requests else None  # type: Optional[bytearray]
+
+    def data_received(self, data: bytes) -> None:
+        # Answer plain HTTP requests before handing the request to wsproto
+        # Note: wsproto rejects requests that do not ask for an upgrade.
+        request_buffer = self._request_buffer
+        if request_buffer is not None:
+            request_buffer += data
+            end = request_buffer.find(b'\r\n\r\n')
+            if end == -1 and len(request_buffer) <= _MAX_REQUEST_SIZE:
+                return
+            if end != -1:
+                try:
+                    path, headers = _parse_request(bytes(request_buffer[:end]))
+                except (ValueError, UnicodeDecodeError):
+                    pass
+                else:
+                    if self._processed_request(path, headers):
+                        self._request_buffer = None
+                        return
+            data, self._request_buffer = bytes(request_buffer), None
+
+        ws = self._ws
+        if ws.state is wsproto.connection.ConnectionState.CLOSED:
+            return
+        try:
+            ws.receive_data(data)
+        except wsproto.utilities.RemoteProtocolError as exc:
+            # Reject the opening handshake
+            assert self._transport is not None
+            self._transport.write(ws.send(exc.event_hint))
+            self._fail(1002)
+            return
+
+        for event in ws.events():
+            if isinstance(event, wsproto.events.BytesMessage):
+                # Note: wsproto unmasks binary data into a bytearray
+                self._received_data(bytes(event.data), finished=event.message_finished)
+            elif isinstance(event, wsproto.events.TextMessage):
+                self._received_data(event.data, finished=event.message_finished)
+            elif isinstance(event, wsproto.events.Request):
+                subprotocol = self._select_subprotocol(event.target, event.subprotocols)
+                self._write(wsproto.events.AcceptConnection(subprotocol=subprotocol))
+                self._opened()
+            elif isinstance(event, wsproto.events.Ping):
+                self._received_ping(event.payload)
+            elif isinstance(event, wsproto.events.Pong):
+                self._received_pong(bytes(event.payload))
+            elif isinstance(event, wsproto.events.CloseConnection):
+                self._received_close(event.code, event.reason or '')
+
+    def _write(self, event: 'wsproto.events.Event') -> None:
+        assert self._transport is not None
+        self._transport.write(self._ws.send(event))
+
+    def _write_message(self, data: Data) -> None:
+        self._write(wsproto.events.Message(data=data))
+
+    def _write_ping(self, payload: bytes) -> None:
+        self._write(wsproto.events.Ping(payload=payload))
+
+    def _write_pong(self, payload: bytes) -> None:
+        self._write(wsproto.events.Pong(payload=payload))
+
+    def _write_close(self, code: int, reason: str) -> None:
+        self._write(wsproto.events.CloseConnection(code=code, reason=reason or None))
+
+
+def _apply_mask(view: memoryview, mask: bytes) -> bytes:
+    """
+    Unmask a payload as a whole by XOR-ing it with the repeated mask
+    as a single integer. The payload is read from the view directly,
+    so the unmasked payload is its only copy.
+    """
+    length = len(view)
+    mask = (mask * ((length >> 2) + 1))[:length]
+    value = int.from_bytes(view, 'little')  # type: ignore
+    value ^= int.from_bytes(mask, 'little')
+    return value.to_bytes(length, 'little')
+
+
+def _apply_mask_speedups(view: memoryview, mask: bytes) -> bytes:
+    """
+    Unmask a payload with the C implementation shipped with websockets.
+
+    .. note:: The C implementation only accepts immutable buffers, so
+              the payload is copied once before being unmasked.
+    """
+    payload = _speedups_apply_mask(bytes(view), mask)  # type: bytes
+    return payload
+
+
+# Prefer the C implementation shipped with websockets
+_unmask = _apply_mask if _speedups_apply_mask is None \
+    else _apply_mask_speedups  # type: Callable[[memoryview, bytes], bytes]
+
+
+def _parse_request(request: bytes) -> Tuple[str, websockets.http.Headers]:
+    """
+    Parse the request line and headers of an opening handshake
+    request. Return the path and the headers.
+
+    Raises :exc:`ValueError` in case the request is malformed.
+    """
+    request_line, *header_lines = request.split(b'\r\n')
+    method, path, version = request_line.split(b' ', 2)
+    if method != b'GET':
+        raise ValueError('Unsupported HTTP method: {!r}'.format(method))
+    if version != b'HTTP/1.1':
+        raise ValueError('Unsupported HTTP version: {!r}'.format(version))
+    if len(header_lines) > _MAX_HEADERS:
+        raise ValueError('Too many HTTP headers')
+    headers = websockets.http.Headers()
+    for header_line in header_lines:
+        name, value = header_line.split(b':', 1)
+        headers[name.decode('ascii')] = value.strip(b' \t').decode(
+            'ascii', 'surrogateescape')
+    return path.decode('ascii', 'surrogateescape'), headers
+
+
+class NativeConnection(StreamConnection):
+    """
+    A WebSocket connection parsing frames directly from the buffers
+    handed to :meth:`data_received`.
+
+    The implementation is tailored to SaltyRTC: No extensions are being
+    negotiated and binary messages are being handed over without any
+    further copies once they have been unmasked. Payloads are being
+    unmasked as a whole rather than byte by byte. Text messages are
+    supported but have to be decoded.
+
+    All arguments are the same as for :class:`StreamConnection`.
+    """
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._buffer = bytearray()
+        self._message_opcode = None  # type: Optional[int]
+        self._text_decoder = None  # type: Optional[codecs.IncrementalDecoder]
+
+    def data_received(self, data: bytes) -> None:
+        buffer = self._buffer
+        buffer += data
+        if self._state is _StreamState.connecting and not self._received_request():
+            return
+        if len(buffer) > 0:
+            self._received_frames()
+
+    def _received_request(self) -> bool:
+        """
+        Handle the opening handshake request. Return whether the
+        connection has been opened.
+        """
+        buffer = self._buffer
+        end = buffer.find(b'\r\n\r\n')
+        if end == -1:
+            if len(buffer) > _MAX_REQUEST_SIZE:
+                self._reject(http.HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            return False
+        request = bytes(buffer[:end])
+        del buffer[:end + 4]
+
+        # Parse the request (and answer plain HTTP requests)
+        try:
+            path, headers = _parse_request(request)
+        except (ValueError, UnicodeDecodeError):
+            self._reject(http.HTTPStatus.BAD_REQUEST)
+            return False
+        if self._processed_request(path, headers):
+            return False
+
+        # Validate the request
+        try:
+            key = websockets.handshake.check_request(headers)
+            client_subprotocols = sum([
+                websockets.headers.parse_subprotocol_list(value)
+                for value in headers.get_all('Sec-WebSocket-Protocol')
+            ], [])  # type: List[str]
+        except (ValueError, UnicodeDecodeError, websockets.InvalidHandshake):
+            self._reject(http.HTTPStatus.BAD_REQUEST)
+            return False
+
+        # Accept the connection
+        subprotocol = self._select_subprotocol(path, client_subprotocols)
+        response_headers = websockets.http.Headers()
+        websockets.handshake.build_response(response_headers, key)
+        if subprotocol is not None:
+            response_headers['Sec-WebSocket-Protocol'] = subprotocol
+        assert self._transport is not None
+        self._transport.write('HTTP/1.1 101 Switching Protocols\r\n{}'.format(
+            response_headers).encode('ascii'))
+        self._opened()
+        return True
+
+    def _reject(self, status: http.HTTPStatus) -> None:
+        body = '{} {}\n'.format(status.value, status.phrase).encode('ascii')
+        self._write_http_response(status, [], body)
+
+    def _received_frames(self) -> None:
+        buffer, transport, max_size = self._buffer, self._transport, self._max_size
+        assert transport is not None
+        size, offset = len(buffer), 0
+        while not transport.is_closing():
+            # Parse header
+            # Note: Frames of clients are always masked
+            if size - offset < 2:
+                break
+            first, second = buffer[offset], buffer[offset + 1]
+            start, length = offset + 2, second & 0x7f
+            if length == 126:
+                if size - start < 2:
+                    break
+                length, = _LENGTH_16.unpack_from(buffer, start)
+                start += 2
+            elif length == 127:
+                if size - start < 8:
+                    break
+                length, = _LENGTH_64.unpack_from(buffer, start)
+                start += 8
+            finished, opcode = first & 0x80 != 0, first & 0x0f
+            if first & 0x70 != 0 or second & 0x80 == 0:
+                self._fail(1002, 'Reserved bits set or frame unmasked')
+                break
+            if opcode >= 0x8 and (not finished or length > 125):
+                self._fail(1002, 'Fragmented or oversized control frame')
+                break
+            if max_size is not None and length > max_size:
+                # Fail early rather than buffering the payload
+                self._fail(1009, 'Message too big')
+                break
+
+            # Wait for the remaining payload
+            end = start + 4 + length
+            if size < end:
+                break
+            mask = bytes(buffer[start:start + 4])
+            with memoryview(buffer)[start + 4:end] as view:
+                payload = _unmask(view, mask)
+            offset = end
+            self._received_frame(opcode, finished, payload)
+        del buffer[:offset]
+
+    def _received_frame(self, opcode: int, finished: bool, payload: bytes) -> None:
+        # Data frames
+        if opcode <= 0x2:
+            if opcode == 0x0:
+                message_opcode = self._message_opcode
+                if message_opcode is None:
+                    self._fail(1002, 'Unexpected continuation frame')
+                    return
+                opcode = message_opcode
+            elif self._message_opcode is not None:
+                self._fail(1002, 'Expected continuation frame')
+                return
+            self._message_opcode = None if finished else opcode
+            if opcode == 0x2:
+                self._received_data(payload, finished=finished)
+            else:
+                self._received_text(payload, finished)
+
+        # Control frames
+        elif opcode == 0x8:
+            try:
+                code, reason = websockets.framing.parse_close(payload)
+            except (websockets.exceptions.ProtocolError, UnicodeDecodeError):
+                self._fail(1002, 'Invalid close frame')
+                return
+            self._received_close(code, reason)
+        elif opcode == 0x9:
+            self._received_ping(payload)
+        elif opcode == 0xa:
+            self._received_pong(payload)
+        else:
+            self._fail(1002, 'Invalid opcode')
+
+    def _received_text(self, payload: bytes, finished: bool) -> None:
+        # Decode text incrementally in case the message has been fragmented
+        try:
+            if finished and self._text_decoder is None:
+                data = payload.decode('utf-8')
+            else:
+                if self._text_decoder is None:
+                    self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+                data = self._text_decoder.decode(payload, final=finished)
+                if finished:
+                    self._text_decoder = None
+        except UnicodeDecodeError:
+            self._fail(1007, 'Invalid UTF-8')
+            return
+        self._received_data(data, finished=finished)
+
+    def _write_frame(self, opcode: int, payload: bytes) -> None:
+        # Note: Frames of the server are never masked
+        transport = self._transport
+        assert transport is not None
+        length = len(payload)
+        if length < 126:
+            header = _HEADER.pack(0x80 | opcode, length)
+        elif length < 65536:
+            header = _HEADER_16.pack(0x80 | opcode, 126, length)
+        else:
+            header = _HEADER_64.pack(0x80 | opcode, 127, length)
+        if length > _WRITE_COPY_THRESHOLD:
+            transport.write(header)
+            transport.write(payload)
+        else:
+            transport.write(header + payload)
+
+    def _write_message(self, data: Data) -> None:
+        if isinstance(data, str):
+            self._write_frame(0x1, data.encode('utf-8'))
+        else:
+            self._write_frame(0x2, data)
+
+    def _write_ping(self, payload: bytes) -> None:
+        self._write_frame(0x9, payload)
+
+    def _write_pong(self, payload: bytes) -> None:
+        self._write_frame(0xa, payload)
+
+    def _write_close(self, code: int, reason: str) -> None:
+        # Note: 1005 (no status code) must not be sent on the wire
+        if code == 1005:
+            self._write_frame(0x8, b'')
+        else:
+            self._write_frame(0x8, websockets.framing.serialize_close(code, reason))
+
+
+class StreamServer(_ConnectionServer):
+    """
+    Accepts WebSocket connections of a :class:`StreamConnection`
+    implementation and hands them to a connection handler in the same
+    way :func:`websockets.serve` does.
+
+    Arguments:
+        - `engine`: The :class:`Engine` implementing the connections.
+          Must not be :attr:`Engine.websockets`.
+        - `handler`: A coroutine function that will be called with each
+          connection and its path.
+        - `subprotocols`: The subprotocols supported by the server in
+          order of preference.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`
+          if the default event loop should be used.
+        - `process_request`: An optional function that will be called
+          with the path and the headers of each opening handshake
+          request in the same way as the hook of
+          :func:`websockets.serve`. If it returns a HTTP status, a
+          sequence of headers and a body, the request will be answered
+          with a plain HTTP response instead of being upgraded to
+          WebSocket.
+        - `kwargs`: Additional keyword arguments passed to the
+          connection class (see :class:`StreamConnection`).
+
+    Raises :exc:`ImportError` in case the engine's dependencies are
+    not installed.
+    """
+    def __init__(
+            self,
+            engine: Engine,
+            handler: ConnectionHandler,
+            subprotocols: Sequence[str],
+            loop: Optional[asyncio.AbstractEventLoop] = None,
+            process_request: Optional[ProcessRequest] = None,
+            **kwargs: Any
+    ) -> None:
+        super().__init__(engine.value, handler, subprotocols, loop=loop)
+        if engine is Engine.wsproto and wsproto is None:
+            raise ImportError(
+                'Please install saltyrtc.server[wsproto] for the wsproto engine')
+        self._connection_class = _connection_classes[engine]
+        self._connection_kwargs = kwargs
+        self._process_request = process_request
+        self._servers = []  # type: List[asyncio.AbstractServer]
+        self._connections = set()  # type: Set[StreamConnection]
+
+    @property
+    def sockets(self) -> List[Any]:
+        """
+        Return the sockets the server is listening on.
+        """
+        return [socket for server in self._servers for socket in server.sockets or ()]
+
+    async def listen(
+            self,
+            host: Optional[str] = None,
+            port: Optional[int] = None,
+            ssl_context: Optional[ssl.SSLContext] = None,
+            sock: Optional[socket.socket] = None,
+    ) -> None:
+        """
+        Start listening on a host and port.
+
+        Arguments:
+            - `host`: The hostname or IP address to listen on. Defaults
+              to all interfaces.
+            - `port`: The port to listen on.
+            - `ssl_context`: An `ssl.SSLContext` instance for WSS.
+            - `sock`: A listening socket to accept connections from
+              instead of `host` and `port`.
+        """
+        if sock is not None:
+            server = await self._loop.create_server(
+                self._create_connection, ssl=ssl_context, sock=sock)
+        else:
+            # Note: An empty host binds to all interfaces and port `0` to an
+            #       ephemeral port, just like `None`.
+            server = await self._loop.create_server(
+                self._create_connection, host='' if host is None else host,
+                port=0 if port is None else port, ssl=ssl_context)
+        self._servers.append(server)
+
+    async def listen_unix(
+            self,
+            path: str,
+            ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        """
+        Start listening on a Unix domain socket.
+
+        Arguments:
+            - `path`: The path of the Unix domain socket.
+            - `ssl_context`: An `ssl.SSLContext` instance for WSS.
+        """
+        server = await self._loop.create_unix_server(
+            self._create_connection, path=path, ssl=ssl_context)
+        self._servers.append(server)
+
+    def _create_connection(self) -> StreamConnection:
+        return self._connection_class(self, loop=self._loop, **self._connection_kwargs)
+
+    def select_subprotocol(self, client_subprotocols: Sequence[str]) -> Optional[str]:
+        """
+        Return the subprotocol to be used with a client.
+        """
+        return self._select_subprotocol(client_subprotocols)
+
+    @property
+    def processes_requests(self) -> bool:
+        """
+        Return whether opening handshake requests may be answered with
+        plain HTTP responses.
+        """
+        return self._process_request is not None
+
+    def process_request(
+            self,
+            path: str,
+            headers: websockets.http.Headers,
+    ) -> Optional[HTTPResponse]:
+        """
+        Return the plain HTTP response to an opening handshake request
+        or `None` in case the connection should be upgraded to
+        WebSocket.
+        """
+        if self._process_request is None:
+            return None
+        return self._process_request(path, headers)
+
+    def connection_made(self, connection: StreamConnection) -> None:
+        self._connections.add(connection)
+
+    def connection_opened(self, connection: StreamConnection, path: str) -> None:
+        self._start_handler(connection, path)
+
+    def connection_lost(self, connection: StreamConnection) -> None:
+        self._connections.discard(connection)
+
+    async def _close(self) -> None:
+        # Stop listening
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            await server.wait_closed()
+
+        # Close all connections (going away) and wait for the handlers
+        handler_tasks = list(self._handler_tasks.values())
+        await asyncio.gather(*[
+            connection.close(code=1001) for connection in list(self._connections)
+        ], loop=self._loop, return_exceptions=True)
+        await asyncio.gather(*handler_tasks, loop=self._loop, return_exceptions=True)
+        self._closed_future.set_result(None)
+
+
+_connection_classes = {
+    Engine.wsproto: WsprotoConnection,
+    Engine.native: NativeConnection,
+}  # type: Dict[Engine, Type[StreamConnection]]
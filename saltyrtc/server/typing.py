@@ -5,6 +5,7 @@ from typing import (
     Callable,
     List,
     MutableMapping,
+    NamedTuple,
     NewType,
     Optional,
     Tuple,
@@ -40,8 +41,14 @@ __all__ = (
     'SignedKeys',
     'MessageId',
     'DisconnectedData',
+    'HandshakeCompletedData',
+    'ClientDroppedData',
+    'PathStatsData',
     'EventData',
     'EventCallback',
+    'SyncEventCallback',
+    'EventItem',
+    'BatchEventCallback',
     'Nonce',
     'Packet',
     'EncryptedPayload',
@@ -118,12 +125,36 @@ MessageId = NewType('MessageId', bytes)
 
 # Data provided to the registered callbacks
 DisconnectedData = NewType('DisconnectedData', int)
+HandshakeCompletedData = NamedTuple('HandshakeCompletedData', [
+    ('role', str),  # 'initiator' or 'responder'
+    ('duration', float),  # in seconds
+])
+ClientDroppedData = NamedTuple('ClientDroppedData', [
+    ('id', int),  # slot id of the dropped client
+    ('code', int),  # close code
+    ('dropped_by', Optional[int]),  # slot id of the dropping client or `None` (server)
+    ('by_admin', bool),  # whether the client has been dropped via the admin API
+])
+PathStatsData = NamedTuple('PathStatsData', [
+    ('interval', float),  # in seconds
+    ('relayed_frames', int),  # during the interval
+    ('relayed_bytes', int),  # during the interval
+])
 EventData = Union[
-    None,  # `initiator-connected` / `responder-connected`
+    None,  # `initiator-connected` / `responder-connected` / `path-*`
     DisconnectedData,
+    HandshakeCompletedData,
+    ClientDroppedData,
+    PathStatsData,
 ]
 # The event callback as provided by the user
 EventCallback = Callable[['Event', Optional[PathHex], EventData], Awaitable[None]]
+# A synchronous event callback for cheap handlers
+SyncEventCallback = Callable[['Event', Optional[PathHex], EventData], None]
+# A raised event
+EventItem = Tuple['Event', Optional[PathHex], EventData]
+# An event callback receiving a batch of raised events
+BatchEventCallback = Callable[[List[EventItem]], Awaitable[None]]
 
 
 # Message
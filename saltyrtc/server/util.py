@@ -7,6 +7,7 @@ import logging
 import ssl
 from typing import (
     Any,
+    Dict,
     List,
     Mapping,
     Optional,
@@ -24,9 +25,11 @@ from .typing import (
 
 __all__ = (
     'logger_group',
+    'log_guard',
     'enable_logging',
     'disable_logging',
     'get_logger',
+    'get_context_logger',
     'consteq',
     'create_ssl_context',
     'load_permanent_key',
@@ -55,6 +58,15 @@ except ImportError:
         debug = info = warn = warning = notice = error = exception = \
             critical = log = lambda *a, **kw: None
 
+    class _ContextLogger(_Logger):
+        """
+        Dummy context logger in case :mod:`logbook` is not present.
+        """
+        def __init__(self, logger: Any, name: str, context: Dict[str, Any]) -> None:
+            super().__init__(name)
+            self.logger = logger
+            self.context = context
+
     # noinspection PyPropertyDefinition
     class _LoggerGroup:
         """
@@ -66,7 +78,7 @@ except ImportError:
                 level: Optional[int] = 0,
                 processor: Optional[Any] = None,
         ) -> None:
-            self.loggers = loggers
+            self.loggers = [] if loggers is None else loggers  # type: List[Any]
             self.level = level
             self.processor = processor
 
@@ -83,6 +95,75 @@ else:
     logger_group = logbook.LoggerGroup()
     logger_group.disabled = True
 
+    class _ContextLogger(logbook.Logger):  # type: ignore
+        """
+        A lightweight logger that is not registered in the logger group.
+        Level, disabled flag, handlers and group are reflected from a
+        shared group-registered logger, so the instance can be garbage
+        collected along with its owner. The context is being added to
+        the `extra` dict of each record.
+        """
+        def __init__(
+                self,
+                logger: 'logbook.Logger',
+                name: str,
+                context: Dict[str, Any],
+        ) -> None:
+            # Note: Intentionally not calling the super constructor as it
+            #       would shadow the reflected properties below.
+            self.logger = logger
+            self.name = name
+            self.context = context
+
+        handlers = property(lambda self: self.logger.handlers)
+        group = property(lambda self: self.logger.group)
+        level = property(lambda self: self.logger.level)
+        disabled = property(lambda self: self.logger.disabled)
+
+        def process_record(self, record: 'logbook.LogRecord') -> None:
+            super().process_record(record)
+            record.extra.update(self.context)
+
+
+# Group-registered loggers by name
+_loggers = {}  # type: Dict[str, logbook.Logger]
+
+
+class _LogGuard:
+    """
+    Caches whether debug and trace logging is enabled for any logger
+    of the *saltyrtc* logger group, taking the level and disabled flag
+    of each logger into account (which reflect those of the group
+    unless they have been overridden).
+
+    Hot paths (such as relaying messages) check these flags before
+    calling a logger, so neither the call nor the evaluation of its
+    arguments happens while debug logging is off. The flags are
+    updated by :func:`enable_logging`, :func:`disable_logging` and
+    :func:`get_logger`. Call :meth:`update` after changing the level
+    of a logger directly.
+    """
+    __slots__ = ('debug', 'trace')
+
+    def __init__(self) -> None:
+        self.debug = False
+        self.trace = False
+
+    def update(self) -> None:
+        """
+        Update the flags from the state of the logger group and its
+        loggers.
+        """
+        levels = [logger.level for logger in logger_group.loggers if not logger.disabled]
+        if not logger_group.disabled:
+            # Note: Applies to loggers that are yet to be created
+            levels.append(logger_group.level)
+        self.debug = any(level <= logbook.DEBUG for level in levels)
+        self.trace = any(level <= logbook.TRACE for level in levels)
+
+
+log_guard = _LogGuard()
+
 
 def _convert_level(logbook_level: LogbookLevel) -> LoggingLevel:
     """
@@ -159,6 +240,7 @@ def enable_logging(
         level = logbook.WARNING
     logger_group.disabled = False
     logger_group.level = level
+    log_guard.update()
     if redirect_loggers is not None:
         _redirect_logging_loggers(redirect_loggers, remove=False)
 
@@ -180,6 +262,7 @@ def disable_logging(
     installed.
     """
     logger_group.disabled = True
+    log_guard.update()
     if redirect_loggers is not None:
         _redirect_logging_loggers(redirect_loggers, remove=True)
 
@@ -189,13 +272,16 @@ def get_logger(
         level: Optional[LogbookLevel] = None,
 ) -> 'logbook.Logger':
     """
-    Return a :class:`logbook.Logger`.
+    Return a :class:`logbook.Logger`. Loggers are registered in the
+    logger group once and reused for the same `name`.
 
     Arguments:
         - `name`: The name of a specific sub-logger. Defaults to
           `saltyrtc`. If supplied, will be prefixed with `saltyrtc.`.
         - `level`: A :mod:`logbook` logging level. Defaults to
-          :attr:`logbook.NOTSET`.
+          :attr:`logbook.NOTSET`. Only applies when the logger is
+          being created, so the level of an existing logger will not
+          be reset.
     """
     if _logger_convert_level_handler is None:
         _logging_error()
@@ -206,12 +292,36 @@ def get_logger(
     base_name = 'saltyrtc'
     name = base_name if name is None else '.'.join((base_name, name))
 
-    # Create new logger and add to group
-    logger = logbook.Logger(name=name, level=level)
-    logger_group.add_logger(logger)
+    # Create new logger and add to group (or return the existing one)
+    try:
+        logger = _loggers[name]
+    except KeyError:
+        logger = logbook.Logger(name=name, level=level)
+        logger_group.add_logger(logger)
+        _loggers[name] = logger
+        log_guard.update()
     return logger
 
 
+def get_context_logger(name: str, channel: str, **context: Any) -> '_ContextLogger':
+    """
+    Return a lightweight logger for short-lived objects (such as
+    clients and paths). It shares the state of the group-registered
+    logger returned by :func:`get_logger` for `name` but is not
+    registered itself and will therefore be released along with the
+    object holding it.
+
+    Arguments:
+        - `name`: The name of the shared sub-logger.
+        - `channel`: The name displayed in log records. Will be
+          prefixed with `saltyrtc.`.
+        - `context`: Additional fields that are being added to the
+          `extra` dict of each log record.
+    """
+    logger = get_logger(name)
+    return _ContextLogger(logger, '.'.join(('saltyrtc', channel)), context)
+
+
 def consteq(left: bytes, right: bytes) -> bool:
     """
     Compares two byte instances with one another. If `a` and `b` have
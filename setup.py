@@ -37,6 +37,11 @@ logging_require = [
     'logbook>=1.0.0,<2',
 ]
 
+# wsproto engine requirements
+wsproto_require = [
+    'wsproto>=0.14.0,<0.15',
+]
+
 # mypy currently does not run on pypy (tested with pypy3 6.0.0)
 if platform.python_implementation() == 'PyPy':
     mypy_require = []
@@ -58,7 +63,7 @@ tests_require = [
     'collective.checkdocs>=0.2',
     'Pygments>=2.2.0',  # required by checkdocs
     'ordered-set>=3.0.1',  # required by TestServer class
-] + logging_require + mypy_require
+] + logging_require + wsproto_require + mypy_require
 
 setup(
     name='saltyrtc.server',
@@ -76,6 +81,7 @@ setup(
         'dev': tests_require,
         'logging': logging_require,
         'uvloop': ['uvloop>=0.8.0,<2'],
+        'wsproto': wsproto_require,
     },
     include_package_data=True,
     entry_points={
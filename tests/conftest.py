@@ -6,6 +6,7 @@ import ssl
 import struct
 import subprocess
 import sys
+import urllib.parse
 from contextlib import closing
 
 import libnacl.public
@@ -18,10 +19,15 @@ import websockets
 from saltyrtc.server import (
     NONCE_FORMATTER,
     NONCE_LENGTH,
+    Engine,
     Event,
+    MemoryServer,
     Server,
     SubProtocol,
+    VirtualTimeEventLoop,
+    VirtualTimeEventLoopPolicy,
     serve,
+    serve_memory,
     util,
 )
 
@@ -34,18 +40,31 @@ class CalledProcessError(subprocess.CalledProcessError):
 
 def pytest_addoption(parser):
     # 'loop' parameter
-    help_ = 'Use a different event loop, supported: asyncio, uvloop'
+    help_ = 'Use a different event loop, supported: asyncio, uvloop, virtual'
     parser.addoption('--loop', action='store', help=help_)
 
     # 'timeout' parameter
     help_ = 'Use a specific timeout in seconds (float) for tests'
     parser.addoption('--timeout', action='store', help=help_)
 
+    # 'transport' parameter
+    help_ = 'Use a different transport, supported: websockets, memory'
+    parser.addoption('--transport', action='store', default='websockets',
+                     choices=('websockets', 'memory'), help=help_)
+
+    # 'engine' parameter
+    help_ = 'Use a different WebSocket engine, supported: {}'.format(
+        ', '.join(engine.value for engine in Engine))
+    parser.addoption('--engine', action='store', default=Engine.websockets.value,
+                     choices=[engine.value for engine in Engine], help=help_)
+
 
 def pytest_report_header(config):
     lines = [
         'Using event loop: {}'.format(default_event_loop(config=config)),
         'Using timeout: {}s'.format(_get_timeout(config=config)),
+        'Using transport: {}'.format(config.getoption('--transport')),
+        'Using engine: {}'.format(config.getoption('--engine')),
     ]
     return '\n'.join(lines)
 
@@ -58,11 +77,20 @@ def pytest_namespace():
     except ImportError:
         have_uvloop = False
 
+    # wsproto
+    try:
+        import wsproto  # noqa
+        have_wsproto = True
+    except ImportError:
+        have_wsproto = False
+
     # Configuration
     saltyrtc = {
         'have_uvloop': pytest.mark.skipif(not have_uvloop, reason='requires uvloop'),
         'no_uvloop': pytest.mark.skipif(
             have_uvloop, reason='requires uvloop to be not installed'),
+        'have_wsproto': pytest.mark.skipif(
+            not have_wsproto, reason='requires wsproto'),
         'host': 'localhost',
         'port': 8766,
         'cli_path': os.path.join(sys.exec_prefix, 'bin', 'saltyrtc-server'),
@@ -95,6 +123,8 @@ def default_event_loop(request=None, config=None):
     if loop == 'uvloop':
         import uvloop
         asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    elif loop == 'virtual':
+        asyncio.set_event_loop_policy(VirtualTimeEventLoopPolicy())
     else:
         loop = 'asyncio'
     return loop
@@ -141,6 +171,90 @@ def random_cookie():
     return os.urandom(16)
 
 
+def pack_nonce(cookie, source, destination, combined_sequence_number):
+    """
+    Return a packed nonce.
+    """
+    return struct.pack(
+        NONCE_FORMATTER,
+        cookie,
+        source, destination,
+        struct.pack('!Q', combined_sequence_number)[2:]
+    )
+
+
+async def pack_message(
+        client, nonce, message, box=None, timeout=None, pack=True, loop=None
+):
+    """
+    Pack a message (optionally encrypted), send it via a WebSocket
+    client and return the sent data.
+
+    Arguments:
+        - `client`: A :class:`websockets.WebSocketClientProtocol`
+          instance.
+        - `nonce`: The packed nonce.
+        - `message`: The message to be serialised via MessagePack
+          (unless `pack` is `False`).
+        - `box`: A :class:`libnacl.public.Box` instance the message
+          will be encrypted with or `None`.
+        - `timeout`: The timeout in seconds for sending or `None`.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`.
+    """
+    if pack:
+        data = umsgpack.packb(message)
+    else:
+        data = message
+    if box is not None:
+        _, data = box.encrypt(data, nonce=nonce, pack_nonce=False)
+    data = b''.join((nonce, data))
+    if timeout is None:
+        await client.send(data)
+    else:
+        await asyncio.wait_for(client.send(data), timeout, loop=loop)
+    return data
+
+
+async def unpack_message(client, box=None, timeout=None, loop=None):
+    """
+    Receive a message via a WebSocket client and return a tuple of
+    the message, the nonce (or `None` if `box` is `None`), the cookie,
+    the source and destination address and the combined sequence
+    number.
+
+    Arguments:
+        - `client`: A :class:`websockets.WebSocketClientProtocol`
+          instance.
+        - `box`: A :class:`libnacl.public.Box` instance the message
+          will be decrypted with or `None`.
+        - `timeout`: The timeout in seconds for receiving or `None`.
+        - `loop`: A :class:`asyncio.BaseEventLoop` instance or `None`.
+    """
+    if timeout is None:
+        data = await client.recv()
+    else:
+        data = await asyncio.wait_for(client.recv(), timeout, loop=loop)
+    nonce = data[:NONCE_LENGTH]
+    (cookie,
+     source, destination,
+     combined_sequence_number) = struct.unpack(NONCE_FORMATTER, nonce)
+    combined_sequence_number, *_ = struct.unpack(
+        '!Q', b'\x00\x00' + combined_sequence_number)
+    data = data[NONCE_LENGTH:]
+    if box is not None:
+        data = box.decrypt(data, nonce=nonce)
+    else:
+        nonce = None
+    message = umsgpack.unpackb(data)
+    return (
+        message,
+        nonce,
+        cookie,
+        source, destination,
+        combined_sequence_number
+    )
+
+
 def _get_timeout(timeout=None, request=None, config=None):
     """
     Return the defined timeout.
@@ -317,18 +431,27 @@ def server_factory(request, event_loop, server_permanent_keys):
         if permanent_keys is None:
             permanent_keys = server_permanent_keys
 
-        # Setup server
+        # Setup server (virtual time requires the in-memory transport)
         port = unused_tcp_port()
-        coroutine = serve(
-            util.create_ssl_context(
-                pytest.saltyrtc.cert, keyfile=pytest.saltyrtc.key,
-                dh_params_file=pytest.saltyrtc.dh_params),
-            permanent_keys,
-            host=pytest.saltyrtc.host,
-            port=port,
-            loop=event_loop,
-            server_class=TestServer,
-        )
+        if (request.config.getoption('--transport') == 'memory'
+                or isinstance(event_loop, VirtualTimeEventLoop)):
+            coroutine = serve_memory(
+                permanent_keys,
+                loop=event_loop,
+                server_class=TestServer,
+            )
+        else:
+            coroutine = serve(
+                util.create_ssl_context(
+                    pytest.saltyrtc.cert, keyfile=pytest.saltyrtc.key,
+                    dh_params_file=pytest.saltyrtc.dh_params),
+                permanent_keys,
+                host=pytest.saltyrtc.host,
+                port=port,
+                loop=event_loop,
+                server_class=TestServer,
+                engine=Engine(request.config.getoption('--engine')),
+            )
         server_ = event_loop.run_until_complete(coroutine)
         # Inject timeout and address (little bit of a hack but meh...)
         server_.timeout = _get_timeout(request=request)
@@ -356,6 +479,15 @@ def server(server_factory):
     return server_factory()
 
 
+@pytest.fixture
+def isolated_server(server_factory):
+    """
+    Return a separate :class:`saltyrtc.Server` instance for tests that
+    drain or close the server.
+    """
+    return server_factory()
+
+
 @pytest.fixture(scope='module')
 def server_no_key(server_factory):
     """
@@ -395,6 +527,16 @@ def evaluate_log(log_handler):
     assert(len(errors) == 0)
 
 
+@pytest.fixture
+def websockets_transport(request, event_loop):
+    """
+    Skip tests that require the WebSocket transport.
+    """
+    if (request.config.getoption('--transport') != 'websockets'
+            or isinstance(event_loop, VirtualTimeEventLoop)):
+        pytest.skip('Requires the WebSocket transport')
+
+
 @pytest.fixture
 def log_ignore_filter(log_handler):
     """
@@ -441,6 +583,17 @@ class Client:
         return self.ws_client.close()
 
 
+def connect(server, url_, ssl=None, **kwargs):
+    """
+    Connect to a server via WebSocket or, if the server uses the
+    in-memory transport, via an in-memory connection.
+    """
+    if isinstance(server.server, MemoryServer):
+        return server.server.connect(
+            urllib.parse.urlparse(url_).path, subprotocols=kwargs.get('subprotocols'))
+    return websockets.connect(url_, ssl=ssl, **kwargs)
+
+
 @pytest.fixture(scope='module')
 def client_kwargs(event_loop):
     return {
@@ -472,7 +625,7 @@ def ws_client_factory(initiator_key, event_loop, client_kwargs, server):
             path = '{}/{}'.format(url(*server.address), key_path(initiator_key))
         _kwargs = client_kwargs.copy()
         _kwargs.update(kwargs)
-        return websockets.connect(path, ssl=ssl_context, **_kwargs)
+        return connect(server, path, ssl=ssl_context, **_kwargs)
     return _ws_client_factory
 
 
@@ -509,8 +662,8 @@ def client_factory(
         _kwargs = client_kwargs.copy()
         _kwargs.update(kwargs)
         if ws_client is None:
-            ws_client = await websockets.connect(
-                '{}/{}'.format(url(*server.address), key_path(path)),
+            ws_client = await connect(
+                server, '{}/{}'.format(url(*server.address), key_path(path)),
                 ssl=ssl_context, **_kwargs
             )
         client = Client(
@@ -581,58 +734,25 @@ def client_factory(
     return _client_factory
 
 
-@pytest.fixture(scope='module')
-def unpack_message(request, event_loop):
+@pytest.fixture(scope='module', name='unpack_message')
+def unpack_message_fixture(request, event_loop):
     async def _unpack_message(client, box=None, timeout=None):
         timeout = _get_timeout(timeout=timeout, request=request)
-        data = await asyncio.wait_for(client.recv(), timeout, loop=event_loop)
-        nonce = data[:NONCE_LENGTH]
-        (cookie,
-         source, destination,
-         combined_sequence_number) = struct.unpack(NONCE_FORMATTER, nonce)
-        combined_sequence_number, *_ = struct.unpack(
-            '!Q', b'\x00\x00' + combined_sequence_number)
-        data = data[NONCE_LENGTH:]
-        if box is not None:
-            data = box.decrypt(data, nonce=nonce)
-        else:
-            nonce = None
-        message = umsgpack.unpackb(data)
-        return (
-            message,
-            nonce,
-            cookie,
-            source, destination,
-            combined_sequence_number
-        )
+        return await unpack_message(client, box=box, timeout=timeout, loop=event_loop)
     return _unpack_message
 
 
-@pytest.fixture(scope='module')
-def pack_nonce():
-    def _pack_nonce(cookie, source, destination, combined_sequence_number):
-        return struct.pack(
-            NONCE_FORMATTER,
-            cookie,
-            source, destination,
-            struct.pack('!Q', combined_sequence_number)[2:]
-        )
-    return _pack_nonce
+@pytest.fixture(scope='module', name='pack_nonce')
+def pack_nonce_fixture():
+    return pack_nonce
 
 
-@pytest.fixture(scope='module')
-def pack_message(request, event_loop):
+@pytest.fixture(scope='module', name='pack_message')
+def pack_message_fixture(request, event_loop):
     async def _pack_message(client, nonce, message, box=None, timeout=None, pack=True):
-        if pack:
-            data = umsgpack.packb(message)
-        else:
-            data = message
-        if box is not None:
-            _, data = box.encrypt(data, nonce=nonce, pack_nonce=False)
-        data = b''.join((nonce, data))
         timeout = _get_timeout(timeout=timeout, request=request)
-        await asyncio.wait_for(client.send(data), timeout, loop=event_loop)
-        return data
+        return await pack_message(
+            client, nonce, message, box=box, timeout=timeout, pack=pack, loop=event_loop)
     return _pack_message
 
 
@@ -0,0 +1,155 @@
+"""
+The tests provided in this module make sure that the admin API
+provides snapshots of the server's state and can drop clients.
+"""
+import asyncio
+import json
+import os
+import stat
+
+import pytest
+import websockets
+
+from saltyrtc.server import (
+    AdminAPI,
+    CloseCode,
+    Event,
+    serve_admin,
+)
+
+
+@pytest.mark.usefixtures('evaluate_log')
+class TestAdmin:
+    @pytest.mark.asyncio
+    async def test_snapshots(self, event_loop, initiator_key, server, client_factory):
+        """
+        Ensure paths and clients can be inspected with filters and
+        paging.
+        """
+        api = AdminAPI(server, loop=event_loop)
+        hex_path = initiator_key.hex_pk().decode('ascii')
+
+        # Initiator and responder handshake
+        initiator, _ = await client_factory(initiator_handshake=True)
+        responder, _ = await client_factory(responder_handshake=True)
+        await initiator.recv()
+
+        # Paths
+        response = api.handle_request({'command': 'paths', 'path': hex_path})
+        assert response['ok']
+        assert response['total'] == 1
+        path, = response['paths']
+        assert path['path'] == hex_path
+        assert path['initiator']['state'] == 'authenticated'
+        assert path['initiator']['bytes_in'] > 0
+        assert path['initiator']['bytes_out'] > 0
+        assert len(path['responders']) == 1
+        assert path['responders'][0]['id'] == 0x02
+        assert api.paths(min_responders=2)['total'] == 0
+
+        # Clients
+        response = api.clients(type='responder')
+        assert response['total'] == 1
+        assert response['clients'][0]['path'] == hex_path
+        assert response['clients'][0]['keep_alive_pings'] == 0
+        assert api.clients(state='restricted')['total'] == 0
+        assert api.clients(min_age=3600.0)['total'] == 0
+
+        # Paging
+        response = api.clients(sort='bytes_out', limit=1)
+        assert response['total'] == 2
+        assert len(response['clients']) == 1
+        assert response['clients'][0]['type'] == 'initiator'
+        assert len(api.clients(offset=1)['clients']) == 1
+
+        # Invalid arguments
+        for request in (
+            {'command': 'meow'},
+            {'command': 'clients', 'sort': 'meow'},
+            {'command': 'clients', 'state': 'meow'},
+            {'command': 'clients', 'limit': 0},
+            {'command': 'paths', 'rawr': True},
+        ):
+            response = api.handle_request(request)
+            assert not response['ok']
+            assert len(response['error']) > 0
+
+        # Bye
+        await initiator.close()
+        await responder.close()
+        await server.wait_connections_closed()
+
+    @pytest.mark.asyncio
+    async def test_drop_via_socket(
+            self, event_loop, tmpdir, initiator_key, ws_client_factory, isolated_server,
+            client_factory
+    ):
+        """
+        Ensure authenticated clients and clients that have not
+        completed the handshake can be dropped via the Unix socket
+        which is only accessible by the owner.
+        """
+        server = isolated_server
+        dropped_events = []
+
+        async def callback(_, __, data):
+            dropped_events.append(data)
+
+        server.register_event_callback(Event.client_dropped, callback)
+        path = str(tmpdir.join('admin.sock'))
+        umask = os.umask(0o022)
+        try:
+            await serve_admin(server, path, loop=event_loop)
+            assert os.umask(0o022) == 0o022
+        finally:
+            os.umask(umask)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        reader, writer = await asyncio.open_unix_connection(path, loop=event_loop)
+
+        async def _request(request):
+            writer.write(json.dumps(request).encode('utf-8') + b'\n')
+            return json.loads((await reader.readline()).decode('utf-8'))
+
+        # Initiator handshake and a client without handshake
+        initiator, _ = await client_factory(server=server, initiator_handshake=True)
+        restricted = await ws_client_factory(server=server)
+        restricted_closed = server.wait_connection_closed_marker()
+
+        # Drop the restricted client
+        response = await _request({'command': 'clients', 'state': 'restricted'})
+        assert response['total'] == 1
+        response = await _request({
+            'command': 'drop_client',
+            'handle': response['clients'][0]['handle'],
+            'code': CloseCode.protocol_error.value,
+        })
+        assert response == {'ok': True, 'dropped': True}
+        with pytest.raises(websockets.ConnectionClosed) as exc_info:
+            while True:
+                await restricted.recv()
+        assert exc_info.value.code == CloseCode.protocol_error
+        await restricted_closed()
+
+        # Drop the path
+        response = await _request({
+            'command': 'drop_path',
+            'path': initiator_key.hex_pk().decode('ascii'),
+        })
+        assert response == {'ok': True, 'dropped': 1}
+        with pytest.raises(websockets.ConnectionClosed) as exc_info:
+            await initiator.recv()
+        assert exc_info.value.code == CloseCode.going_away
+
+        # Invalid JSON
+        writer.write(b'meow\n')
+        response = json.loads((await reader.readline()).decode('utf-8'))
+        assert response == {'ok': False, 'error': 'Invalid JSON'}
+
+        # Bye
+        writer.close()
+        await server.wait_connections_closed()
+        await server.event_dispatcher.join()
+        dropped, = dropped_events
+        assert dropped.code == CloseCode.going_away.value
+        assert dropped.dropped_by is None
+        assert dropped.by_admin
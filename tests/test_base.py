@@ -17,6 +17,7 @@ class TestTypes:
 @pytest.mark.usefixtures('evaluate_log')
 class TestPrerequisites:
     @pytest.mark.asyncio
+    @pytest.mark.usefixtures('websockets_transport')
     async def test_server_handshake(self, ws_client_factory):
         """
         Make sure the server is reachable and we can do a simple
@@ -1,6 +1,7 @@
 import binascii
 import os
 import signal
+import socket
 import stat
 import subprocess
 
@@ -438,3 +439,222 @@ class TestCLI:
         )
         assert 'DeprecationWarning' in output
         assert 'Stopped' in output
+
+    @pytest.mark.asyncio
+    async def test_serve_invalid_engine(self, cli):
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            await cli(
+                'serve',
+                '-tc', pytest.saltyrtc.cert,
+                '-tk', pytest.saltyrtc.key,
+                '-k', pytest.saltyrtc.permanent_key_primary,
+                '-p', '8443',
+                '-e', 'meow',
+            )
+        assert 'invalid choice' in exc_info.value.output
+
+    @pytest.saltyrtc.have_wsproto
+    @pytest.mark.asyncio
+    async def test_serve_asyncio_wsproto(self, cli):
+        output = await cli(
+            'serve',
+            '-tc', pytest.saltyrtc.cert,
+            '-tk', pytest.saltyrtc.key,
+            '-k', pytest.saltyrtc.permanent_key_primary,
+            '-p', '8443',
+            '-e', 'wsproto',
+            signal=signal.SIGINT,
+        )
+        assert 'Stopped' in output
+
+    @pytest.mark.asyncio
+    async def test_serve_asyncio_native(self, cli):
+        output = await cli(
+            'serve',
+            '-tc', pytest.saltyrtc.cert,
+            '-tk', pytest.saltyrtc.key,
+            '-k', pytest.saltyrtc.permanent_key_primary,
+            '-p', '8443',
+            '-e', 'native',
+            signal=signal.SIGINT,
+        )
+        assert 'Stopped' in output
+
+    @pytest.mark.asyncio
+    async def test_serve_unix(self, cli, tmpdir):
+        path = str(tmpdir.join('saltyrtc.sock'))
+        output = await cli(
+            'serve',
+            '-tc', pytest.saltyrtc.cert,
+            '-tk', pytest.saltyrtc.key,
+            '-k', pytest.saltyrtc.permanent_key_primary,
+            '--unix', path,
+            '--unix-mode', '660',
+            signal=signal.SIGINT,
+        )
+        assert 'Stopped' in output
+
+    @pytest.mark.asyncio
+    async def test_serve_invalid_unix_mode(self, cli, tmpdir):
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            await cli(
+                'serve',
+                '-tc', pytest.saltyrtc.cert,
+                '-tk', pytest.saltyrtc.key,
+                '-k', pytest.saltyrtc.permanent_key_primary,
+                '--unix', str(tmpdir.join('saltyrtc.sock')),
+                '--unix-mode', 'rw-rw----',
+            )
+        assert 'is not an octal number' in exc_info.value.output
+
+    @pytest.mark.asyncio
+    async def test_serve_bind(self, cli, tmpdir):
+        path = str(tmpdir.join('saltyrtc.sock'))
+        output = await cli(
+            'serve',
+            '-tc', pytest.saltyrtc.cert,
+            '-tk', pytest.saltyrtc.key,
+            '-k', pytest.saltyrtc.permanent_key_primary,
+            '-b', 'wss://localhost:8443',
+            '-b', 'ws://127.0.0.1:8766',
+            '--bind', 'unix:{}'.format(path),
+            signal=signal.SIGINT,
+        )
+        output = output.split('\n')
+        assert 'Listening on wss://localhost:8443' in output
+        assert 'Listening on ws://127.0.0.1:8766' in output
+        assert 'Listening on unix:{}'.format(path) in output
+        assert 'Stopped' in output
+
+    @pytest.mark.asyncio
+    async def test_serve_invalid_bind(self, cli):
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            await cli(
+                'serve',
+                '-tc', pytest.saltyrtc.cert,
+                '-tk', pytest.saltyrtc.key,
+                '-k', pytest.saltyrtc.permanent_key_primary,
+                '-b', 'http://localhost:8443',
+            )
+        assert "Unsupported scheme: 'http'" in exc_info.value.output
+
+    @pytest.mark.asyncio
+    async def test_serve_systemd_notify(self, cli, tmpdir):
+        notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        notify_socket.bind(str(tmpdir.join('notify.sock')))
+        env = os.environ.copy()
+        env['NOTIFY_SOCKET'] = str(tmpdir.join('notify.sock'))
+        env['WATCHDOG_USEC'] = '10000000'
+        output = await cli(
+            'serve',
+            '-tc', pytest.saltyrtc.cert,
+            '-tk', pytest.saltyrtc.key,
+            '-k', pytest.saltyrtc.permanent_key_primary,
+            '-p', '8443',
+            signal=[signal.SIGHUP, signal.SIGINT],
+            env=env,
+        )
+        assert output.count('Started') == 2
+
+        # Expect readiness, reloading, watchdog pings and stopping
+        notify_socket.setblocking(False)
+        states = []
+        with pytest.raises(BlockingIOError):
+            while True:
+                states.append(notify_socket.recv(4096).decode('utf-8'))
+        notify_socket.close()
+        assert 'WATCHDOG=1' in states
+        states = [state for state in states if state != 'WATCHDOG=1']
+        assert states == [
+            'READY=1\nSTATUS=Started',
+            'RELOADING=1\nSTATUS=Restarting',
+            'READY=1\nSTATUS=Started',
+            'STOPPING=1\nSTATUS=Stopping',
+        ]
+
+    @pytest.mark.asyncio
+    async def test_serve_asyncio_drain(self, cli):
+        output = await cli(
+            'serve',
+            '-tc', pytest.saltyrtc.cert,
+            '-tk', pytest.saltyrtc.key,
+            '-k', pytest.saltyrtc.permanent_key_primary,
+            '-p', '8443',
+            '--drain-timeout', '1.0',
+            signal=signal.SIGUSR2,
+        )
+        output = output.split('\n')
+        assert output.count('Started') == 1
+        assert 'Draining' in output
+        assert output.count('Stopped') == 1
+
+    @pytest.mark.asyncio
+    async def test_serve_asyncio_profile_and_dump_tasks(self, cli, tmpdir):
+        output = await cli(
+            'serve',
+            '-tc', pytest.saltyrtc.cert,
+            '-tk', pytest.saltyrtc.key,
+            '-k', pytest.saltyrtc.permanent_key_primary,
+            '-p', '8443',
+            '--profile-duration', '0.1',
+            '--profile-dir', str(tmpdir),
+            '--dump-tasks',
+            signal=[signal.SIGUSR1, signal.SIGQUIT, signal.SIGINT],
+        )
+        assert 'Profiling for 0.1s' in output
+        assert 'Profile written to {}'.format(tmpdir) in output
+        assert 'live tasks' in output
+        assert len(tmpdir.listdir()) == 1
+
+    @pytest.mark.asyncio
+    async def test_serve_asyncio_event_log(self, cli, tmpdir):
+        path = tmpdir.join('events.jsonl')
+        output = await cli(
+            'serve',
+            '-tc', pytest.saltyrtc.cert,
+            '-tk', pytest.saltyrtc.key,
+            '-k', pytest.saltyrtc.permanent_key_primary,
+            '-p', '8443',
+            '--event-log', str(path),
+            '--event-log-sample-rate', '0.5',
+            signal=signal.SIGINT,
+        )
+        assert 'Stopped' in output
+        assert path.check()
+
+    @pytest.mark.asyncio
+    async def test_serve_invalid_event_log_sample_rate(self, cli, tmpdir):
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            await cli(
+                'serve',
+                '-tc', pytest.saltyrtc.cert,
+                '-tk', pytest.saltyrtc.key,
+                '-k', pytest.saltyrtc.permanent_key_primary,
+                '--event-log', str(tmpdir.join('events.jsonl')),
+                '--event-log-sample-rate', '1.5',
+            )
+        assert 'is not within the range of 0.0 to 1.0' in exc_info.value.output
+
+    @pytest.mark.asyncio
+    async def test_loadtest_invalid_key(self, cli):
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            await cli('loadtest', 'wss://localhost:8443', '-k', 'meow')
+        assert 'Invalid public permanent key' in exc_info.value.output
+
+    @pytest.mark.asyncio
+    async def test_loadtest(self, cli, server, server_permanent_keys):
+        output = await cli(
+            'loadtest', 'wss://{}:{}'.format(*server.address),
+            '--cafile', pytest.saltyrtc.cert,
+            '-k', server_permanent_keys[0].hex_pk().decode('ascii'),
+            '-i', '1',
+            '-r', '2',
+            '--relay-rate', '20',
+            '-d', '1',
+            '--interval', '0.4',
+            timeout=5.0,
+        )
+        assert 'connected: 3' in output
+        assert 'Handshakes: 3' in output
+        assert 'failed: 0' in output
+        await server.wait_connections_closed()
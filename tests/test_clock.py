@@ -0,0 +1,153 @@
+"""
+The tests provided in this module make sure that the virtual time
+event loop skips idle time and that the server's timers run on it.
+"""
+import asyncio
+import time
+
+import pytest
+import websockets
+
+from saltyrtc.server import (
+    KEEP_ALIVE_INTERVAL_DEFAULT,
+    RELAY_TIMEOUT,
+    CloseCode,
+    VirtualTimeEventLoop,
+    VirtualTimeEventLoopPolicy,
+)
+
+
+@pytest.fixture(scope='module')
+def event_loop(request):
+    """
+    Create a virtual time event loop (which also selects the
+    in-memory transport for the server).
+    """
+    policy = asyncio.get_event_loop_policy()
+    policy.get_event_loop().close()
+    _event_loop = VirtualTimeEventLoop()
+    policy.set_event_loop(_event_loop)
+    request.addfinalizer(_event_loop.close)
+    return _event_loop
+
+
+class TestVirtualTimeEventLoop:
+    def test_policy(self):
+        loop = VirtualTimeEventLoopPolicy().new_event_loop()
+        assert isinstance(loop, VirtualTimeEventLoop)
+        loop.close()
+
+    @pytest.mark.asyncio
+    async def test_sleep(self, event_loop):
+        """
+        Ensure idle time is being skipped.
+        """
+        start, real_start = event_loop.time(), time.monotonic()
+        await asyncio.sleep(86400.0, loop=event_loop)
+        assert event_loop.time() - start == 86400.0
+        assert time.monotonic() - real_start < 1.0
+
+    @pytest.mark.asyncio
+    async def test_timers_order(self, event_loop):
+        fired = []
+        for delay in (3.0, 1.0, 2.0):
+            event_loop.call_later(delay, fired.append, delay)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.Future(loop=event_loop), 2.5, loop=event_loop)
+        assert fired == [1.0, 2.0]
+        await asyncio.sleep(1.0, loop=event_loop)
+        assert fired == [1.0, 2.0, 3.0]
+
+    @pytest.mark.asyncio
+    async def test_advance(self, event_loop):
+        future = asyncio.Future(loop=event_loop)
+        start = event_loop.time()
+        event_loop.call_later(10.0, future.set_result, True)
+        event_loop.advance(10.0)
+        assert event_loop.time() == start + 10.0
+        assert await future
+        assert event_loop.time() == start + 10.0
+        with pytest.raises(ValueError):
+            event_loop.advance(-1.0)
+
+
+@pytest.mark.usefixtures('evaluate_log')
+class TestServerTimers:
+    @pytest.mark.asyncio
+    async def test_keep_alive_default_interval(
+            self, event_loop, server, client_factory
+    ):
+        """
+        Ensure the server pings in the default interval of an hour.
+        """
+        initiator, _ = await client_factory(initiator_handshake=True)
+        protocol, = server.protocols
+        assert protocol.client.keep_alive_interval == KEEP_ALIVE_INTERVAL_DEFAULT
+
+        await asyncio.sleep(KEEP_ALIVE_INTERVAL_DEFAULT * 24 + 1.0, loop=event_loop)
+        assert protocol.client.keep_alive_pings == 24
+
+        await initiator.close()
+        await server.wait_connections_closed()
+
+    @pytest.mark.asyncio
+    async def test_keep_alive_timeout(
+            self, event_loop, ws_client_factory, server, client_factory
+    ):
+        """
+        Ensure the connection is being closed once a pong has not been
+        received within the keep alive timeout.
+        """
+        ws_client = await ws_client_factory()
+        ws_client.pong = asyncio.coroutine(lambda *args, **kwargs: None)
+        protocol, = server.protocols
+        await client_factory(ws_client=ws_client, initiator_handshake=True)
+
+        start = event_loop.time()
+        await ws_client.wait_closed()
+        assert ws_client.close_code == CloseCode.timeout
+        assert event_loop.time() - start == \
+            KEEP_ALIVE_INTERVAL_DEFAULT + protocol.client.keep_alive_timeout
+        await server.wait_connections_closed()
+
+    @pytest.mark.asyncio
+    async def test_relay_timeout(
+            self, mocker, log_ignore_filter, event_loop, pack_nonce, cookie_factory,
+            initiator_key, server, client_factory
+    ):
+        """
+        Ensure a relayed message is being given up after the relay
+        timeout and that a `send-error` message is being sent.
+        """
+        def _filter(record):
+            return 'has been cancelled' in record.message \
+                   or (record.exception_message is not None
+                       and 'has been cancelled' in record.exception_message)
+        log_ignore_filter(_filter)
+
+        initiator, i = await client_factory(initiator_handshake=True)
+        responder, r = await client_factory(responder_handshake=True)
+        await initiator.recv()
+
+        # Block the responder's connection
+        path_client = server.paths.get(initiator_key.pk).get_responder(r['id'])
+
+        async def _send(*_):
+            await asyncio.Future(loop=event_loop)
+
+        mocker.patch.object(path_client._connection, 'send', _send)
+
+        # Relay message and expect send-error after the relay timeout
+        start = event_loop.time()
+        nonce = pack_nonce(cookie_factory(), i['id'], r['id'], 2 ** 24)
+        await initiator.send(nonce, {'type': 'meow'}, box=None)
+        message, *_ = await initiator.recv(timeout=RELAY_TIMEOUT + 1.0)
+        assert message['type'] == 'send-error'
+        assert event_loop.time() - start == RELAY_TIMEOUT
+
+        # The responder's task loop has been cancelled along with the message
+        with pytest.raises(websockets.ConnectionClosed) as exc_info:
+            await responder.recv()
+        assert exc_info.value.code == CloseCode.internal_error
+        await initiator.close()
+        await server.wait_connections_closed()
@@ -1,3 +1,5 @@
+import gc
+import weakref
 from typing import (
     Any,
     List,
@@ -6,6 +8,7 @@ from typing import (
     Union,
 )
 
+import logbook
 import pytest
 
 from saltyrtc.server import (
@@ -21,6 +24,7 @@ from saltyrtc.server import (
     MessageError,
     ResponderAddress,
     ServerAddress,
+    util,
     validate_drop_reason,
     validate_responder_id,
     validate_subprotocol,
@@ -236,3 +240,100 @@ class TestSubprotocols:
             subprotocols: Union[List[str], Tuple[str]],
     ) -> None:
         validate_subprotocols(subprotocols)
+
+
+class TestLogGuard:
+    """
+    The cached log level flags must follow enabling and disabling the
+    logger group.
+    """
+    def test_update(self) -> None:
+        disabled, level = util.logger_group.disabled, util.logger_group.level
+        try:
+            util.enable_logging(level=logbook.INFO)
+            assert not util.log_guard.debug
+            assert not util.log_guard.trace
+            util.enable_logging(level=logbook.DEBUG)
+            assert util.log_guard.debug
+            assert not util.log_guard.trace
+            util.enable_logging(level=logbook.TRACE)
+            assert util.log_guard.debug
+            assert util.log_guard.trace
+            util.disable_logging()
+            assert not util.log_guard.debug
+            assert not util.log_guard.trace
+        finally:
+            util.logger_group.disabled, util.logger_group.level = disabled, level
+            util.log_guard.update()
+
+    def test_logger_level(self) -> None:
+        disabled, level = util.logger_group.disabled, util.logger_group.level
+        logger = util.get_logger('guard.meow')
+        try:
+            # Lower level of a specific logger
+            util.enable_logging(level=logbook.INFO)
+            logger.level = logbook.DEBUG
+            util.log_guard.update()
+            assert util.log_guard.debug
+            assert not util.log_guard.trace
+
+            # Disabled logger
+            logger.disabled = True
+            util.log_guard.update()
+            assert not util.log_guard.debug
+
+            # Higher level of a specific logger
+            logger.disabled = False
+            logger.level = logbook.ERROR
+            util.enable_logging(level=logbook.TRACE)
+            assert util.log_guard.debug
+            assert util.log_guard.trace
+        finally:
+            logger.level = logbook.NOTSET
+            del logger.disabled
+            util.logger_group.disabled, util.logger_group.level = disabled, level
+            util.log_guard.update()
+
+
+class TestContextLogger:
+    """
+    Context loggers must share a group-registered logger without being
+    registered themselves.
+    """
+    def test_shared_logger(self) -> None:
+        assert util.get_logger('meow') is util.get_logger('meow')
+        logger = util.get_logger('meow.level', level=logbook.ERROR)
+        logger.level = logbook.CRITICAL
+        assert util.get_logger('meow.level').level == logbook.CRITICAL
+        amount = len(util.logger_group.loggers)
+        for number in range(10):
+            util.get_context_logger('meow', 'meow.{}'.format(number), number=number)
+        assert len(util.logger_group.loggers) == amount
+
+    def test_released(self) -> None:
+        log = util.get_context_logger('meow', 'meow.1')
+        assert log not in util.logger_group.loggers
+        reference = weakref.ref(log)
+        del log
+        gc.collect()
+        assert reference() is None
+
+    def test_context(self) -> None:
+        disabled, level = util.logger_group.disabled, util.logger_group.level
+        log = util.get_context_logger('meow', 'meow.1', number=1)
+        try:
+            util.disable_logging()
+            assert log.disabled
+            util.enable_logging(level=logbook.INFO)
+            assert not log.disabled
+            assert log.level == logbook.INFO
+            with logbook.TestHandler() as handler:
+                log.debug('Rawr')
+                log.info('Meow')
+            record, = handler.records
+            assert record.channel == 'saltyrtc.meow.1'
+            assert record.message == 'Meow'
+            assert record.extra['number'] == 1
+        finally:
+            util.logger_group.disabled, util.logger_group.level = disabled, level
+            util.log_guard.update()
@@ -0,0 +1,212 @@
+"""
+The tests provided in this module make sure that protocol events are
+written to the event log as expected.
+"""
+import asyncio
+import errno
+import json
+import os
+
+import logbook
+import pytest
+
+from saltyrtc.server import (
+    CloseCode,
+    EventLog,
+    util,
+)
+
+
+def _read(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+class TestEventLog:
+    def test_write_and_rotate(self, tmpdir):
+        """
+        Ensure records are written as JSON lines and the file is
+        rotated once it exceeds the maximum size.
+        """
+        path = str(tmpdir.join('events.jsonl'))
+        event_log = EventLog(path, max_bytes=256, backup_count=2, batch_size=1)
+
+        # Not running, nothing will be written
+        event_log.emit('meow', cat=1)
+
+        event_log.start()
+        assert event_log.running
+        with pytest.raises(RuntimeError):
+            event_log.start()
+        for number in range(20):
+            event_log.emit('meow', cat=number)
+        event_log.close()
+        assert not event_log.running
+        assert event_log.written == 20
+        assert event_log.dropped == 0
+
+        # Rotated files
+        assert tmpdir.join('events.jsonl.1').check()
+        assert tmpdir.join('events.jsonl.2').check()
+        assert not tmpdir.join('events.jsonl.3').check()
+        record = _read(str(tmpdir.join('events.jsonl.2')))[0]
+        assert record['event'] == 'meow'
+        assert record['time'] > 0
+        assert record['cat'] > 0
+
+    def test_rotation_failure(self, tmpdir, monkeypatch, log_handler):
+        """
+        Ensure writing continues with the current file in case the
+        rotation fails.
+        """
+        def _replace(*_):
+            raise OSError(errno.ENOSPC, 'No space left on device')
+
+        monkeypatch.setattr(os, 'replace', _replace)
+        path = str(tmpdir.join('events.jsonl'))
+        event_log = EventLog(path, max_bytes=256, backup_count=2, batch_size=1)
+        disabled, level = util.logger_group.disabled, util.logger_group.level
+        util.enable_logging(level=logbook.ERROR)
+        try:
+            event_log.start()
+            for number in range(20):
+                event_log.emit('meow', cat=number)
+            event_log.close()
+        finally:
+            util.logger_group.disabled, util.logger_group.level = disabled, level
+            util.log_guard.update()
+        assert event_log.written == 20
+
+        # Not rotated, all records have been written to the current file
+        assert not tmpdir.join('events.jsonl.1').check()
+        assert [record['cat'] for record in _read(path)] == list(range(20))
+
+        # Logged once (until the rotation is being retried)
+        errors = [record for record in log_handler.records
+                  if record.message.startswith('Could not rotate')]
+        assert len(errors) == 1
+
+    def test_malformed_record(self, tmpdir, log_handler):
+        """
+        Ensure a record that cannot be serialised is skipped without
+        dropping the other records of its batch.
+        """
+        path = str(tmpdir.join('events.jsonl'))
+        event_log = EventLog(path)
+        disabled, level = util.logger_group.disabled, util.logger_group.level
+        util.enable_logging(level=logbook.ERROR)
+        try:
+            event_log.start()
+            event_log.emit('meow', cat=1)
+            event_log.emit('meow', cat=object())
+            event_log.emit('meow', cat=3)
+            event_log.close()
+        finally:
+            util.logger_group.disabled, util.logger_group.level = disabled, level
+            util.log_guard.update()
+        assert event_log.written == 2
+        assert event_log.malformed == 1
+        assert [record['cat'] for record in _read(path)] == [1, 3]
+        errors = [record for record in log_handler.records
+                  if record.message.startswith('Could not serialise')]
+        assert len(errors) == 1
+
+    def test_relay_sampling(self, tmpdir):
+        """
+        Ensure relay events are being sampled.
+        """
+        path = str(tmpdir.join('events.jsonl'))
+        with pytest.raises(ValueError):
+            EventLog(path, relay_sample_rate=1.5)
+
+        event_log = EventLog(path, relay_sample_rate=0.0)
+        event_log.start()
+        event_log.relay(1, 0x01, 0x02, 1024, 0.001, 0.002)
+        event_log.relay_sample_rate = 1.0
+        event_log.relay(1, 0x02, 0x01, 512, 0.001, 0.002)
+        event_log.close()
+        record, = _read(path)
+        assert record['event'] == 'relay'
+        assert record['source'] == 0x02
+        assert record['size'] == 512
+
+    def test_queue_full(self, tmpdir):
+        """
+        Ensure records are dropped and counted when the queue is full.
+        """
+        event_log = EventLog(str(tmpdir.join('events.jsonl')), queue_size=1)
+        event_log._thread = object()  # Pretend to be running
+        event_log.emit('meow')
+        event_log.emit('meow')
+        assert event_log.dropped == 1
+
+
+@pytest.mark.usefixtures('evaluate_log')
+class TestServerEventLog:
+    @pytest.mark.asyncio
+    async def test_protocol_events(
+            self, event_loop, tmpdir, initiator_key, pack_nonce, cookie_factory,
+            isolated_server, client_factory
+    ):
+        """
+        Ensure handshakes, relayed messages, drops and close codes are
+        being logged.
+        """
+        server = isolated_server
+        path = str(tmpdir.join('events.jsonl'))
+        event_log = EventLog(path, relay_sample_rate=1.0)
+        event_log.start()
+        event_log.attach(server)
+
+        # Initiator handshake
+        initiator, i = await client_factory(server=server, initiator_handshake=True)
+        i['rccsn'] = 456987
+        i['rcck'] = cookie_factory()
+
+        # Responder handshake
+        responder, r = await client_factory(server=server, responder_handshake=True)
+
+        # new-responder
+        await initiator.recv()
+
+        # Send relay message: initiator --> responder
+        nonce = pack_nonce(i['rcck'], i['id'], r['id'], i['rccsn'])
+        data = await initiator.send(nonce, b'\xfe' * 1024, box=None)
+        await responder.recv(box=None)
+
+        # Drop responder
+        responder_closed_future = server.wait_connection_closed_marker()
+        await initiator.send(pack_nonce(i['cck'], 0x01, 0x00, i['ccsn']), {
+            'type': 'drop-responder',
+            'id': r['id'],
+        })
+        i['ccsn'] += 1
+        await responder_closed_future()
+        assert responder.ws_client.close_code == CloseCode.drop_by_initiator
+
+        # Bye
+        await initiator.close()
+        await server.wait_connections_closed()
+        await asyncio.sleep(0.05, loop=event_loop)
+        event_log.close()
+
+        records = _read(path)
+        events = [record['event'] for record in records]
+        assert events.count('handshake_started') == 2
+        handshakes = [record for record in records
+                      if record['event'] == 'handshake_completed']
+        assert [record['id'] for record in handshakes] == [0x01, 0x02]
+        assert handshakes[0]['key'] == initiator_key.hex_pk().decode('ascii')
+        assert handshakes[0]['duration'] > 0
+        relay, = [record for record in records if record['event'] == 'relay']
+        assert relay['source'] == 0x01
+        assert relay['destination'] == 0x02
+        assert relay['size'] == len(data)
+        drop, = [record for record in records if record['event'] == 'drop']
+        assert drop['id'] == 0x02
+        assert drop['by'] == 0x01
+        assert drop['admin'] is False
+        assert drop['code'] == CloseCode.drop_by_initiator.value
+        disconnected = [record for record in records
+                        if record['event'] == 'disconnected']
+        assert sorted(record['data'] for record in disconnected) == [1000, 3004]
@@ -0,0 +1,152 @@
+"""
+The tests provided in this module make sure that the event dispatcher
+invokes callbacks as expected and stays bounded.
+"""
+import asyncio
+
+import pytest
+
+from saltyrtc.server import (
+    Event,
+    EventDispatcher,
+    OverflowPolicy,
+)
+
+
+class TestEventDispatcher:
+    @pytest.mark.asyncio
+    async def test_callbacks(self, event_loop):
+        """
+        Ensure synchronous, `async` and batch callbacks receive the
+        raised events and failing callbacks do not stop the workers.
+        """
+        dispatcher = EventDispatcher(concurrency=1, loop=event_loop)
+        sync_events, async_events, batches = [], [], []
+
+        async def _callback(*args):
+            async_events.append(args)
+
+        async def _failing_callback(*_):
+            raise ValueError('meow')
+
+        async def _batch_callback(items):
+            batches.append(items)
+
+        registry = dispatcher.registry
+        registry.register_sync(Event.disconnected, lambda *args: sync_events.append(args))
+        registry.register(Event.disconnected, _failing_callback)
+        registry.register(Event.disconnected, _callback)
+        registry.register_batch(_batch_callback, events=[Event.initiator_connected])
+
+        # Synchronous callbacks are invoked immediately
+        dispatcher.dispatch(Event.disconnected, 'rawr', 1000)
+        dispatcher.dispatch(Event.initiator_connected, 'rawr', None)
+        dispatcher.dispatch(Event.responder_connected, 'rawr', None)
+        assert sync_events == [(Event.disconnected, 'rawr', 1000)]
+        assert dispatcher.size == 2
+
+        await dispatcher.join()
+        assert dispatcher.size == 0
+        assert async_events == [(Event.disconnected, 'rawr', 1000)]
+        assert batches == [[(Event.initiator_connected, 'rawr', None)]]
+        await dispatcher.close()
+
+    @pytest.mark.parametrize('policy, dropped', [
+        (OverflowPolicy.drop, 0),
+        (OverflowPolicy.count, 2),
+    ])
+    @pytest.mark.asyncio
+    async def test_overflow_discard(self, event_loop, policy, dropped):
+        """
+        Ensure events are discarded (and counted) when the queue is
+        full.
+        """
+        dispatcher = EventDispatcher(maxsize=2, policy=policy, loop=event_loop)
+        received = []
+
+        async def _callback(_, __, data):
+            received.append(data)
+
+        dispatcher.registry.register(Event.disconnected, _callback)
+        for code in range(4):
+            dispatcher.dispatch(Event.disconnected, None, code)
+        assert dispatcher.size == 2
+        assert dispatcher.dropped == dropped
+        await dispatcher.close()
+        assert received == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_overflow_default(self, event_loop):
+        """
+        Ensure no events are discarded by default.
+        """
+        dispatcher = EventDispatcher(maxsize=2, loop=event_loop)
+        received = []
+
+        async def _callback(_, __, data):
+            received.append(data)
+
+        dispatcher.registry.register(Event.disconnected, _callback)
+        for code in range(4):
+            dispatcher.dispatch(Event.disconnected, None, code)
+        assert dispatcher.dropped == 0
+        await dispatcher.close()
+        assert received == [0, 1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_overflow_block(self, event_loop):
+        """
+        Ensure raising parties have to wait for the queue to have room
+        when blocking.
+        """
+        dispatcher = EventDispatcher(
+            maxsize=2, concurrency=1, batch_size=1, policy=OverflowPolicy.block,
+            loop=event_loop)
+        unblock = asyncio.Future(loop=event_loop)
+
+        async def _callback(*_):
+            await unblock
+
+        dispatcher.registry.register(Event.disconnected, _callback)
+        await dispatcher.wait_writable()
+        for code in range(3):
+            dispatcher.dispatch(Event.disconnected, None, code)
+        await asyncio.sleep(0, loop=event_loop)
+        dispatcher.dispatch(Event.disconnected, None, 3)
+        assert dispatcher.size == 3
+        assert dispatcher.dropped == 0
+
+        # Blocked until the callback returns
+        waiter = event_loop.create_task(dispatcher.wait_writable())
+        await asyncio.sleep(0.05, loop=event_loop)
+        assert not waiter.done()
+        unblock.set_result(None)
+        await asyncio.wait_for(waiter, 1.0, loop=event_loop)
+        await dispatcher.close()
+        assert dispatcher.size == 0
+
+    @pytest.mark.asyncio
+    async def test_close_timeout(self, event_loop):
+        """
+        Ensure closing does not wait for hanging callbacks beyond the
+        timeout and discards the remaining events.
+        """
+        dispatcher = EventDispatcher(concurrency=1, batch_size=1, loop=event_loop)
+        unblock = asyncio.Future(loop=event_loop)
+
+        async def _callback(*_):
+            await unblock
+
+        dispatcher.registry.register(Event.disconnected, _callback)
+        for code in range(3):
+            dispatcher.dispatch(Event.disconnected, None, code)
+        start = event_loop.time()
+        await dispatcher.close(timeout=0.1)
+        assert 0.1 <= event_loop.time() - start < 1.0
+        assert dispatcher.size == 0
+        await asyncio.wait_for(dispatcher.join(), 1.0, loop=event_loop)
+
+    def test_invalid_arguments(self, event_loop):
+        for kwargs in ({'maxsize': 0}, {'concurrency': 0}, {'batch_size': 0}):
+            with pytest.raises(ValueError):
+                EventDispatcher(loop=event_loop, **kwargs)
@@ -0,0 +1,138 @@
+"""
+The tests provided in this module make sure that health, readiness and
+statistics requests are being answered on the WebSocket listeners.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+import websockets
+
+from saltyrtc.server import (
+    Engine,
+    HealthCheck,
+    Listener,
+    serve,
+)
+
+from .conftest import unused_tcp_port
+
+
+@pytest.fixture
+def health_server(request, event_loop, server_permanent_keys):
+    """
+    Return a factory to start a server on an unused port which
+    answers health requests.
+    """
+    servers = []
+
+    async def _health_server(**kwargs):
+        port = unused_tcp_port()
+        server = await serve(
+            None, server_permanent_keys, loop=event_loop,
+            engine=Engine(request.config.getoption('--engine')),
+            listeners=[Listener(host=pytest.saltyrtc.host, port=port)],
+            health_check=HealthCheck(**kwargs))
+        servers.append(server)
+        return server, port
+
+    yield _health_server
+    for server in servers:
+        server.close()
+        event_loop.run_until_complete(server.wait_closed())
+
+
+@pytest.fixture
+def http_get(event_loop):
+    """
+    Return a function that sends a plain HTTP request to a port and
+    returns the status code and the body.
+    """
+    async def _http_get(port, target):
+        reader, writer = await asyncio.open_connection(
+            pytest.saltyrtc.host, port, loop=event_loop)
+        writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(
+            target).encode('ascii'))
+        response = await reader.read()
+        writer.close()
+        head, body = response.split(b'\r\n\r\n', 1)
+        return int(head.split(b' ', 2)[1]), body
+
+    return _http_get
+
+
+@pytest.mark.usefixtures('evaluate_log', 'websockets_transport')
+class TestHealthCheck:
+    def test_invalid_loop_lag_interval(self):
+        with pytest.raises(ValueError):
+            HealthCheck(loop_lag_interval=0.0)
+
+    @pytest.mark.asyncio
+    async def test_health_ready(self, health_server, http_get):
+        """
+        Ensure health and readiness requests are being answered without
+        a WebSocket upgrade and `/stats` is only served if enabled.
+        """
+        server, port = await health_server()
+        assert await http_get(port, '/health') == (200, b'ok\n')
+        assert await http_get(port, '/ready?probe=1') == (200, b'ready\n')
+
+        # Lagging
+        server.loop_lag = 1.0
+        assert await http_get(port, '/health') == (200, b'ok\n')
+        assert await http_get(port, '/ready') == (503, b'lagging\n')
+
+        # Statistics are disabled (handled as a WebSocket request)
+        status, _ = await http_get(port, '/stats')
+        assert status >= 400
+
+    @pytest.mark.asyncio
+    async def test_draining_stats(
+            self, event_loop, health_server, http_get, initiator_key, client_kwargs
+    ):
+        """
+        Ensure the server is not ready while being drained and the
+        statistics contain the amount of connections and paths.
+        """
+        server, port = await health_server(stats=True)
+        assert json.loads((await http_get(port, '/stats'))[1].decode('utf-8')) == {
+            'connections': 0,
+            'paths': 0,
+            'ready': True,
+            'loop_lag': 0.0,
+        }
+
+        # Connect an initiator and expect server-hello
+        client = await websockets.connect('ws://{}:{}/{}'.format(
+            pytest.saltyrtc.host, port, initiator_key.hex_pk().decode('ascii')),
+            **client_kwargs)
+        assert len(await client.recv()) > 24
+
+        # Drain
+        drain_task = event_loop.create_task(server.drain())
+        await asyncio.sleep(0.05, loop=event_loop)
+        assert await http_get(port, '/health') == (200, b'ok\n')
+        assert await http_get(port, '/ready') == (503, b'draining\n')
+        stats = json.loads((await http_get(port, '/stats'))[1].decode('utf-8'))
+        assert stats['connections'] == 1
+        assert stats['paths'] == 1
+        assert not stats['ready']
+
+        # Bye
+        await client.close()
+        await drain_task
+
+    @pytest.mark.asyncio
+    async def test_loop_lag(self, event_loop, health_server):
+        """
+        Ensure the lag of a blocked event loop is being measured.
+        """
+        server, _ = await health_server(loop_lag_interval=0.01)
+        await asyncio.sleep(0.05, loop=event_loop)
+        assert server.loop_lag < 0.05
+
+        # Block the event loop
+        event_loop.call_soon(time.sleep, 0.1)
+        await asyncio.sleep(0.05, loop=event_loop)
+        assert server.loop_lag >= 0.05
@@ -0,0 +1,138 @@
+"""
+The tests provided in this module make sure that the load generator
+completes handshakes, relays frames and reconnects.
+"""
+import ssl
+
+import pytest
+import websockets
+
+from saltyrtc.server import (
+    CloseCode,
+    LoadTest,
+    LoadTestClient,
+)
+
+
+@pytest.fixture(scope='module')
+def ssl_context():
+    return ssl.create_default_context(
+        ssl.Purpose.SERVER_AUTH, cafile=pytest.saltyrtc.cert)
+
+
+@pytest.fixture(scope='module')
+def server_url(server):
+    return 'wss://{}:{}'.format(*server.address)
+
+
+@pytest.mark.usefixtures('websockets_transport')
+class TestLoadTest:
+    def test_invalid_parameters(self, event_loop):
+        url = 'wss://localhost'
+        with pytest.raises(ValueError):
+            LoadTest(url, initiators=0, loop=event_loop)
+        with pytest.raises(ValueError):
+            LoadTest(url, responders=255, loop=event_loop)
+        with pytest.raises(ValueError):
+            LoadTest(url, relay_rate=-1.0, loop=event_loop)
+        with pytest.raises(ValueError):
+            LoadTest(url, frame_size=7, loop=event_loop)
+
+    @pytest.mark.asyncio
+    async def test_client_handshake(
+            self, event_loop, server, server_url, ssl_context, server_permanent_keys,
+            initiator_key, responder_key
+    ):
+        """
+        Ensure initiator and responder learn about each other and can
+        relay frames.
+        """
+        server_key = server_permanent_keys[0].pk
+        initiator = LoadTestClient(
+            server_url, initiator_key, initiator_key, server_key=server_key,
+            ssl_context=ssl_context, loop=event_loop)
+        responder = LoadTestClient(
+            server_url, initiator_key, responder_key, server_key=server_key,
+            ssl_context=ssl_context, loop=event_loop)
+        await initiator.connect()
+        assert initiator.connected
+        assert initiator.id == 0x01
+        assert initiator.peers == []
+        await responder.connect()
+        assert responder.id == 0x02
+        assert responder.peers == [0x01]
+
+        # new-responder
+        source, message = await initiator.receive()
+        assert source == 0x00
+        assert message['type'] == 'new-responder'
+        assert initiator.peers == [0x02]
+
+        # Relay
+        await initiator.send(0x02, b'meow')
+        assert await responder.receive() == (0x01, b'meow')
+
+        # disconnected
+        await responder.close()
+        source, message = await initiator.receive()
+        assert message['type'] == 'disconnected'
+        assert initiator.peers == []
+        await initiator.close()
+        await server.wait_connections_closed()
+
+    @pytest.mark.asyncio
+    async def test_client_unknown_server_key(
+            self, event_loop, server, server_url, ssl_context, initiator_key,
+            responder_key
+    ):
+        """
+        Ensure the server's public permanent key is being requested.
+        """
+        client = LoadTestClient(
+            server_url, initiator_key, initiator_key, server_key=responder_key.pk,
+            ssl_context=ssl_context, loop=event_loop)
+        with pytest.raises(websockets.ConnectionClosed) as exc_info:
+            await client.connect()
+        assert exc_info.value.code == CloseCode.invalid_key
+        assert not client.connected
+        await server.wait_connections_closed()
+
+    @pytest.mark.asyncio
+    async def test_run(
+            self, event_loop, server, server_url, ssl_context, server_permanent_keys
+    ):
+        """
+        Ensure all clients connect and relay frames to each other.
+        """
+        lines = []
+        load_test = LoadTest(
+            server_url, initiators=2, responders=2, relay_rate=50.0, frame_size=64,
+            server_key=server_permanent_keys[0].pk, ssl_context=ssl_context,
+            loop=event_loop)
+        stats = await load_test.run(1.0, interval=0.4, report=lines.append)
+        assert stats.handshakes == 6
+        assert stats.handshake_latency.count == 6
+        assert stats.failed == 0
+        assert stats.frames_received > 0
+        assert stats.bytes_received == stats.frames_received * (24 + 64)
+        assert stats.relay_latency.count == stats.frames_received
+        assert stats.send_errors == 0
+        assert stats.duration >= 1.0
+        assert len(lines) == 2
+        assert 'connected: 6' in lines[0]
+        assert 'Handshakes: 6' in stats.report()
+        await server.wait_connections_closed()
+
+    @pytest.mark.asyncio
+    async def test_run_churn(self, event_loop, server, server_url, ssl_context):
+        """
+        Ensure closed connections are being reconnected.
+        """
+        load_test = LoadTest(
+            server_url, initiators=2, responders=1, relay_rate=0.0, churn=20.0,
+            ssl_context=ssl_context, loop=event_loop)
+        stats = await load_test.run(1.0)
+        assert stats.reconnects > 0
+        assert stats.handshakes == 4 + stats.reconnects
+        assert stats.failed == 0
+        await server.wait_connections_closed()
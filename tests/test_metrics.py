@@ -0,0 +1,200 @@
+"""
+The tests provided in this module make sure that the server metrics
+are being recorded and exposed as expected.
+"""
+import asyncio
+
+import pytest
+
+from saltyrtc.server import (
+    CloseCode,
+    Counter,
+    Histogram,
+    LatencyHistogram,
+    Metrics,
+    serve_metrics,
+)
+
+from .conftest import unused_tcp_port
+
+
+class TestMetrics:
+    def test_render_counter(self):
+        """
+        Ensure counters with and without labels are rendered in the
+        Prometheus text format.
+        """
+        counter = Counter('meow_total', 'Meows.', labels=(('cat', 'rawr'),))
+        counter.inc()
+        counter.inc(2)
+        assert list(counter.samples()) == ['meow_total{cat="rawr"} 3']
+
+    def test_render_histogram(self):
+        """
+        Ensure histogram buckets are cumulative and include `+Inf`.
+        """
+        histogram = Histogram('meow_seconds', 'Meow durations.', bounds=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+        assert list(histogram.samples()) == [
+            'meow_seconds_bucket{le="0.1"} 1',
+            'meow_seconds_bucket{le="1.0"} 2',
+            'meow_seconds_bucket{le="+Inf"} 3',
+            'meow_seconds_sum 5.55',
+            'meow_seconds_count 3',
+        ]
+
+    def test_latency_histogram_percentiles(self):
+        """
+        Ensure percentiles of the latency histogram stay within the
+        relative error bound.
+        """
+        histogram = LatencyHistogram('meow_seconds', 'Meow latencies.')
+        assert histogram.percentile(0.5) == 0.0
+        for value in range(1, 10001):
+            histogram.record(value / 1e6)
+        assert histogram.count == 10000
+        assert histogram.min == 1e-6
+        assert histogram.max == 0.01
+        for quantile in (0.5, 0.9, 0.99):
+            expected = quantile * 0.01
+            assert abs(histogram.percentile(quantile) - expected) <= expected / 32
+        assert histogram.percentile(1.0) == 0.01
+
+    def test_render_latency_histogram(self):
+        """
+        Ensure latency histograms are rendered as summaries.
+        """
+        histogram = LatencyHistogram(
+            'meow_seconds', 'Meow latencies.', labels=(('cat', 'rawr'),))
+        histogram.record(0.000005)
+        assert list(histogram.samples()) == [
+            'meow_seconds{cat="rawr",quantile="0.5"} 5e-06',
+            'meow_seconds{cat="rawr",quantile="0.9"} 5e-06',
+            'meow_seconds{cat="rawr",quantile="0.99"} 5e-06',
+            'meow_seconds{cat="rawr",quantile="0.999"} 5e-06',
+            'meow_seconds_sum{cat="rawr"} 5e-06',
+            'meow_seconds_count{cat="rawr"} 1',
+        ]
+
+    def test_render_families(self):
+        """
+        Ensure each metric family is only described once.
+        """
+        metrics = Metrics()
+        metrics.closed(CloseCode.going_away.value)
+        metrics.closed(4999)
+        rendered = metrics.render()
+        assert rendered.count('# TYPE saltyrtc_close_codes_total counter') == 1
+        assert 'saltyrtc_close_codes_total{code="1001"} 1' in rendered
+        assert 'saltyrtc_close_codes_total{code="other"} 1' in rendered
+
+
+@pytest.mark.usefixtures('evaluate_log')
+class TestServerMetrics:
+    @pytest.mark.asyncio
+    async def test_handshake_relay_close(
+            self, event_loop, initiator_key, pack_nonce, cookie_factory, isolated_server,
+            client_factory
+    ):
+        """
+        Ensure handshakes, relayed messages and close codes are being
+        counted.
+        """
+        server = isolated_server
+        server.metrics.relay_latency_per_path = True
+
+        # Initiator handshake
+        initiator, i = await client_factory(server=server, initiator_handshake=True)
+        i['rccsn'] = 456987
+        i['rcck'] = cookie_factory()
+
+        # Responder handshake
+        responder, r = await client_factory(server=server, responder_handshake=True)
+
+        # new-responder
+        await initiator.recv()
+
+        # Send relay message: initiator --> responder
+        nonce = pack_nonce(i['rcck'], i['id'], r['id'], i['rccsn'])
+        data = await initiator.send(nonce, b'\xfe' * 1024, box=None)
+        await responder.recv(box=None)
+
+        # Collect connection metrics
+        metrics = server.metrics
+        rendered = metrics.render(server)
+        assert 'saltyrtc_connections{state="authenticated"} 2' in rendered
+        assert 'saltyrtc_paths 1' in rendered
+        assert metrics.handshakes_initiator.value == 1
+        assert metrics.handshakes_responder.value == 1
+        assert metrics.handshake_duration_initiator.count == 1
+        assert metrics.relayed_frames_to_responder.value == 1
+        assert metrics.relayed_bytes_to_responder.value == len(data)
+        assert metrics.relayed_frames_to_initiator.value == 0
+
+        # Relay latency (global and per path)
+        path = server.paths.paths[initiator_key.pk]
+        hex_path = initiator_key.hex_pk().decode('ascii')
+        for relay_latency in (server.get_relay_latency(),
+                              server.get_relay_latency(hex_path)):
+            assert relay_latency.queue_delay.count == 1
+            assert relay_latency.write_time.count == 1
+        assert server.get_relay_latency(hex_path) is path.relay_latency
+        assert server.get_relay_latency('meow') is None
+        assert 'saltyrtc_relay_write_seconds_count{{path="{}"}} 1'.format(
+            hex_path) in rendered
+
+        # Bye
+        await initiator.close()
+        await responder.close()
+        await server.wait_connections_closed()
+        assert metrics.close_codes[1000].value == 2
+        assert 'saltyrtc_connections{state="authenticated"} 0' in metrics.render(server)
+
+    @pytest.mark.asyncio
+    async def test_close_before_handshake(self, isolated_server, client_factory):
+        """
+        Ensure close codes of connections closed before the handshake
+        has been completed are being counted.
+        """
+        server = isolated_server
+        client = await client_factory(server=server)
+        await client.ws_client.send('meow')
+        await server.wait_connections_closed()
+        assert client.ws_client.close_code == CloseCode.protocol_error
+        code = CloseCode.protocol_error.value
+        assert server.metrics.close_codes[code].value == 1
+
+    @pytest.mark.asyncio
+    async def test_serve_metrics(self, event_loop, isolated_server):
+        """
+        Ensure the metrics can be fetched via HTTP and the listener is
+        closed along with the server.
+        """
+        server = isolated_server
+        port = unused_tcp_port()
+        await serve_metrics(server, host=pytest.saltyrtc.host, port=port, loop=event_loop)
+
+        async def _get(target):
+            reader, writer = await asyncio.open_connection(
+                pytest.saltyrtc.host, port, loop=event_loop)
+            writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(
+                target).encode('ascii'))
+            response = await reader.read()
+            writer.close()
+            return response.decode('utf-8')
+
+        # Fetch metrics
+        response = await _get('/metrics')
+        assert response.startswith('HTTP/1.1 200 OK\r\n')
+        assert '# TYPE saltyrtc_handshakes_total counter' in response
+
+        # Unknown target
+        response = await _get('/meow')
+        assert response.startswith('HTTP/1.1 404 Not Found\r\n')
+
+        # Closed along with the server
+        server.close()
+        await server.wait_closed()
+        with pytest.raises(OSError):
+            await asyncio.open_connection(pytest.saltyrtc.host, port, loop=event_loop)
@@ -0,0 +1,79 @@
+"""
+The tests provided in this module make sure that the sampling profiler
+and the task dump work as expected.
+"""
+import pstats
+import time
+
+import pytest
+
+from saltyrtc.server import (
+    ProfileFormat,
+    SamplingProfiler,
+    dump_tasks,
+    profile,
+)
+
+
+def _busy(duration):
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        pass
+
+
+class TestProfiling:
+    def test_sampling_profiler(self, tmpdir):
+        """
+        Ensure the profiler samples the stack of the thread that
+        started it and writes collapsed stacks.
+        """
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        assert profiler.running
+        with pytest.raises(RuntimeError):
+            profiler.start()
+        _busy(0.1)
+        profiler.stop()
+        assert not profiler.running
+        assert sum(profiler.samples.values()) > 0
+
+        # Write collapsed stacks
+        path = tmpdir.join('profile.txt')
+        profiler.write(str(path))
+        lines = path.read().splitlines()
+        assert len(lines) > 0
+        stack, count = lines[0].rsplit(' ', maxsplit=1)
+        assert int(count) > 0
+        assert any('_busy (test_profiling.py:' in line for line in lines)
+
+    @pytest.mark.asyncio
+    async def test_profile_pstats(self, event_loop, tmpdir):
+        """
+        Ensure a profile in the pstats format can be loaded.
+        """
+        path = str(tmpdir.join('profile.pstats'))
+        assert await profile(
+            0.05, path, format_=ProfileFormat.pstats, loop=event_loop) == path
+        assert pstats.Stats(path).total_calls > 0
+
+
+@pytest.mark.usefixtures('evaluate_log')
+class TestDumpTasks:
+    @pytest.mark.asyncio
+    async def test_dump_tasks(self, event_loop, server, client_factory):
+        """
+        Ensure the task dump contains the coroutine stacks and the
+        owning clients.
+        """
+        initiator, _ = await client_factory(initiator_handshake=True)
+
+        dump = dump_tasks(server, loop=event_loop)
+        assert 'live tasks' in dump
+        assert 'receive loop of PathClient(' in dump
+        assert 'keep alive loop of PathClient(' in dump
+        assert 'in initiator_receive_loop' in dump
+        assert 'in test_dump_tasks' in dump
+
+        # Bye
+        await initiator.close()
+        await server.wait_connections_closed()
@@ -8,7 +8,11 @@ import libnacl.public
 import pytest
 import websockets
 
-from saltyrtc.server import ServerProtocol
+from saltyrtc.server import (
+    Path,
+    ServerProtocol,
+    SlotsFullError,
+)
 from saltyrtc.server.common import (
     SIGNED_KEYS_CIPHERTEXT_LENGTH,
     ClientState,
@@ -71,13 +75,24 @@ class TestProtocol:
         assert len(server.protocols) == 0
 
     @pytest.mark.asyncio
-    async def test_invalid_path_symbols(self, url_factory, server, ws_client_factory):
+    async def test_invalid_path_symbols(
+            self, request, url_factory, server, ws_client_factory
+    ):
         """
         The server must drop the client after the connection has been
         established with a close code of *3001*.
         """
-        client = await ws_client_factory(path='{}/{}'.format(
-            url_factory(), 'äöüä' * 16))
+        path = '{}/{}'.format(url_factory(), 'äöüä' * 16)
+
+        # Note: wsproto rejects non-ASCII request targets (RFC 7230) during
+        #       the opening handshake.
+        if request.config.getoption('--engine') == 'wsproto':
+            with pytest.raises(websockets.InvalidStatusCode) as exc_info:
+                await ws_client_factory(path=path)
+            assert exc_info.value.status_code == 400
+            return
+
+        client = await ws_client_factory(path=path)
         await server.wait_most_recent_connection_closed()
         assert not client.open
         assert client.close_code == CloseCode.protocol_error
@@ -1708,6 +1723,31 @@ class TestProtocol:
             path.remove_client(client)
         await server.wait_connections_closed()
 
+    def test_path_slot_reuse(self, initiator_key):
+        """
+        Fill a path with fake responders, remove some of them and check
+        that the lowest free slots are being reused before the path is
+        full again.
+        """
+        path = Path(initiator_key.pk, 0, attached=False)
+        clients = [_FakePathClient() for _ in range(0x02, 0x100)]
+        assert [path.add_responder(client) for client in clients] == \
+            list(range(0x02, 0x100))
+        with pytest.raises(SlotsFullError):
+            path.add_responder(_FakePathClient())
+
+        # Free slots in the middle, at the start and at the end
+        for id_ in (0x10, 0x02, 0xff, 0x11):
+            path.remove_client(clients[id_ - 0x02])
+        assert [path.add_responder(_FakePathClient()) for _ in range(4)] == \
+            [0x02, 0x10, 0x11, 0xff]
+        with pytest.raises(SlotsFullError):
+            path.add_responder(_FakePathClient())
+
+        # The remaining responders are still in their slots
+        assert path.get_responder(0x12) is clients[0x12 - 0x02]
+        assert len(list(path.get_responder_ids())) == 254
+
     @pytest.saltyrtc.long_test
     @pytest.mark.asyncio
     async def test_path_full(self, event_loop, server, client_factory):
@@ -4,20 +4,32 @@ instance behaves as expected.
 """
 import asyncio
 import collections
+import os
+import socket
+import ssl
+import stat
 
+import libnacl.public
 import pytest
+import websockets
 
 from saltyrtc.server import (
     SERVER_ADDRESS,
     CloseCode,
+    Engine,
+    Listener,
     PathClient,
     RelayMessage,
     ServerProtocol,
+    ShutdownScheduler,
     exception,
     serve,
+    util,
 )
 from saltyrtc.server.events import Event
 
+from .conftest import unused_tcp_port
+
 
 @pytest.mark.usefixtures('evaluate_log')
 class TestServer:
@@ -499,6 +511,8 @@ class TestServer:
         assert set(events_fired.keys()) == {
             Event.initiator_connected,
             Event.responder_connected,
+            Event.path_created,
+            Event.handshake_completed,
         }
         assert events_fired[Event.initiator_connected] == [
             (initiator_key.hex_pk().decode('ascii'), None)
@@ -514,7 +528,10 @@ class TestServer:
         assert set(events_fired.keys()) == {
             Event.initiator_connected,
             Event.responder_connected,
+            Event.path_created,
+            Event.handshake_completed,
             Event.disconnected,
+            Event.path_removed,
         }
         assert events_fired[Event.disconnected] == [
             (initiator_key.hex_pk().decode('ascii'), 1000),
@@ -558,6 +575,26 @@ class TestServer:
         await initiator.close()
         await server.wait_connections_closed()
 
+    @pytest.mark.asyncio
+    async def test_loggers_not_leaking(self, server, client_factory):
+        """
+        Ensure the logger group does not grow with every client
+        and path.
+        """
+        async def _connect():
+            initiator, _ = await client_factory(initiator_handshake=True)
+            responder, _ = await client_factory(responder_handshake=True)
+            await initiator.recv()
+            await responder.close()
+            await initiator.close()
+            await server.wait_connections_closed()
+
+        await _connect()
+        amount = len(util.logger_group.loggers)
+        for _ in range(3):
+            await _connect()
+        assert len(util.logger_group.loggers) == amount
+
     @pytest.mark.asyncio
     async def test_drop_client_while_authenticating(
             self, mocker, event_loop, server, client_factory
@@ -598,3 +635,400 @@ class TestServer:
         await connection_closed_future()
         await second_initiator.close()
         await server.wait_connections_closed()
+
+    @pytest.mark.asyncio
+    async def test_drain(self, event_loop, isolated_server, client_factory):
+        """
+        Ensure a draining server keeps serving existing paths, rejects
+        connections for new paths and closes once all connections have
+        been closed.
+        """
+        server = isolated_server
+        assert server.healthy
+
+        # Initiator handshake
+        initiator, _ = await client_factory(server=server, initiator_handshake=True)
+
+        # Drain
+        drain_task = event_loop.create_task(server.drain())
+        await asyncio.sleep(0.05, loop=event_loop)
+        assert server.draining
+        assert not server.healthy
+        assert not drain_task.done()
+
+        # Responder handshake on the existing path
+        responder, _ = await client_factory(server=server, responder_handshake=True)
+        message, *_ = await initiator.recv()
+        assert message['type'] == 'new-responder'
+
+        # Initiator on a new path will be rejected
+        with pytest.raises(websockets.ConnectionClosed) as exc_info:
+            await client_factory(
+                server=server, path=libnacl.public.SecretKey(),
+                initiator_handshake=True)
+        assert exc_info.value.code == CloseCode.going_away
+
+        # Close the remaining clients and wait until drained
+        await responder.close()
+        await initiator.close()
+        await asyncio.wait_for(drain_task, server.timeout, loop=event_loop)
+        assert len(server.protocols) == 0
+
+    @pytest.mark.asyncio
+    async def test_drain_reject_all_timeout(
+            self, event_loop, isolated_server, client_factory
+    ):
+        """
+        Ensure a draining server can reject all new connections with a
+        specific close code and closes remaining connections once the
+        timeout has been reached.
+        """
+        server = isolated_server
+
+        # Initiator handshake
+        initiator, _ = await client_factory(server=server, initiator_handshake=True)
+
+        # Drain
+        drain_task = event_loop.create_task(server.drain(
+            timeout=0.1, close_code=CloseCode.path_full_error, reject_all=True))
+        await asyncio.sleep(0.05, loop=event_loop)
+
+        # Responder on the existing path will be rejected as well
+        with pytest.raises(websockets.ConnectionClosed) as exc_info:
+            await client_factory(server=server, responder_handshake=True)
+        assert exc_info.value.code == CloseCode.path_full_error
+
+        # Remaining initiator will be closed after the timeout
+        await asyncio.wait_for(drain_task, server.timeout, loop=event_loop)
+        assert len(server.protocols) == 0
+        with pytest.raises(websockets.ConnectionClosed) as exc_info:
+            await initiator.recv()
+        assert exc_info.value.code == CloseCode.going_away
+
+    @pytest.mark.asyncio
+    async def test_staggered_shutdown(
+            self, event_loop, log_handler, isolated_server, client_factory
+    ):
+        """
+        Ensure the server closes connections in batches spread over the
+        shutdown window.
+        """
+        server = isolated_server
+        server.shutdown_scheduler = ShutdownScheduler(window=0.3, batch_size=1)
+
+        # Initiator and two responder handshakes
+        clients = []
+        initiator, _ = await client_factory(server=server, initiator_handshake=True)
+        clients.append(initiator)
+        for _ in range(2):
+            responder, _ = await client_factory(server=server, responder_handshake=True)
+            clients.append(responder)
+
+        # Close and wait
+        start = event_loop.time()
+        server.close()
+        await asyncio.wait_for(
+            server.wait_closed(), server.timeout + 0.3, loop=event_loop)
+        assert event_loop.time() - start >= 0.2
+
+        # All clients have been closed
+        for client in clients:
+            await asyncio.wait_for(
+                client.ws_client.wait_closed(), server.timeout, loop=event_loop)
+            assert client.ws_client.close_code == CloseCode.going_away
+        assert server.shutdown_scheduler.closed == 3
+        assert len([record for record in log_handler.records
+                    if 'Closed 1/3 protocols' in record.message]) == 1
+
+    @pytest.mark.asyncio
+    async def test_staggered_shutdown_deadline(
+            self, event_loop, log_handler, isolated_server, client_factory
+    ):
+        """
+        Ensure the server closes all remaining connections immediately
+        once the shutdown deadline has been reached.
+        """
+        server = isolated_server
+        server.shutdown_scheduler = ShutdownScheduler(
+            window=60.0, batch_size=1, deadline=0.1)
+
+        # Initiator and two responder handshakes
+        await client_factory(server=server, initiator_handshake=True)
+        for _ in range(2):
+            await client_factory(server=server, responder_handshake=True)
+
+        # Close and wait
+        server.close()
+        await asyncio.wait_for(server.wait_closed(), server.timeout, loop=event_loop)
+        assert server.shutdown_scheduler.closed == 3
+        assert len([record for record in log_handler.records
+                    if 'Shutdown deadline reached' in record.message]) == 1
+
+    @pytest.mark.asyncio
+    async def test_path_events(
+            self, event_loop, initiator_key, pack_nonce, cookie_factory, isolated_server,
+            client_factory
+    ):
+        """
+        Ensure path lifecycle, handshake, drop and path statistics
+        events are being raised.
+        """
+        server = isolated_server
+        key = initiator_key.hex_pk().decode('ascii')
+        events_fired = collections.defaultdict(list)
+
+        async def callback(event: Event, *data):
+            events_fired[event].append(data)
+
+        for event in Event:
+            server.register_event_callback(event, callback)
+        with pytest.raises(ValueError):
+            server.start_path_stats(0.0)
+
+        # Initiator handshake
+        initiator, i = await client_factory(server=server, initiator_handshake=True)
+        i['rccsn'] = 456987
+        i['rcck'] = cookie_factory()
+
+        # Responder handshake
+        responder, r = await client_factory(server=server, responder_handshake=True)
+
+        # new-responder
+        await initiator.recv()
+
+        # Send relay message: initiator --> responder
+        nonce = pack_nonce(i['rcck'], i['id'], r['id'], i['rccsn'])
+        data = await initiator.send(nonce, b'\xfe' * 1024, box=None)
+        await responder.recv(box=None)
+
+        # Raise path statistics
+        server.start_path_stats(0.05)
+        await asyncio.sleep(0.1, loop=event_loop)
+        (path, stats), *_ = events_fired[Event.path_stats]
+        assert path == key
+        assert stats.interval == 0.05
+        assert stats.relayed_frames == 1
+        assert stats.relayed_bytes == len(data)
+
+        # Drop responder
+        responder_closed_future = server.wait_connection_closed_marker()
+        await initiator.send(pack_nonce(i['cck'], 0x01, 0x00, i['ccsn']), {
+            'type': 'drop-responder',
+            'id': r['id'],
+        })
+        i['ccsn'] += 1
+        await responder_closed_future()
+
+        # Bye
+        await initiator.close()
+        await server.wait_connections_closed()
+        await server.event_dispatcher.join()
+
+        assert events_fired[Event.path_created] == [(key, None)]
+        assert events_fired[Event.path_removed] == [(key, None)]
+        handshakes = [data for _, data in events_fired[Event.handshake_completed]]
+        assert [data.role for data in handshakes] == ['initiator', 'responder']
+        assert all(data.duration > 0 for data in handshakes)
+        (path, dropped), = events_fired[Event.client_dropped]
+        assert path == key
+        assert dropped.id == r['id']
+        assert dropped.code == CloseCode.drop_by_initiator.value
+        assert dropped.dropped_by == 0x01
+        assert not dropped.by_admin
+
+    @pytest.mark.usefixtures('websockets_transport')
+    @pytest.mark.asyncio
+    async def test_unix_socket(
+            self, request, event_loop, tmpdir, server_permanent_keys, initiator_key
+    ):
+        """
+        Ensure the server can listen on a Unix domain socket with
+        specific permissions.
+        """
+        path = str(tmpdir.join('saltyrtc.sock'))
+        server = await serve(
+            None, server_permanent_keys, loop=event_loop, unix_path=path,
+            unix_mode=0o660, engine=Engine(request.config.getoption('--engine')))
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o660
+
+        # Expect server-hello
+        sock = socket.socket(socket.AF_UNIX)
+        sock.connect(path)
+        client = await websockets.connect(
+            'ws://localhost/{}'.format(initiator_key.hex_pk().decode('ascii')),
+            subprotocols=server.subprotocols, loop=event_loop, sock=sock)
+        message = await client.recv()
+        assert len(message) > 24
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+    @pytest.mark.usefixtures('websockets_transport')
+    @pytest.mark.asyncio
+    async def test_multiple_listeners(
+            self, request, event_loop, tmpdir, server_permanent_keys, initiator_key,
+            client_kwargs, client_factory
+    ):
+        """
+        Ensure clients connected via different listeners (TLS, plain and
+        Unix domain socket) share the same paths and that all listeners
+        are being closed along with the server.
+        """
+        ssl_context = util.create_ssl_context(
+            pytest.saltyrtc.cert, keyfile=pytest.saltyrtc.key,
+            dh_params_file=pytest.saltyrtc.dh_params)
+        host, unix_path = pytest.saltyrtc.host, str(tmpdir.join('saltyrtc.sock'))
+        tls_port, plain_port = unused_tcp_port(), unused_tcp_port()
+        server = await serve(
+            None, server_permanent_keys, loop=event_loop,
+            engine=Engine(request.config.getoption('--engine')), listeners=[
+                Listener(host=host, port=tls_port, ssl_context=ssl_context),
+                Listener(host=host, port=plain_port),
+                Listener(unix_path=unix_path),
+            ])
+        assert len(server.servers) == 3
+        assert server.server is server.servers[0]
+        path = initiator_key.hex_pk().decode('ascii')
+
+        # Initiator via TLS
+        client_ssl_context = ssl.create_default_context(
+            ssl.Purpose.SERVER_AUTH, cafile=pytest.saltyrtc.cert)
+        ws_client = await websockets.connect(
+            'wss://{}:{}/{}'.format(host, tls_port, path), ssl=client_ssl_context,
+            **client_kwargs)
+        initiator, _ = await client_factory(ws_client=ws_client, initiator_handshake=True)
+
+        # Responders via plain WS and the Unix domain socket
+        ws_client = await websockets.connect(
+            'ws://{}:{}/{}'.format(host, plain_port, path), **client_kwargs)
+        await client_factory(ws_client=ws_client, responder_handshake=True)
+        sock = socket.socket(socket.AF_UNIX)
+        sock.connect(unix_path)
+        ws_client = await websockets.connect(
+            'ws://localhost/{}'.format(path), sock=sock, **client_kwargs)
+        await client_factory(ws_client=ws_client, responder_handshake=True)
+
+        # new-responder (twice)
+        for _ in range(2):
+            message, *_ = await initiator.recv()
+            assert message['type'] == 'new-responder'
+        assert len(server.paths.paths) == 1
+
+        # Closing the server closes all listeners
+        server.close()
+        await server.wait_closed()
+        assert len(server.protocols) == 0
+        with pytest.raises(OSError):
+            await websockets.connect(
+                'ws://{}:{}/{}'.format(host, plain_port, path), **client_kwargs)
+        with pytest.raises(OSError):
+            sock = socket.socket(socket.AF_UNIX)
+            try:
+                sock.connect(unix_path)
+            finally:
+                sock.close()
+
+    @pytest.mark.asyncio
+    async def test_listener_already_in_use(self, event_loop, server_permanent_keys):
+        """
+        Ensure all listeners are being closed in case one of them
+        cannot be started.
+        """
+        host, port = pytest.saltyrtc.host, unused_tcp_port()
+        with pytest.raises(OSError):
+            await serve(None, server_permanent_keys, loop=event_loop, listeners=[
+                Listener(host=host, port=port),
+                Listener(host=host, port=port),
+            ])
+        server = await serve(None, server_permanent_keys, loop=event_loop, host=host,
+                             port=port)
+        server.close()
+        await server.wait_closed()
+        with pytest.raises(ValueError):
+            await serve(None, server_permanent_keys, loop=event_loop, listeners=[])
+
+
+class TestListener:
+    def test_from_address(self):
+        ssl_context = ssl.create_default_context()
+        listener = Listener.from_address('wss://[::1]:8765', ssl_context=ssl_context)
+        assert (listener.host, listener.port) == ('::1', 8765)
+        assert listener.ssl_context is ssl_context
+        assert str(listener) == 'wss://[::1]:8765'
+        listener = Listener.from_address('ws://:80', ssl_context=ssl_context)
+        assert (listener.host, listener.port, listener.ssl_context) == (None, 80, None)
+        assert str(listener) == 'ws://:80'
+        listener = Listener.from_address('unix:/run/saltyrtc.sock', unix_mode=0o660)
+        assert (listener.unix_path, listener.unix_mode) == ('/run/saltyrtc.sock', 0o660)
+        assert str(listener) == 'unix:/run/saltyrtc.sock'
+
+    @pytest.mark.parametrize('address', [
+        'wss://localhost:8765',
+        'http://localhost:8765',
+        'ws://localhost',
+        'ws://localhost:meow',
+        'ws://localhost:8765/meow',
+        'unix:',
+        'localhost:8765',
+    ])
+    def test_from_address_invalid(self, address):
+        with pytest.raises(ValueError):
+            Listener.from_address(address)
+
+
+class _FakeProtocol:
+    def __init__(self, loop, protocols, close_future=None):
+        self.handler_task = asyncio.Future(loop=loop)
+        self._protocols = protocols
+        self._close_future = close_future
+        protocols.add(self)
+
+    async def close(self, code):
+        if self._close_future is not None:
+            await self._close_future
+        self._protocols.discard(self)
+        self.handler_task.set_result(None)
+
+
+class TestShutdownScheduler:
+    @pytest.mark.asyncio
+    async def test_deadline_hanging_close(self, event_loop):
+        """
+        Ensure closing protocols does not wait beyond the deadline even
+        if closing the protocols hangs.
+        """
+        protocols = set()
+        close_future = asyncio.Future(loop=event_loop)
+        for _ in range(3):
+            _FakeProtocol(event_loop, protocols, close_future=close_future)
+        scheduler = ShutdownScheduler(batch_size=1, deadline=0.1)
+
+        # Close and wait
+        start = event_loop.time()
+        await asyncio.wait_for(
+            scheduler.close_protocols(protocols, event_loop), 1.0, loop=event_loop)
+        assert 0.1 <= event_loop.time() - start < 0.5
+        assert (scheduler.total, scheduler.closed) == (3, 0)
+
+        # Closing continues in the background
+        close_future.set_result(None)
+        await asyncio.sleep(0.01, loop=event_loop)
+        assert len(protocols) == 0
+        assert scheduler.closed == 3
+
+    @pytest.mark.asyncio
+    async def test_closed_count(self, event_loop):
+        """
+        Ensure protocols that have been removed before their batch was
+        due are not being counted as closed.
+        """
+        protocols = set()
+        first, second, _ = [_FakeProtocol(event_loop, protocols) for _ in range(3)]
+        scheduler = ShutdownScheduler(window=0.1, batch_size=1)
+
+        # Remove a protocol while the first batch is pending
+        event_loop.call_later(0.0, second.handler_task.set_result, None)
+        event_loop.call_later(0.0, protocols.discard, second)
+        await scheduler.close_protocols(protocols, event_loop)
+        assert len(protocols) == 0
+        assert (scheduler.total, scheduler.closed) == (3, 2)
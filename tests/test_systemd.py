@@ -0,0 +1,146 @@
+"""
+The tests provided in this module make sure that socket activation,
+notifications and watchdog pings follow the systemd protocols.
+"""
+import asyncio
+import os
+import socket
+
+import pytest
+import websockets
+
+from saltyrtc.server import (
+    Engine,
+    Listener,
+    listen_sockets,
+    notify,
+    serve,
+    systemd,
+    watchdog,
+    watchdog_timeout,
+)
+
+
+@pytest.fixture
+def notify_socket(monkeypatch, tmpdir):
+    """
+    Return a datagram socket that receives notifications.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    path = str(tmpdir.join('notify.sock'))
+    sock.bind(path)
+    sock.settimeout(1.0)
+    monkeypatch.setenv('NOTIFY_SOCKET', path)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def activated_socket(monkeypatch):
+    """
+    Return a listening socket that has been passed like systemd does.
+    """
+    sock = socket.socket()
+    sock.bind((pytest.saltyrtc.host, 0))
+    sock.listen()
+    monkeypatch.setattr(systemd, 'LISTEN_FDS_START', sock.fileno())
+    monkeypatch.setenv('LISTEN_PID', str(os.getpid()))
+    monkeypatch.setenv('LISTEN_FDS', '1')
+    monkeypatch.setenv('LISTEN_FDNAMES', 'saltyrtc')
+    return sock
+
+
+class TestSystemd:
+    def test_listen_sockets(self, activated_socket):
+        address = activated_socket.getsockname()
+        fd = activated_socket.detach()
+        sock, = listen_sockets()
+        assert sock.fileno() == fd
+        assert sock.family == socket.AF_INET
+        assert sock.getsockname() == address
+        assert not sock.get_inheritable()
+        sock.close()
+
+        # Environment has been removed
+        for name in ('LISTEN_PID', 'LISTEN_FDS', 'LISTEN_FDNAMES'):
+            assert name not in os.environ
+        assert listen_sockets() == []
+
+    def test_listen_sockets_other_process(self, monkeypatch, activated_socket):
+        monkeypatch.setenv('LISTEN_PID', str(os.getpid() + 1))
+        assert listen_sockets(unset_environment=False) == []
+        assert 'LISTEN_FDS' in os.environ
+        activated_socket.close()
+
+    def test_notify(self, monkeypatch, notify_socket):
+        assert notify('READY=1', 'STATUS=Started')
+        assert notify_socket.recv(4096) == b'READY=1\nSTATUS=Started'
+
+        # Abstract namespace
+        notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        notify_socket.bind('\0saltyrtc-test-{}'.format(os.getpid()))
+        monkeypatch.setenv('NOTIFY_SOCKET', '@saltyrtc-test-{}'.format(os.getpid()))
+        assert notify('STOPPING=1')
+        assert notify_socket.recv(4096) == b'STOPPING=1'
+        notify_socket.close()
+
+        # Not started by systemd
+        monkeypatch.delenv('NOTIFY_SOCKET')
+        assert not notify('READY=1')
+
+    def test_watchdog_timeout(self, monkeypatch):
+        monkeypatch.delenv('WATCHDOG_USEC', raising=False)
+        assert watchdog_timeout() is None
+        monkeypatch.setenv('WATCHDOG_USEC', '30000000')
+        assert watchdog_timeout() == 30.0
+        monkeypatch.setenv('WATCHDOG_PID', str(os.getpid()))
+        assert watchdog_timeout() == 30.0
+        monkeypatch.setenv('WATCHDOG_PID', str(os.getpid() + 1))
+        assert watchdog_timeout() is None
+
+    @pytest.mark.asyncio
+    async def test_watchdog(self, event_loop, notify_socket):
+        """
+        Ensure watchdog pings are being sent in half the timeout.
+        """
+        task = event_loop.create_task(watchdog(0.1, loop=event_loop))
+        await asyncio.sleep(0.12, loop=event_loop)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        notify_socket.setblocking(False)
+        pings = []
+        with pytest.raises(BlockingIOError):
+            while True:
+                pings.append(notify_socket.recv(4096))
+        assert 2 <= len(pings) <= 3
+        assert set(pings) == {b'WATCHDOG=1'}
+
+    @pytest.mark.usefixtures('websockets_transport')
+    @pytest.mark.asyncio
+    async def test_serve_activated_socket(
+            self, request, event_loop, activated_socket, server_permanent_keys,
+            initiator_key, client_kwargs
+    ):
+        """
+        Ensure the server accepts connections from an activated socket
+        and the socket keeps listening while the server restarts.
+        """
+        port = activated_socket.getsockname()[1]
+        activated_socket.detach()
+        sock, = listen_sockets()
+        url = 'ws://{}:{}/{}'.format(
+            pytest.saltyrtc.host, port, initiator_key.hex_pk().decode('ascii'))
+        for _ in range(2):
+            server = await serve(
+                None, server_permanent_keys, loop=event_loop,
+                engine=Engine(request.config.getoption('--engine')),
+                listeners=[Listener(sock=sock.dup())])
+
+            # Expect server-hello
+            client = await websockets.connect(url, **client_kwargs)
+            assert len(await client.recv()) > 24
+            await client.close()
+            server.close()
+            await server.wait_closed()
+        sock.close()
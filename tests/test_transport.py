@@ -0,0 +1,374 @@
+"""
+The tests provided in this module make sure that the in-memory
+transport and the stream engines behave like a WebSocket connection
+and that the server can be run on top of them.
+"""
+import asyncio
+import os
+import struct
+
+import pytest
+import websockets
+
+from saltyrtc.server import (
+    CloseCode,
+    Connection,
+    Engine,
+    MemoryConnection,
+    MemoryServer,
+    StreamServer,
+    serve_memory,
+)
+
+
+@pytest.fixture(params=[
+    pytest.param(Engine.wsproto, marks=pytest.saltyrtc.have_wsproto),
+    Engine.native,
+])
+def engine(request):
+    return request.param
+
+
+class TestMemoryConnection:
+    def test_interface(self, event_loop):
+        client, connection = MemoryConnection.pair('v1', loop=event_loop)
+        assert isinstance(connection, Connection)
+        assert client.subprotocol == 'v1'
+        assert client.open
+        assert not connection.closed
+        assert issubclass(websockets.WebSocketServerProtocol, Connection)
+
+    @pytest.mark.asyncio
+    async def test_send_recv(self, event_loop):
+        client, connection = MemoryConnection.pair(loop=event_loop)
+        receive = event_loop.create_task(connection.recv())
+        await client.send(b'meow')
+        await client.send(b'rawr')
+        assert await receive == b'meow'
+        assert await connection.recv() == b'rawr'
+        await connection.send(b'purr')
+        assert await client.recv() == b'purr'
+
+    @pytest.mark.asyncio
+    async def test_close(self, event_loop):
+        """
+        Ensure both ends are closed and messages that have been
+        delivered before can still be received.
+        """
+        client, connection = MemoryConnection.pair(loop=event_loop)
+        receive = event_loop.create_task(client.recv())
+        await client.send(b'meow')
+        await connection.close(code=CloseCode.going_away.value, reason='bye')
+        assert connection.connection_lost_waiter.done()
+        assert client.connection_lost_waiter.done()
+        assert client.close_code == CloseCode.going_away.value
+        assert await connection.recv() == b'meow'
+
+        # Pending and subsequent operations fail with the close code
+        with pytest.raises(websockets.ConnectionClosed) as exc_info:
+            await receive
+        assert exc_info.value.code == CloseCode.going_away.value
+        assert exc_info.value.reason == 'bye'
+        with pytest.raises(websockets.ConnectionClosed):
+            await connection.recv()
+        with pytest.raises(websockets.ConnectionClosed):
+            await client.send(b'meow')
+
+        # Closing again has no effect
+        await client.close()
+        assert client.close_code == CloseCode.going_away.value
+        await client.wait_closed()
+
+    @pytest.mark.asyncio
+    async def test_ping(self, event_loop):
+        client, connection = MemoryConnection.pair(loop=event_loop)
+        pong_waiter = await client.ping()
+        await asyncio.wait_for(pong_waiter, 1.0, loop=event_loop)
+
+        # Pending pings fail once the connection has been closed
+        pong_waiter = await client.ping()
+        await connection.close()
+        with pytest.raises(websockets.ConnectionClosed):
+            await pong_waiter
+        with pytest.raises(websockets.ConnectionClosed):
+            await client.ping()
+
+
+class TestMemoryServer:
+    @pytest.mark.asyncio
+    async def test_connect(self, event_loop):
+        """
+        Ensure the subprotocol is being negotiated and the connection
+        is being closed once the handler returns.
+        """
+        paths = []
+
+        async def handler(connection, path):
+            paths.append(path)
+            assert connection.subprotocol == 'v2'
+            await connection.send(await connection.recv())
+
+        server = MemoryServer(handler, ['v2', 'v3'], loop=event_loop)
+        client = await server.connect('/meow', subprotocols=['v1', 'v2'])
+        assert client.subprotocol == 'v2'
+        await client.send(b'meow')
+        assert await client.recv() == b'meow'
+        await client.wait_closed()
+        assert client.close_code == 1000
+        assert paths == ['/meow']
+
+        # Failing handler
+        client = await server.connect('/meow')
+        assert client.subprotocol is None
+        await client.wait_closed()
+        assert client.close_code == 1011
+
+        server.close()
+        await server.wait_closed()
+
+    @pytest.mark.asyncio
+    async def test_close(self, event_loop):
+        async def handler(connection, _):
+            await connection.wait_closed()
+
+        server = MemoryServer(handler, [], loop=event_loop)
+        client = await server.connect('/')
+        server.close()
+        await server.wait_closed()
+        assert client.close_code == 1001
+        with pytest.raises(ConnectionRefusedError):
+            await server.connect('/')
+
+
+@pytest.mark.usefixtures('evaluate_log')
+class TestServeMemory:
+    @pytest.mark.asyncio
+    async def test_handshake(self, event_loop, server_permanent_keys, initiator_key):
+        """
+        Ensure a client can connect to a server that has been
+        started without any sockets.
+        """
+        server = await serve_memory(server_permanent_keys, loop=event_loop)
+        assert isinstance(server.server, MemoryServer)
+        connection = await server.server.connect(
+            '/' + initiator_key.hex_pk().decode('ascii'),
+            subprotocols=server.subprotocols)
+
+        # Expect server-hello
+        message = await connection.recv()
+        assert len(message) > 24
+        await connection.close()
+        protocol, = server.protocols
+        await protocol.handler_task
+        server.close()
+        await server.wait_closed()
+        assert len(server.protocols) == 0
+
+
+class TestStreamServer:
+    async def _serve(self, engine, handler, loop, **kwargs):
+        server = StreamServer(engine, handler, ['v1'], loop=loop, **kwargs)
+        await server.listen(host='localhost', port=0)
+        url = 'ws://localhost:{}'.format(server.sockets[0].getsockname()[1])
+        return server, url
+
+    @pytest.mark.asyncio
+    async def test_echo(self, event_loop, engine):
+        """
+        Ensure messages, pings and the closing handshake are being
+        handled.
+        """
+        paths = []
+
+        async def handler(connection, path):
+            paths.append(path)
+            assert isinstance(connection, Connection)
+            assert connection.subprotocol == 'v1'
+            while True:
+                try:
+                    data = await connection.recv()
+                except websockets.ConnectionClosed:
+                    break
+                await connection.send(data)
+                await (await connection.ping())
+
+        server, url = await self._serve(engine, handler, event_loop)
+        client = await websockets.connect(
+            url + '/meow', subprotocols=['v1'], loop=event_loop)
+        assert client.subprotocol == 'v1'
+        for data in (b'meow', b'\x00' * 100000, 'rawr'):
+            await client.send(data)
+            assert await client.recv() == data
+        await client.ping()
+        await client.close(code=CloseCode.going_away.value)
+        assert paths == ['/meow']
+
+        server.close()
+        await server.wait_closed()
+
+    @pytest.mark.asyncio
+    async def test_handler_return(self, event_loop, engine):
+        async def handler(connection, _):
+            if connection.subprotocol is None:
+                raise ValueError('No subprotocol')
+
+        server, url = await self._serve(engine, handler, event_loop)
+        client = await websockets.connect(url, subprotocols=['v1'], loop=event_loop)
+        await client.wait_closed()
+        assert client.close_code == 1000
+
+        # Failing handler
+        client = await websockets.connect(url, loop=event_loop)
+        await client.wait_closed()
+        assert client.close_code == 1011
+
+        server.close()
+        await server.wait_closed()
+
+    @pytest.mark.asyncio
+    async def test_max_size(self, event_loop, engine):
+        close_codes = []
+
+        async def handler(connection, _):
+            with pytest.raises(websockets.ConnectionClosed):
+                await connection.recv()
+            close_codes.append(connection.close_code)
+
+        server, url = await self._serve(engine, handler, event_loop, max_size=1024)
+        client = await websockets.connect(url, subprotocols=['v1'], loop=event_loop)
+        await client.send(b'\x00' * 1025)
+        await client.wait_closed()
+        assert client.close_code == 1009
+
+        server.close()
+        await server.wait_closed()
+        assert len(close_codes) == 1
+
+    @pytest.mark.asyncio
+    async def test_close(self, event_loop, engine):
+        """
+        Ensure open connections are being closed with *going away*
+        and new connections are refused.
+        """
+        async def handler(connection, _):
+            await connection.wait_closed()
+
+        server, url = await self._serve(engine, handler, event_loop)
+        client = await websockets.connect(url, subprotocols=['v1'], loop=event_loop)
+        server.close()
+        await server.wait_closed()
+        await client.wait_closed()
+        assert client.close_code == 1001
+        with pytest.raises(OSError):
+            await websockets.connect(url, loop=event_loop)
+
+
+def _frame(opcode, payload, finished=True, masked=True):
+    first = opcode | (0x80 if finished else 0x00)
+    if not masked:
+        return struct.pack('!BB', first, len(payload)) + payload
+    mask = os.urandom(4)
+    payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+    return struct.pack('!BB', first, 0x80 | len(payload)) + mask + payload
+
+
+class TestNativeConnection:
+    async def _connect(self, server, path='/', subprotocols=('v1',), loop=None):
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('localhost', port, loop=loop)
+        writer.write((
+            'GET {} HTTP/1.1\r\n'
+            'Host: localhost\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            'Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n'
+            'Sec-WebSocket-Version: 13\r\n'
+            'Sec-WebSocket-Protocol: {}\r\n'
+            '\r\n'
+        ).format(path, ', '.join(subprotocols)).encode('ascii'))
+        response = await reader.readuntil(b'\r\n\r\n')
+        return reader, writer, response
+
+    @staticmethod
+    async def _read_frame(reader):
+        first, length = await reader.readexactly(2)
+        return first, await reader.readexactly(length)
+
+    @pytest.mark.asyncio
+    async def test_handshake(self, event_loop):
+        async def handler(connection, _):
+            await connection.wait_closed()
+
+        server = StreamServer(Engine.native, handler, ['v1'], loop=event_loop)
+        await server.listen(host='localhost', port=0)
+        _, writer, response = await self._connect(server, loop=event_loop)
+        assert response.startswith(b'HTTP/1.1 101 Switching Protocols\r\n')
+        assert b'Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=\r\n' in response
+        assert b'Sec-WebSocket-Protocol: v1\r\n' in response
+        writer.close()
+
+        # Invalid request
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('localhost', port, loop=event_loop)
+        writer.write(b'GET / HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        assert (await reader.read()).startswith(b'HTTP/1.1 400 Bad Request\r\n')
+        writer.close()
+
+        server.close()
+        await server.wait_closed()
+
+    @pytest.mark.asyncio
+    async def test_fragmented_messages(self, event_loop):
+        """
+        Ensure fragmented binary and text messages are being
+        reassembled.
+        """
+        async def handler(connection, _):
+            for _ in range(2):
+                await connection.send(await connection.recv())
+
+        server = StreamServer(Engine.native, handler, ['v1'], loop=event_loop)
+        await server.listen(host='localhost', port=0)
+        reader, writer, _ = await self._connect(server, loop=event_loop)
+        writer.write(_frame(0x2, b'me', finished=False))
+        writer.write(_frame(0x9, b'ping'))
+        writer.write(_frame(0x0, b'ow'))
+        text = 'äöü'.encode('utf-8')
+        writer.write(_frame(0x1, text[:3], finished=False) + _frame(0x0, text[3:]))
+        assert await self._read_frame(reader) == (0x8a, b'ping')
+        assert await self._read_frame(reader) == (0x82, b'meow')
+        assert await self._read_frame(reader) == (0x81, text)
+        assert await self._read_frame(reader) == (0x88, struct.pack('!H', 1000))
+        writer.close()
+
+        server.close()
+        await server.wait_closed()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('frame,close_code', [
+        (_frame(0x2, b'meow', masked=False), 1002),
+        (_frame(0x0, b'meow'), 1002),
+        (_frame(0x3, b'meow'), 1002),
+        (_frame(0x9, b'meow', finished=False), 1002),
+        (_frame(0x1, b'\xff'), 1007),
+    ])
+    async def test_invalid_frame(self, event_loop, frame, close_code):
+        close_codes = []
+
+        async def handler(connection, _):
+            with pytest.raises(websockets.ConnectionClosed):
+                await connection.recv()
+            close_codes.append(connection.close_code)
+
+        server = StreamServer(Engine.native, handler, ['v1'], loop=event_loop)
+        await server.listen(host='localhost', port=0)
+        reader, writer, _ = await self._connect(server, loop=event_loop)
+        writer.write(frame)
+        opcode, payload = await self._read_frame(reader)
+        assert opcode == 0x88
+        assert payload[:2] == struct.pack('!H', close_code)
+        writer.close()
+
+        server.close()
+        await server.wait_closed()
+        assert close_codes == [1006]